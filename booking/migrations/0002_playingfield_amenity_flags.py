@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+AMENITY_FLAGS = {
+    'parking': 1,
+    'locker': 2,
+    'shower': 4,
+    'cafe': 8,
+    'pro_shop': 16,
+    'equipment_rental': 32,
+}
+
+
+def backfill_amenity_flags(apps, schema_editor):
+    PlayingField = apps.get_model('booking', 'PlayingField')
+    fields = list(PlayingField.objects.only('id', 'amenities'))
+    for field in fields:
+        field.amenity_flags = 0
+        for amenity in field.amenities or []:
+            field.amenity_flags |= AMENITY_FLAGS.get(amenity, 0)
+    PlayingField.objects.bulk_update(fields, ['amenity_flags'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playingfield',
+            name='amenity_flags',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bitmask of amenities, kept in sync on save'),
+        ),
+        migrations.AddIndex(
+            model_name='playingfield',
+            index=models.Index(fields=['amenity_flags'], name='booking_pla_amenity_99b7f1_idx'),
+        ),
+        migrations.RunPython(backfill_amenity_flags, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,74 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import datetime, time
 
+# Bit assigned to each amenity in PlayingField.amenity_flags
+AMENITY_FLAGS = {
+    'parking': 1,
+    'locker': 2,
+    'shower': 4,
+    'cafe': 8,
+    'pro_shop': 16,
+    'equipment_rental': 32,
+}
+
+# Price bounds per category as (min inclusive, max exclusive)
+PRICE_CATEGORY_BOUNDS = {
+    'budget': (None, 75000),
+    'mid': (75000, 150000),
+    'premium': (150000, None),
+}
+
+
+def amenity_mask(amenities):
+    """Bitmask for a list of amenity names, unknown names are ignored"""
+    mask = 0
+    for amenity in amenities or []:
+        mask |= AMENITY_FLAGS.get(amenity, 0)
+    return mask
+
+
+class PlayingFieldQuerySet(models.QuerySet):
+    def with_price_category(self):
+        """Annotate price_category in SQL, mirroring PlayingField.price_range_category"""
+        budget_max = PRICE_CATEGORY_BOUNDS['budget'][1]
+        mid_max = PRICE_CATEGORY_BOUNDS['mid'][1]
+        return self.annotate(
+            price_category=models.Case(
+                models.When(price_per_hour__lt=budget_max, then=models.Value('budget')),
+                models.When(price_per_hour__lt=mid_max, then=models.Value('mid')),
+                default=models.Value('premium'),
+                output_field=models.CharField(),
+            )
+        )
+
+    def in_price_category(self, category):
+        """Filter by price category as a range on the indexed price_per_hour column"""
+        if category not in PRICE_CATEGORY_BOUNDS:
+            return self.none()
+        low, high = PRICE_CATEGORY_BOUNDS[category]
+        queryset = self
+        if low is not None:
+            queryset = queryset.filter(price_per_hour__gte=low)
+        if high is not None:
+            queryset = queryset.filter(price_per_hour__lt=high)
+        return queryset
+
+    def with_amenities(self, amenities):
+        """
+        Filter fields offering every amenity in the list.
+        Matches the (small) set of masks that contain the required bits so the
+        lookup stays an indexed IN on amenity_flags.
+        """
+        if any(amenity not in AMENITY_FLAGS for amenity in amenities):
+            return self.none()
+        required = amenity_mask(amenities)
+        if not required:
+            return self
+        all_bits = sum(AMENITY_FLAGS.values())
+        masks = [mask for mask in range(all_bits + 1) if mask & required == required]
+        return self.filter(amenity_flags__in=masks)
+
+
 class PlayingField(models.Model):
     """
     Tennis court information with owner details and amenities
@@ -52,6 +120,7 @@ class PlayingField(models.Model):
     # Additional Features
     description = models.TextField(blank=True)
     amenities = models.JSONField(default=list, blank=True, help_text='["parking", "locker", "shower", "cafe"]')
+    amenity_flags = models.PositiveIntegerField(default=0, editable=False, help_text="Bitmask of amenities, kept in sync on save")
     court_image = models.ImageField(upload_to='courts/', blank=True, null=True)
     image_url = models.URLField(blank=True, help_text="External image URL for court thumbnail")
 
@@ -61,25 +130,33 @@ class PlayingField(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
+    objects = PlayingFieldQuerySet.as_manager()
+
     class Meta:
         ordering = ['city', 'name']
         indexes = [
             models.Index(fields=['city', 'is_active']),
             models.Index(fields=['price_per_hour']),
+            models.Index(fields=['amenity_flags']),
         ]
 
     def __str__(self):
         return f"{self.name} - {self.city}"
 
+    def save(self, *args, **kwargs):
+        self.amenity_flags = amenity_mask(self.amenities)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'amenities' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'amenity_flags'}
+        super().save(*args, **kwargs)
+
     @property
     def price_range_category(self):
-        """Categorize price for filtering"""
-        if self.price_per_hour < 75000:
-            return 'budget'
-        elif self.price_per_hour < 150000:
-            return 'mid'
-        else:
-            return 'premium'
+        """Categorize price for filtering, using the same PRICE_CATEGORY_BOUNDS as the queryset"""
+        for category, (low, high) in PRICE_CATEGORY_BOUNDS.items():
+            if (low is None or self.price_per_hour >= low) and (high is None or self.price_per_hour < high):
+                return category
+        return None
 
     def get_available_slots(self, date):
         """Get available time slots for a specific date"""
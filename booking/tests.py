@@ -1,3 +1,5 @@
+from unittest import mock
+
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -99,3 +101,57 @@ class BookingModelTest(TestCase):
         )
 
         self.assertFalse(past_booking.can_cancel)
+
+
+class FieldFilterTest(TestCase):
+    def setUp(self):
+        self.cheap = PlayingField.objects.create(
+            name='Cheap Court', city='Jakarta', price_per_hour=50000,
+            amenities=['parking', 'shower']
+        )
+        self.mid = PlayingField.objects.create(
+            name='Mid Court', city='Jakarta', price_per_hour=100000,
+            amenities=['parking']
+        )
+        self.premium = PlayingField.objects.create(
+            name='Premium Court', city='Bogor', price_per_hour=200000,
+            amenities=['shower', 'cafe', 'locker']
+        )
+
+    def test_amenity_flags_synced_on_save(self):
+        self.assertEqual(self.cheap.amenity_flags, 1 | 4)
+        self.mid.amenities = ['cafe']
+        self.mid.save(update_fields=['amenities'])
+        self.mid.refresh_from_db()
+        self.assertEqual(self.mid.amenity_flags, 8)
+
+    def test_price_category_annotation_matches_property(self):
+        for field in PlayingField.objects.with_price_category():
+            self.assertEqual(field.price_category, field.price_range_category)
+
+    def test_price_category_follows_bounds(self):
+        bounds = {'budget': (None, 50000), 'mid': (50000, 100000), 'premium': (100000, None)}
+        with mock.patch.dict('booking.models.PRICE_CATEGORY_BOUNDS', bounds):
+            self.assertEqual(self.cheap.price_range_category, 'mid')
+            self.assertEqual(self.mid.price_range_category, 'premium')
+            for field in PlayingField.objects.with_price_category():
+                self.assertEqual(field.price_category, field.price_range_category)
+
+    def test_queryset_filters(self):
+        self.assertEqual(list(PlayingField.objects.in_price_category('budget')), [self.cheap])
+        self.assertEqual(list(PlayingField.objects.in_price_category('premium')), [self.premium])
+        self.assertFalse(PlayingField.objects.in_price_category('luxury').exists())
+        showers = set(PlayingField.objects.with_amenities(['shower']))
+        self.assertEqual(showers, {self.cheap, self.premium})
+        self.assertEqual(list(PlayingField.objects.with_amenities(['shower', 'parking'])), [self.cheap])
+        self.assertFalse(PlayingField.objects.with_amenities(['pool']).exists())
+
+    def test_api_fields_filters(self):
+        from django.urls import reverse
+        resp = self.client.get(reverse('booking:api_fields'), {'price_category': 'mid'})
+        data = resp.json()['data']
+        self.assertEqual([f['name'] for f in data], ['Mid Court'])
+        self.assertEqual(data[0]['price_range_category'], 'mid')
+
+        resp = self.client.get(reverse('booking:api_fields'), {'amenities': 'shower,cafe'})
+        self.assertEqual([f['name'] for f in resp.json()['data']], ['Premium Court'])
@@ -46,7 +46,7 @@ def _serialize_field(field, request):
         "created_at": field.created_at.isoformat() if field.created_at else None,
         "updated_at": field.updated_at.isoformat() if field.updated_at else None,
         "is_active": field.is_active,
-        "price_range_category": field.price_range_category,
+        "price_range_category": getattr(field, 'price_category', None) or field.price_range_category,
     }
 
 
@@ -119,6 +119,14 @@ class FieldListView(ListView):
         if self.request.GET.get('has_backboard') == 'true':
             queryset = queryset.filter(has_backboard=True)
 
+        # Price category and amenities filter
+        price_category = self.request.GET.get('price_category')
+        if price_category:
+            queryset = queryset.in_price_category(price_category)
+        amenities = self.request.GET.get('amenities')
+        if amenities:
+            queryset = queryset.with_amenities([a.strip() for a in amenities.split(',') if a.strip()])
+
         # Sorting
         sort = self.request.GET.get('sort', 'default')
         if sort == 'price_low':
@@ -638,7 +646,7 @@ def api_fields(request):
     """List active fields for mobile with filtering and pagination support."""
     from django.core.paginator import Paginator
 
-    queryset = PlayingField.objects.filter(is_active=True)
+    queryset = PlayingField.objects.filter(is_active=True).with_price_category()
 
     # Search
     search = request.GET.get('search')
@@ -668,6 +676,14 @@ def api_fields(request):
     if request.GET.get('has_backboard') == 'true':
         queryset = queryset.filter(has_backboard=True)
 
+    # Price category and amenities filter
+    price_category = request.GET.get('price_category')
+    if price_category:
+        queryset = queryset.in_price_category(price_category)
+    amenities = request.GET.get('amenities')
+    if amenities:
+        queryset = queryset.with_amenities([a.strip() for a in amenities.split(',') if a.strip()])
+
     # Sorting
     sort = request.GET.get('sort', 'default')
     if sort == 'price_low':
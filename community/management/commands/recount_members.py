@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from community.models import Community, recount_members
+
+
+class Command(BaseCommand):
+    help = 'Recompute Community.member_count from the membership table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Communities per UPDATE')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        max_id = Community.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+        updated = 0
+        for start in range(0, max_id, batch_size):
+            ids = Community.objects.filter(id__gt=start, id__lte=start + batch_size).values('id')
+            updated += recount_members(ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted members of {updated} communities'))
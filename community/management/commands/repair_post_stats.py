@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from community.models import Post
+from community.services import refresh_post_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute Post.reply_count and Post.last_activity_at from replies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Posts per UPDATE')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        max_id = Post.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+        updated = 0
+        for start in range(0, max_id, batch_size):
+            ids = Post.objects.filter(id__gt=start, id__lte=start + batch_size).values('id')
+            updated += refresh_post_stats(ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Repaired stats for {updated} posts'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_member_count(apps, schema_editor):
+    Community = apps.get_model('community', 'Community')
+    communities = list(Community.objects.annotate(total=Count('members')))
+    for community in communities:
+        community.member_count = community.total
+    Community.objects.bulk_update(communities, ['member_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='community',
+            index=models.Index(fields=['-member_count'], name='community_c_member__45677f_idx'),
+        ),
+        migrations.RunPython(backfill_member_count, migrations.RunPython.noop),
+    ]
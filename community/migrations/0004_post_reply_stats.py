@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:02
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_reply_stats(apps, schema_editor):
+    Post = apps.get_model('community', 'Post')
+    Reply = apps.get_model('community', 'Reply')
+    replies = Reply.objects.filter(post_id=OuterRef('pk')).order_by().values('post_id')
+    Post.objects.update(
+        reply_count=Coalesce(Subquery(replies.annotate(total=Count('pk')).values('total')), 0),
+        last_activity_at=Coalesce(Subquery(replies.annotate(latest=Max('created_at')).values('latest')), F('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0003_feed_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['community', '-last_activity_at'], name='community_p_communi_f309f8_idx'),
+        ),
+        migrations.RunPython(backfill_reply_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+# Frozen copy of the DDL in community.search at the time of this migration,
+# so later changes to that module cannot alter or break it.
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS community_post_fts USING fts5("
+    "title, content, content='community_post', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS community_post_fts_ai AFTER INSERT ON community_post BEGIN "
+    "INSERT INTO community_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS community_post_fts_ad AFTER DELETE ON community_post BEGIN "
+    "INSERT INTO community_post_fts(community_post_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS community_post_fts_au AFTER UPDATE OF title, content ON community_post BEGIN "
+    "INSERT INTO community_post_fts(community_post_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO community_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "INSERT INTO community_post_fts(community_post_fts) VALUES ('rebuild')",
+
+    "CREATE VIRTUAL TABLE IF NOT EXISTS community_reply_fts USING fts5("
+    "content, content='community_reply', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS community_reply_fts_ai AFTER INSERT ON community_reply BEGIN "
+    "INSERT INTO community_reply_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS community_reply_fts_ad AFTER DELETE ON community_reply BEGIN "
+    "INSERT INTO community_reply_fts(community_reply_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS community_reply_fts_au AFTER UPDATE OF content ON community_reply BEGIN "
+    "INSERT INTO community_reply_fts(community_reply_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); "
+    "INSERT INTO community_reply_fts(rowid, content) VALUES (new.id, new.content); END",
+    "INSERT INTO community_reply_fts(community_reply_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS community_post_fts_ai",
+    "DROP TRIGGER IF EXISTS community_post_fts_ad",
+    "DROP TRIGGER IF EXISTS community_post_fts_au",
+    "DROP TABLE IF EXISTS community_post_fts",
+    "DROP TRIGGER IF EXISTS community_reply_fts_ai",
+    "DROP TRIGGER IF EXISTS community_reply_fts_ad",
+    "DROP TRIGGER IF EXISTS community_reply_fts_au",
+    "DROP TABLE IF EXISTS community_reply_fts",
+]
+
+
+def gin_indexes(apps):
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    post_vector = (
+        SearchVector('title', weight='A', config='simple')
+        + SearchVector('content', weight='B', config='simple')
+    )
+    reply_vector = SearchVector('content', weight='B', config='simple')
+    return [
+        (apps.get_model('community', 'Post'), GinIndex(post_vector, name='community_post_search_idx')),
+        (apps.get_model('community', 'Reply'), GinIndex(reply_vector, name='community_reply_search_idx')),
+    ]
+
+
+def install(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_INSTALL:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for model, index in gin_indexes(apps):
+            schema_editor.add_index(model, index)
+
+
+def uninstall(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_UNINSTALL:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for model, index in gin_indexes(apps):
+            schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0004_post_reply_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def add_creator_memberships(apps, schema_editor):
+    Community = apps.get_model('community', 'Community')
+    Membership = Community.members.through
+
+    missing = Community.objects.exclude(
+        pk__in=Membership.objects.filter(user_id=OuterRef('creator_id')).values('community_id')
+    ).values_list('pk', 'creator_id')
+    Membership.objects.bulk_create(
+        [Membership(community_id=pk, user_id=creator_id) for pk, creator_id in missing],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+    counts = (
+        Membership.objects.filter(community_id=OuterRef('pk'))
+        .values('community_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Community.objects.update(member_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0006_community_read_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_creator_memberships, migrations.RunPython.noop),
+    ]
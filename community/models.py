@@ -1,4 +1,9 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Community(models.Model):
@@ -7,6 +12,13 @@ class Community(models.Model):
     members = models.ManyToManyField(User, related_name='joined_communities', blank=True)
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_communities')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized members.count(), maintained by sync_member_count
+    member_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-member_count']),
+        ]
 
     def __str__(self):
         return self.name
@@ -17,9 +29,16 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized reply stats, maintained by community.services
+    reply_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['community', '-created_at']),
+            models.Index(fields=['community', '-last_activity_at']),
+        ]
 
     def __str__(self):
         return f'Post by {self.author.username} in {self.community.name}'
@@ -32,6 +51,94 @@ class Reply(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'created_at']),
+        ]
 
     def __str__(self):
-        return f'Reply by {self.author.username} to {self.post.id}'
\ No newline at end of file
+        return f'Reply by {self.author.username} to {self.post.id}'
+
+class CommunityReadState(models.Model):
+    """Per-user watermark: posts created after last_seen_at are unread"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='community_read_states')
+    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='read_states')
+    last_seen_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'community'], name='unique_community_read_state'),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} saw {self.community.name} at {self.last_seen_at}'
+
+
+def recount_members(community_ids):
+    """Recompute member_count for the given communities in a single UPDATE"""
+    Membership = Community.members.through
+    counts = (
+        Membership.objects.filter(community_id=OuterRef('pk'))
+        .values('community_id')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Community.objects.filter(pk__in=community_ids).update(
+        member_count=Coalesce(Subquery(counts), 0)
+    )
+
+@receiver(m2m_changed, sender=Community.members.through)
+def sync_member_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_community_ids = list(
+                instance.joined_communities.values_list('id', flat=True)
+            )
+        else:
+            instance._cleared_member_ids = list(
+                instance.members.values_list('id', flat=True)
+            )
+        return
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        from .services import forget_joined_communities, invalidate_joined_communities
+
+        if reverse:
+            forget_joined_communities(instance)
+        elif action == 'post_clear':
+            invalidate_joined_communities(instance.__dict__.pop('_cleared_member_ids', []))
+        else:
+            invalidate_joined_communities(pk_set or [])
+
+    if action == 'post_add':
+        # Django only reports ids that were actually inserted
+        if not pk_set:
+            return
+        if reverse:
+            Community.objects.filter(pk__in=pk_set).update(member_count=models.F('member_count') + 1)
+        else:
+            Community.objects.filter(pk=instance.pk).update(member_count=models.F('member_count') + len(pk_set))
+    elif action == 'post_remove':
+        recount_members(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        recount_members(instance.__dict__.pop('_cleared_community_ids', []) if reverse else [instance.pk])
+
+@receiver(post_save, sender=Community)
+def add_creator_membership(sender, instance, created, raw=False, **kwargs):
+    """The creator is a member from the start, so reads never need to fix it up"""
+    if not created or raw:
+        return
+    from .services import join
+
+    if join(instance.creator, instance.pk):
+        instance.member_count += 1
+
+@receiver(pre_delete, sender=User)
+def remember_joined_communities(sender, instance, **kwargs):
+    # The membership rows go with the user without m2m_changed firing
+    instance._deleted_community_ids = list(
+        Community.members.through.objects.filter(user_id=instance.pk).values_list('community_id', flat=True)
+    )
+
+@receiver(post_delete, sender=User)
+def recount_after_user_delete(sender, instance, **kwargs):
+    recount_members(instance.__dict__.pop('_deleted_community_ids', []))
@@ -0,0 +1,193 @@
+"""
+Full-text search over community posts and replies.
+
+PostgreSQL: expression GIN indexes over the same weighted SearchVector
+used at query time, so Postgres keeps them current on every write.
+SQLite: FTS5 external-content tables kept in sync by triggers.
+Other backends fall back to icontains scans.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F
+
+from .models import Post, Reply
+
+POST_FTS_TABLE = 'community_post_fts'
+REPLY_FTS_TABLE = 'community_reply_fts'
+POST_GIN_INDEX = 'community_post_search_idx'
+REPLY_GIN_INDEX = 'community_reply_search_idx'
+
+
+def post_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('title', weight='A', config='simple')
+        + SearchVector('content', weight='B', config='simple')
+    )
+
+
+def reply_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('content', weight='B', config='simple')
+
+
+_SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {POST_FTS_TABLE} USING fts5("
+    f"title, content, content='community_post', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {POST_FTS_TABLE}_ai AFTER INSERT ON community_post BEGIN "
+    f"INSERT INTO {POST_FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {POST_FTS_TABLE}_ad AFTER DELETE ON community_post BEGIN "
+    f"INSERT INTO {POST_FTS_TABLE}({POST_FTS_TABLE}, rowid, title, content) "
+    f"VALUES ('delete', old.id, old.title, old.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {POST_FTS_TABLE}_au AFTER UPDATE OF title, content ON community_post BEGIN "
+    f"INSERT INTO {POST_FTS_TABLE}({POST_FTS_TABLE}, rowid, title, content) "
+    f"VALUES ('delete', old.id, old.title, old.content); "
+    f"INSERT INTO {POST_FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    f"INSERT INTO {POST_FTS_TABLE}({POST_FTS_TABLE}) VALUES ('rebuild')",
+
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {REPLY_FTS_TABLE} USING fts5("
+    f"content, content='community_reply', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {REPLY_FTS_TABLE}_ai AFTER INSERT ON community_reply BEGIN "
+    f"INSERT INTO {REPLY_FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {REPLY_FTS_TABLE}_ad AFTER DELETE ON community_reply BEGIN "
+    f"INSERT INTO {REPLY_FTS_TABLE}({REPLY_FTS_TABLE}, rowid, content) "
+    f"VALUES ('delete', old.id, old.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {REPLY_FTS_TABLE}_au AFTER UPDATE OF content ON community_reply BEGIN "
+    f"INSERT INTO {REPLY_FTS_TABLE}({REPLY_FTS_TABLE}, rowid, content) "
+    f"VALUES ('delete', old.id, old.content); "
+    f"INSERT INTO {REPLY_FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"INSERT INTO {REPLY_FTS_TABLE}({REPLY_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+_SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {POST_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {POST_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {POST_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {POST_FTS_TABLE}",
+    f"DROP TRIGGER IF EXISTS {REPLY_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {REPLY_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {REPLY_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {REPLY_FTS_TABLE}",
+]
+
+
+def install_search_index(schema_editor, post_model=Post, reply_model=Reply):
+    """
+    Create the backend's search index. Idempotent on SQLite, so it can be
+    re-run after a migration that rebuilds community_post/community_reply.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in _SQLITE_INSTALL:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+
+        schema_editor.add_index(post_model, GinIndex(post_vector(), name=POST_GIN_INDEX))
+        schema_editor.add_index(reply_model, GinIndex(reply_vector(), name=REPLY_GIN_INDEX))
+
+
+def uninstall_search_index(schema_editor, post_model=Post, reply_model=Reply):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in _SQLITE_UNINSTALL:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+
+        schema_editor.remove_index(post_model, GinIndex(post_vector(), name=POST_GIN_INDEX))
+        schema_editor.remove_index(reply_model, GinIndex(reply_vector(), name=REPLY_GIN_INDEX))
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _sqlite_hits(table, model_table, join_sql, community_ids, terms, limit):
+    match = ' '.join(f'"{term}"' for term in terms)
+    placeholders = ', '.join(['%s'] * len(community_ids))
+    sql = (
+        f"SELECT {model_table}.id, bm25({table}) AS score "
+        f"FROM {table} JOIN {model_table} ON {model_table}.id = {table}.rowid {join_sql} "
+        f"WHERE {table} MATCH %s AND community_post.community_id IN ({placeholders}) "
+        f"ORDER BY score, {model_table}.id DESC LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *community_ids, limit])
+        # bm25 is lower-is-better, flip it so higher scores rank first
+        return [(-score, pk) for pk, score in cursor.fetchall()]
+
+
+def _post_hits(terms, community_ids, limit):
+    if connection.vendor == 'sqlite':
+        return _sqlite_hits(POST_FTS_TABLE, 'community_post', '', community_ids, terms, limit)
+
+    posts = Post.objects.filter(community_id__in=community_ids)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(' '.join(terms), config='simple')
+        posts = posts.annotate(document=post_vector()).filter(document=query).annotate(
+            score=SearchRank(F('document'), query)
+        ).order_by('-score', '-id')
+        return [(score, pk) for pk, score in posts.values_list('id', 'score')[:limit]]
+
+    for term in terms:
+        posts = posts.filter(title__icontains=term) | posts.filter(content__icontains=term)
+    return [(0, pk) for pk in posts.order_by('-id').values_list('id', flat=True)[:limit]]
+
+
+def _reply_hits(terms, community_ids, limit):
+    if connection.vendor == 'sqlite':
+        join_sql = 'JOIN community_post ON community_post.id = community_reply.post_id'
+        return _sqlite_hits(REPLY_FTS_TABLE, 'community_reply', join_sql, community_ids, terms, limit)
+
+    replies = Reply.objects.filter(post__community_id__in=community_ids)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(' '.join(terms), config='simple')
+        replies = replies.annotate(document=reply_vector()).filter(document=query).annotate(
+            score=SearchRank(F('document'), query)
+        ).order_by('-score', '-id')
+        return [(score, pk) for pk, score in replies.values_list('id', 'score')[:limit]]
+
+    for term in terms:
+        replies = replies.filter(content__icontains=term)
+    return [(0, pk) for pk in replies.order_by('-id').values_list('id', flat=True)[:limit]]
+
+
+def search_discussions(query, community_ids, offset=0, limit=20):
+    """
+    Ranked posts and replies matching `query` within `community_ids`.
+    Returns (hits, has_next) where each hit is a ('post'|'reply', obj, score).
+    """
+    terms = _terms(query)
+    community_ids = list(community_ids)
+    if not terms or not community_ids:
+        return [], False
+
+    window = offset + limit + 1
+    ranked = sorted(
+        [(score, 'post', pk) for score, pk in _post_hits(terms, community_ids, window)]
+        + [(score, 'reply', pk) for score, pk in _reply_hits(terms, community_ids, window)],
+        key=lambda hit: (-hit[0], hit[1], -hit[2]),
+    )
+    page = ranked[offset:offset + limit]
+    has_next = len(ranked) > offset + limit
+
+    posts = Post.objects.select_related('author', 'community').in_bulk(
+        [pk for _, kind, pk in page if kind == 'post']
+    )
+    replies = Reply.objects.select_related('author', 'post__community').in_bulk(
+        [pk for _, kind, pk in page if kind == 'reply']
+    )
+    hits = []
+    for score, kind, pk in page:
+        obj = posts.get(pk) if kind == 'post' else replies.get(pk)
+        if obj is not None:
+            hits.append((kind, obj, score))
+    return hits, has_next
@@ -0,0 +1,249 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FilteredRelation, Max, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from .models import Community, CommunityReadState, Post, Reply
+
+# Seconds a user's joined-community set stays cached. Writes through
+# members.add/remove invalidate it, the timeout only bounds staleness
+# across workers that do not share a cache.
+MEMBERSHIP_CACHE_TIMEOUT = getattr(settings, 'COMMUNITY_MEMBERSHIP_CACHE_TIMEOUT', 300)
+
+Membership = Community.members.through
+
+
+def _joined_cache_key(user_id):
+    return f'community:joined:{user_id}'
+
+
+def joined_community_ids(user):
+    """Set of community ids the user belongs to, cached per user"""
+    if not user.is_authenticated:
+        return frozenset()
+
+    # Memoize on the user object so one request unpickles the set once
+    if hasattr(user, '_joined_community_ids'):
+        return user._joined_community_ids
+
+    key = _joined_cache_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            Membership.objects.filter(user_id=user.pk).values_list('community_id', flat=True)
+        )
+        cache.set(key, ids, MEMBERSHIP_CACHE_TIMEOUT)
+    user._joined_community_ids = ids
+    return ids
+
+
+def is_member(user, community_id, fresh=False):
+    """
+    Membership check served from the cached id set. A miss is confirmed
+    against the (community, user) unique index, since the set may predate
+    a join handled by another worker.
+
+    A cached hit can outlive a leave handled by another worker for up to
+    MEMBERSHIP_CACHE_TIMEOUT, so write paths pass fresh=True to always ask
+    the database; a stale cached set is dropped when the answers disagree.
+    """
+    if not user.is_authenticated:
+        return False
+    cached = community_id in joined_community_ids(user)
+    if cached and not fresh:
+        return True
+
+    exists = Membership.objects.filter(community_id=community_id, user_id=user.pk).exists()
+    if exists != cached:
+        forget_joined_communities(user)
+    return exists
+
+
+def invalidate_joined_communities(user_ids):
+    cache.delete_many([_joined_cache_key(user_id) for user_id in user_ids])
+
+
+def forget_joined_communities(user):
+    """Invalidate `user`'s cached id set and the copy memoized on the object"""
+    try:
+        del user._joined_community_ids
+    except AttributeError:
+        pass
+    invalidate_joined_communities([user.pk])
+
+
+def join(user, community_id):
+    """
+    Add a membership row, returns False if it already existed.
+
+    Relies on the through table's unique (community, user) constraint
+    instead of reading first, so concurrent joins cannot double count.
+    """
+    try:
+        with transaction.atomic():
+            Membership.objects.create(community_id=community_id, user_id=user.pk)
+            Community.objects.filter(pk=community_id).update(member_count=F('member_count') + 1)
+    except IntegrityError:
+        return False
+    forget_joined_communities(user)
+    return True
+
+
+def leave(user, community_id):
+    """Delete a membership row, returns False if there was none"""
+    with transaction.atomic():
+        deleted, _ = Membership.objects.filter(community_id=community_id, user_id=user.pk).delete()
+        if deleted:
+            Community.objects.filter(pk=community_id, member_count__gt=0).update(
+                member_count=F('member_count') - 1
+            )
+    if deleted:
+        forget_joined_communities(user)
+    return bool(deleted)
+
+
+def mark_seen(user, community_id, seen_at=None):
+    """Move the user's read watermark for a community forward to seen_at"""
+    seen_at = seen_at or timezone.now()
+    state, created = CommunityReadState.objects.get_or_create(
+        user=user, community_id=community_id, defaults={'last_seen_at': seen_at}
+    )
+    if not created and state.last_seen_at < seen_at:
+        # Never move the watermark backwards when requests race
+        CommunityReadState.objects.filter(pk=state.pk, last_seen_at__lt=seen_at).update(
+            last_seen_at=seen_at
+        )
+        state.last_seen_at = seen_at
+    return state
+
+
+def unread_summary(user):
+    """
+    Joined communities annotated with unread_count, last_seen_at and
+    latest_post_at in one grouped query. Without a watermark every post by
+    someone else counts as unread.
+    """
+    unread = Q(posts__created_at__gt=F('read_state__last_seen_at')) | Q(read_state__isnull=True)
+    return (
+        Community.objects.filter(pk__in=joined_community_ids(user))
+        .annotate(read_state=FilteredRelation('read_states', condition=Q(read_states__user=user)))
+        .annotate(
+            last_seen_at=Max('read_state__last_seen_at'),
+            latest_post_at=Max('posts__created_at'),
+            unread_count=Count('posts', filter=unread & ~Q(posts__author=user)),
+        )
+        .order_by(F('latest_post_at').desc(nulls_last=True), 'name')
+    )
+
+
+def latest_replies_by_post(post_ids, limit):
+    """
+    Latest `limit` replies of each post in one windowed query, returned as
+    {post_id: [replies oldest first]}.
+    """
+    previews = {post_id: [] for post_id in post_ids}
+    if not post_ids or limit < 1:
+        return previews
+
+    replies = (
+        Reply.objects.filter(post_id__in=post_ids)
+        .select_related('author')
+        .annotate(
+            recency=Window(
+                expression=RowNumber(),
+                partition_by=[F('post_id')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        )
+        .filter(recency__lte=limit)
+        .order_by('post_id', 'created_at', 'id')
+    )
+    for reply in replies:
+        previews[reply.post_id].append(reply)
+    return previews
+
+
+def create_reply(post, author, content):
+    """Create a reply and bump the post's reply stats in one transaction"""
+    with transaction.atomic():
+        reply = Reply.objects.create(post=post, author=author, content=content)
+        Post.objects.filter(pk=post.pk).update(
+            reply_count=F('reply_count') + 1,
+            last_activity_at=reply.created_at,
+        )
+    return reply
+
+
+def delete_reply(reply):
+    with transaction.atomic():
+        reply.delete()
+        refresh_post_stats([reply.post_id])
+
+
+def refresh_post_stats(post_ids=None):
+    """
+    Recompute reply_count and last_activity_at from the replies table in a
+    single UPDATE. With post_ids=None every post is refreshed.
+    """
+    replies = Reply.objects.filter(post_id=OuterRef('pk')).order_by().values('post_id')
+    posts = Post.objects.all() if post_ids is None else Post.objects.filter(pk__in=post_ids)
+    return posts.update(
+        reply_count=Coalesce(Subquery(replies.annotate(total=Count('pk')).values('total')), 0),
+        last_activity_at=Coalesce(
+            Subquery(replies.annotate(latest=Max('created_at')).values('latest')),
+            F('created_at'),
+        ),
+    )
+
+
+MODERATION_BATCH_SIZE = 500
+
+
+def _batches(ids, size):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def bulk_delete(post_ids=(), reply_ids=(), post_filter=None, reply_filter=None,
+                batch_size=MODERATION_BATCH_SIZE):
+    """
+    Delete posts and replies by id and/or by Q filter in one transaction.
+
+    Deletes run as set-based DELETEs of at most `batch_size` ids each, and
+    reply stats of surviving posts are refreshed once at the end. Returns
+    ({post_id: status}, {reply_id: status}) with status 'deleted' or
+    'not_found'; rows matched only by a filter are reported as deleted.
+    """
+    post_results = {pk: 'not_found' for pk in post_ids}
+    reply_results = {pk: 'not_found' for pk in reply_ids}
+
+    with transaction.atomic():
+        posts = set()
+        for batch in _batches(post_results, batch_size):
+            posts.update(Post.objects.filter(pk__in=batch).values_list('pk', flat=True))
+        if post_filter is not None:
+            posts.update(Post.objects.filter(post_filter).values_list('pk', flat=True))
+
+        replies = {}
+        for batch in _batches(reply_results, batch_size):
+            replies.update(Reply.objects.filter(pk__in=batch).values_list('pk', 'post_id'))
+        if reply_filter is not None:
+            replies.update(Reply.objects.filter(reply_filter).values_list('pk', 'post_id'))
+
+        # Replies under a deleted post go with it, no need to touch them twice
+        orphaned = {pk for pk, post_id in replies.items() if post_id not in posts}
+        for batch in _batches(orphaned, batch_size):
+            Reply.objects.filter(pk__in=batch).delete()
+        for batch in _batches(posts, batch_size):
+            Reply.objects.filter(post_id__in=batch).delete()
+            Post.objects.filter(pk__in=batch).delete()
+
+        for batch in _batches({replies[pk] for pk in orphaned}, batch_size):
+            refresh_post_stats(batch)
+
+    post_results.update(dict.fromkeys(posts, 'deleted'))
+    reply_results.update(dict.fromkeys(replies, 'deleted'))
+    return post_results, reply_results
@@ -1,9 +1,20 @@
-from django.test import TestCase, Client
+import json
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from community.models import Community, Post, Reply
+from community.models import Community, CommunityReadState, Post, Reply
+from community.services import is_member, joined_community_ids
+from playserve import events, metrics, ratelimit
 
 DUMMY_TEMPLATES = {
     'discover_communities.html': '{% for c in communities %}{{ c.name }} {% endfor %}',
@@ -33,6 +44,7 @@ class BaseSetup(TestCase):
     def setUp(self):
         self._tmpl_cm = self.settings(TEMPLATES=OVERRIDDEN_TEMPLATES)
         self._tmpl_cm.__enter__()
+        cache.clear()
 
         self.client = Client()
 
@@ -121,6 +133,31 @@ class JoinCommunityTests(BaseSetup):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.json()['status'], 'already_joined')
 
+    def test_join_is_idempotent(self):
+        self.client.login(username='user', password='pass')
+        url = reverse('join_community', args=[self.comm_by_super.id])
+        self.client.post(url)
+        resp = self.client.post(url)
+        self.assertEqual(resp.json()['status'], 'already_joined')
+        self.assertEqual(resp.json()['members_count'], 2)
+
+    def test_leave(self):
+        self.client.login(username='user', password='pass')
+        url = reverse('leave_community', args=[self.comm_by_staff.id])
+        joined_community_ids(User.objects.get(pk=self.user.pk))
+        resp = self.client.post(url)
+        self.assertEqual(resp.json(), {
+            'status': 'left', 'community_name': 'DjangoID', 'members_count': 1,
+        })
+        self.assertFalse(is_member(User.objects.get(pk=self.user.pk), self.comm_by_staff.id))
+        self.assertEqual(self.client.post(url).json()['status'], 'not_joined')
+
+    def test_creator_cannot_leave(self):
+        self.client.login(username='staff', password='pass')
+        resp = self.client.post(reverse('leave_community', args=[self.comm_by_staff.id]))
+        self.assertEqual(resp.status_code, 400)
+        self.assertTrue(is_member(self.staff, self.comm_by_staff.id))
+
 class CreateCommunityTests(BaseSetup):
     def test_requires_admin(self):
         self.client.login(username='user', password='pass')
@@ -206,13 +243,17 @@ class DeleteCommunityTests(BaseSetup):
         self.assertIn("Community deleted successfully.", msgs)
 
 class CommunityDetailTests(BaseSetup):
-    def test_creator_auto_added_if_not_member(self):
+    def test_creator_is_member_from_creation(self):
+        self.assertTrue(self.comm_by_super.members.filter(id=self.super.id).exists())
+        self.assertEqual(self.comm_by_super.member_count, 1)
+
+    def test_creator_view_does_not_write_membership(self):
         self.comm_by_super.members.remove(self.super)
         self.client.login(username='super', password='pass')
         url = reverse('community_detail', args=[self.comm_by_super.id])
-        resp = self.client.get(url, follow=True)
+        resp = self.client.get(url)
         self.assertEqual(resp.status_code, 200)
-        self.assertTrue(self.comm_by_super.members.filter(id=self.super.id).exists())
+        self.assertFalse(self.comm_by_super.members.filter(id=self.super.id).exists())
 
     def test_non_member_redirect(self):
         self.client.login(username='staff', password='pass')
@@ -232,7 +273,7 @@ class CommunityDetailTests(BaseSetup):
 
 class CreatePostTests(BaseSetup):
     def test_must_be_member(self):
-        self.client.login(username='staff', password='pass')
+        self.client.login(username='super', password='pass')
         url = reverse('create_post', args=[self.comm_by_staff.id])
         resp = self.client.post(url, {'title': 'x', 'content': 'y'}, follow=True)
         msgs = [m.message for m in get_messages(resp.wsgi_request)]
@@ -254,7 +295,7 @@ class CreatePostTests(BaseSetup):
 
 class CreateReplyTests(BaseSetup):
     def test_must_be_member(self):
-        self.client.login(username='staff', password='pass')
+        self.client.login(username='super', password='pass')
         url = reverse('create_reply', args=[self.post1.id])
         resp = self.client.post(url, {'content': 'hi'})
         self.assertEqual(resp.status_code, 302)
@@ -297,3 +338,534 @@ class DeleteContentAdminOnlyTests(BaseSetup):
         self.assertFalse(Reply.objects.filter(id=self.reply1.id).exists())
         msgs = [m.message for m in get_messages(resp.wsgi_request)]
         self.assertIn("Reply has been removed.", msgs)
+
+
+class MemberCountTests(BaseSetup):
+    def test_member_count_tracks_add_and_remove(self):
+        # The creator joined on creation
+        self.comm_by_super.members.add(self.user, self.staff)
+        self.comm_by_super.refresh_from_db()
+        self.assertEqual(self.comm_by_super.member_count, 3)
+
+        self.user.joined_communities.remove(self.comm_by_super)
+        self.comm_by_super.refresh_from_db()
+        self.assertEqual(self.comm_by_super.member_count, 2)
+
+        self.staff.joined_communities.clear()
+        self.comm_by_super.refresh_from_db()
+        self.assertEqual(self.comm_by_super.member_count, 1)
+
+    def test_member_count_survives_user_delete(self):
+        self.comm_by_super.members.add(self.user, self.staff)
+        self.user.delete()
+        User.objects.filter(pk=self.staff.pk).delete()
+        self.comm_by_super.refresh_from_db()
+        self.assertEqual(self.comm_by_super.member_count, 1)
+
+    def test_recount_members_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        Community.objects.update(member_count=99)
+        call_command('recount_members', batch_size=1, stdout=StringIO())
+        counts = dict(Community.objects.values_list('id', 'member_count'))
+        self.assertEqual(counts[self.comm_by_staff.id], self.comm_by_staff.members.count())
+        self.assertEqual(counts[self.comm_by_super.id], 1)
+
+    def test_discover_json_constant_queries(self):
+        for i in range(5):
+            c = Community.objects.create(name=f'Extra {i}', creator=self.staff)
+            c.members.add(self.user)
+        self.client.login(username='user', password='pass')
+        url = reverse('discover_communities_json')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        baseline = len(ctx.captured_queries)
+        Community.objects.create(name='One More', creator=self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), baseline)
+        item = next(c for c in resp.json() if c['id'] == self.comm_by_staff.id)
+        self.assertEqual(item['members_count'], 2)
+        self.assertEqual(item['creator_username'], 'staff')
+
+    def test_discover_json_ranking_and_pagination(self):
+        Community.objects.create(name='Jakarta Tennis', creator=self.staff)
+        Community.objects.create(name='Tennis', creator=self.staff)
+        Community.objects.create(name='Bogor', description='tennis lovers', creator=self.staff)
+        self.client.login(username='user', password='pass')
+        resp = self.client.get(reverse('discover_communities_json'), {'q': 'tennis'})
+        self.assertEqual([c['name'] for c in resp.json()], ['Tennis', 'Jakarta Tennis', 'Bogor'])
+
+        resp = self.client.get(reverse('discover_communities_json'), {'q': 'tennis', 'page': 2, 'page_size': 2})
+        body = resp.json()
+        self.assertEqual([c['name'] for c in body['data']], ['Bogor'])
+        self.assertEqual(body['pagination']['total_items'], 3)
+        self.assertFalse(body['pagination']['has_next'])
+
+
+class MembershipServiceTests(BaseSetup):
+    def test_cached_membership_needs_no_queries(self):
+        self.assertTrue(is_member(self.user, self.comm_by_staff.id))
+        fresh = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_member(fresh, self.comm_by_staff.id))
+
+    def test_cache_invalidated_on_add_and_remove(self):
+        self.assertEqual(joined_community_ids(self.user), {self.comm_by_staff.id})
+        self.comm_by_super.members.add(self.user)
+        fresh = User.objects.get(pk=self.user.pk)
+        self.assertEqual(joined_community_ids(fresh), {self.comm_by_staff.id, self.comm_by_super.id})
+
+        self.user.joined_communities.remove(self.comm_by_staff)
+        fresh = User.objects.get(pk=self.user.pk)
+        self.assertFalse(is_member(fresh, self.comm_by_staff.id))
+
+    def test_stale_miss_falls_back_to_index(self):
+        joined_community_ids(self.user)
+        Community.members.through.objects.create(community=self.comm_by_super, user=self.user)
+        fresh = User.objects.get(pk=self.user.pk)
+        self.assertTrue(is_member(fresh, self.comm_by_super.id))
+
+    def test_join_and_leave_reset_memoized_ids(self):
+        from community import services
+
+        self.assertNotIn(self.comm_by_super.id, joined_community_ids(self.user))
+        services.join(self.user, self.comm_by_super.id)
+        self.assertIn(self.comm_by_super.id, joined_community_ids(self.user))
+        services.leave(self.user, self.comm_by_super.id)
+        self.assertNotIn(self.comm_by_super.id, joined_community_ids(self.user))
+
+        self.user.joined_communities.add(self.comm_by_super)
+        self.assertIn(self.comm_by_super.id, joined_community_ids(self.user))
+
+    def test_write_paths_ignore_stale_hit(self):
+        joined_community_ids(self.user)
+        # A leave handled by another worker leaves this cache untouched
+        Community.members.through.objects.filter(community=self.comm_by_staff, user=self.user).delete()
+        fresh = User.objects.get(pk=self.user.pk)
+        self.assertTrue(is_member(fresh, self.comm_by_staff.id))
+
+        self.client.login(username='user', password='pass')
+        resp = self.client.post(
+            reverse('create_post_json', args=[self.comm_by_staff.id]),
+            data=json.dumps({'title': 't', 'content': 'c'}), content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.post(
+            reverse('create_reply_json', args=[self.post1.id]),
+            data=json.dumps({'content': 'c'}), content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(is_member(User.objects.get(pk=self.user.pk), self.comm_by_staff.id))
+
+
+class CommunityFeedTests(BaseSetup):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.post1] + [
+            Post.objects.create(community=self.comm_by_staff, author=self.user, title=f'P{i}', content='c')
+            for i in range(4)
+        ]
+        for i in range(5):
+            Reply.objects.create(post=self.post1, author=self.user, content=f'r{i}')
+        self.client.login(username='user', password='pass')
+
+    def test_feed_pages_through_posts(self):
+        url = reverse('community_feed_json', args=[self.comm_by_staff.id])
+        resp = self.client.get(url, {'page_size': 3})
+        body = resp.json()
+        self.assertEqual(len(body['posts']), 3)
+        self.assertTrue(body['has_next'])
+
+        resp = self.client.get(url, {'page_size': 3, 'cursor': body['next_cursor']})
+        second = resp.json()
+        self.assertEqual(len(second['posts']), 2)
+        self.assertFalse(second['has_next'])
+        ids = [p['id'] for p in body['posts'] + second['posts']]
+        self.assertEqual(sorted(ids), sorted(p.id for p in self.posts))
+
+    def test_feed_reply_preview_is_bounded(self):
+        url = reverse('community_feed_json', args=[self.comm_by_staff.id])
+        resp = self.client.get(url, {'replies_preview': 2, 'page_size': 50})
+        post = next(p for p in resp.json()['posts'] if p['id'] == self.post1.id)
+        self.assertEqual([r['content'] for r in post['replies']], ['r3', 'r4'])
+
+    def test_feed_query_count_is_constant(self):
+        url = reverse('community_feed_json', args=[self.comm_by_staff.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        baseline = len(ctx.captured_queries)
+        Post.objects.create(community=self.comm_by_staff, author=self.user, title='More', content='c')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), baseline)
+
+    def test_feed_rejects_bad_cursor_and_non_members(self):
+        url = reverse('community_feed_json', args=[self.comm_by_staff.id])
+        self.assertEqual(self.client.get(url, {'cursor': 'nope'}).status_code, 400)
+        other = reverse('community_feed_json', args=[self.comm_by_super.id])
+        self.assertEqual(self.client.get(other).status_code, 403)
+
+    def test_replies_endpoint_paginates(self):
+        url = reverse('post_replies_json', args=[self.post1.id])
+        body = self.client.get(url, {'page_size': 4}).json()
+        self.assertEqual([r['content'] for r in body['replies']], ['Nice!', 'r0', 'r1', 'r2'])
+        body = self.client.get(url, {'page_size': 4, 'cursor': body['next_cursor']}).json()
+        self.assertEqual([r['content'] for r in body['replies']], ['r3', 'r4'])
+        self.assertIsNone(body['next_cursor'])
+
+
+class PostStatsTests(BaseSetup):
+    def setUp(self):
+        super().setUp()
+        self.client.login(username='user', password='pass')
+
+    def test_reply_endpoints_maintain_stats(self):
+        self.client.post(
+            reverse('create_reply_json', args=[self.post1.id]),
+            data='{"content": "json reply"}', content_type='application/json'
+        )
+        self.client.post(reverse('create_reply', args=[self.post1.id]), {'content': 'html reply'})
+        self.post1.refresh_from_db()
+        self.assertEqual(self.post1.reply_count, 2)  # setUp reply bypasses the service
+        latest = Reply.objects.filter(post=self.post1).latest('created_at')
+        self.assertEqual(self.post1.last_activity_at, latest.created_at)
+
+        self.client.login(username='staff', password='pass')
+        self.client.post(reverse('delete_reply_api', args=[latest.id]))
+        self.post1.refresh_from_db()
+        self.assertEqual(self.post1.reply_count, 2)
+
+    def test_repair_command_recomputes_stats(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        Post.objects.update(reply_count=99)
+        call_command('repair_post_stats', batch_size=1, stdout=StringIO())
+        self.post1.refresh_from_db()
+        self.assertEqual(self.post1.reply_count, 1)
+        self.assertEqual(self.post1.last_activity_at, self.reply1.created_at)
+
+    def test_hot_order_follows_latest_reply(self):
+        newer = Post.objects.create(community=self.comm_by_staff, author=self.user, title='Newer', content='c')
+        url = reverse('community_feed_json', args=[self.comm_by_staff.id])
+        self.assertEqual(self.client.get(url).json()['posts'][0]['id'], newer.id)
+
+        self.client.post(
+            reverse('create_reply_json', args=[self.post1.id]),
+            data='{"content": "bump"}', content_type='application/json'
+        )
+        posts = self.client.get(url, {'order': 'hot'}).json()['posts']
+        self.assertEqual(posts[0]['id'], self.post1.id)
+        self.assertEqual(posts[0]['reply_count'], 1)
+
+
+class CommunityStreamTests(BaseSetup):
+    def setUp(self):
+        super().setUp()
+        events.get_backend.cache_clear()
+        self.client.login(username='user', password='pass')
+
+    def tearDown(self):
+        events.get_backend.cache_clear()
+        super().tearDown()
+
+    def test_local_backend_replays_after_id(self):
+        backend = events.LocalBackend(buffer_size=2)
+        for i in range(3):
+            backend.publish('c', 'tick', {'n': i})
+        self.assertEqual(backend.last_id('c'), 3)
+        self.assertEqual([item[0] for item in backend.read('c', 0)], [2, 3])
+        self.assertEqual(backend.read('c', 3), [])
+
+    def test_cache_backend_round_trip(self):
+        backend = events.CacheBackend()
+        first = backend.publish('c', 'tick', {'n': 1})
+        backend.publish('c', 'tick', {'n': 2})
+        self.assertEqual(backend.read('c', first), [(first + 1, 'tick', {'n': 2})])
+        self.assertEqual(async_to_sync(backend.aread)('c', first), [(first + 1, 'tick', {'n': 2})])
+        self.assertEqual(async_to_sync(backend.alast_id)('c'), first + 1)
+
+    def test_cache_backend_rejected_on_local_cache(self):
+        from playserve.checks import check_event_bus_cache
+
+        with self.settings(EVENT_BUS_BACKEND='playserve.events.CacheBackend'):
+            self.assertEqual([e.id for e in check_event_bus_cache(None)], ['playserve.E001'])
+            with self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://localhost:6379/0',
+            }}):
+                self.assertEqual(check_event_bus_cache(None), [])
+
+    def test_create_endpoints_publish_on_commit(self):
+        channel = f'community:{self.comm_by_staff.id}'
+        backend = events.get_backend()
+        start = backend.last_id(channel)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('create_post_json', args=[self.comm_by_staff.id]),
+                data='{"title": "t", "content": "c"}', content_type='application/json'
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('create_reply_json', args=[self.post1.id]),
+                data='{"content": "r"}', content_type='application/json'
+            )
+        published = backend.read(channel, start)
+        self.assertEqual([e[1] for e in published], ['post_created', 'reply_created'])
+        self.assertEqual(published[1][2]['post_id'], self.post1.id)
+
+    def test_stream_emits_buffered_events(self):
+        channel = f'community:{self.comm_by_staff.id}'
+        events.publish(channel, 'post_created', {'id': 1})
+        with self.settings(SSE_ENABLED=True, SSE_STREAM_TIMEOUT=0.05, SSE_POLL_INTERVAL=0.01):
+            resp = self.client.get(
+                reverse('community_stream', args=[self.comm_by_staff.id]),
+                HTTP_LAST_EVENT_ID='0',
+            )
+            self.assertEqual(resp['Content-Type'], 'text/event-stream')
+
+            async def read_body():
+                return b''.join([chunk async for chunk in resp.streaming_content]).decode()
+
+            body = async_to_sync(read_body)()
+        self.assertIn('event: post_created', body)
+
+    def test_stream_requires_membership(self):
+        resp = self.client.get(reverse('community_stream', args=[self.comm_by_super.id]))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_stream_is_off_without_asgi(self):
+        with self.settings(SSE_ENABLED=False):
+            resp = self.client.get(reverse('community_stream', args=[self.comm_by_staff.id]))
+        self.assertEqual(resp.status_code, 204)
+
+
+class DiscussionSearchTests(BaseSetup):
+    def setUp(self):
+        super().setUp()
+        self.match_post = Post.objects.create(
+            community=self.comm_by_staff, author=self.user,
+            title='Backhand drills', content='Best drills for a one handed backhand'
+        )
+        Reply.objects.create(post=self.post1, author=self.user, content='Try backhand slices')
+        hidden = Post.objects.create(
+            community=self.comm_by_super, author=self.super,
+            title='Backhand secrets', content='members only'
+        )
+        self.hidden = hidden
+        self.client.login(username='user', password='pass')
+        self.url = reverse('search_discussions_json')
+
+    def test_ranked_results_scoped_to_joined_communities(self):
+        body = self.client.get(self.url, {'q': 'backhand'}).json()
+        found = [(r['type'], r['id']) for r in body['results']]
+        self.assertEqual(found[0], ('post', self.match_post.id))
+        self.assertIn('reply', [kind for kind, _ in found])
+        self.assertNotIn(('post', self.hidden.id), found)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.match_post.title = 'Forehand drills'
+        self.match_post.content = 'nothing else'
+        self.match_post.save()
+        body = self.client.get(self.url, {'q': 'forehand'}).json()
+        self.assertEqual([r['id'] for r in body['results']], [self.match_post.id])
+
+        self.match_post.delete()
+        self.assertEqual(self.client.get(self.url, {'q': 'forehand'}).json()['results'], [])
+
+    def test_pagination_and_validation(self):
+        body = self.client.get(self.url, {'q': 'backhand', 'page_size': 1}).json()
+        self.assertEqual(len(body['results']), 1)
+        self.assertTrue(body['has_next'])
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        # FTS syntax characters in user input must not break the query
+        self.assertEqual(self.client.get(self.url, {'q': 'back"hand OR ('}).status_code, 200)
+
+
+class BulkModerationTests(BaseSetup):
+    def setUp(self):
+        super().setUp()
+        self.spammer = User.objects.create_user(username='spammer', password='pass')
+        self.spam = [
+            Post.objects.create(community=self.comm_by_staff, author=self.spammer,
+                                title=f'Spam {i}', content='buy now')
+            for i in range(3)
+        ]
+        self.spam_reply = Reply.objects.create(post=self.post1, author=self.spammer, content='buy')
+        Post.objects.filter(pk=self.post1.pk).update(reply_count=2)
+        self.url = reverse('bulk_moderate_json')
+
+    def _post(self, payload):
+        return self.client.post(self.url, data=json.dumps(payload), content_type='application/json')
+
+    def test_requires_admin(self):
+        self.client.login(username='user', password='pass')
+        self.assertEqual(self._post({'posts': [self.post1.id]}).status_code, 403)
+
+    def test_delete_by_ids_reports_each_id(self):
+        self.client.login(username='staff', password='pass')
+        resp = self._post({'posts': [self.spam[0].id, 999999], 'replies': [self.spam_reply.id]})
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body['results']['posts'], [
+            {'id': self.spam[0].id, 'status': 'deleted'},
+            {'id': 999999, 'status': 'not_found'},
+        ])
+        self.assertEqual(body['deleted'], {'posts': 1, 'replies': 1})
+        self.assertFalse(Post.objects.filter(pk=self.spam[0].pk).exists())
+        self.post1.refresh_from_db()
+        self.assertEqual(self.post1.reply_count, 1)
+
+    def test_delete_by_author_filter(self):
+        Reply.objects.create(post=self.spam[1], author=self.user, content='under spam')
+        self.client.login(username='super', password='pass')
+        body = self._post({'filter': {'author': 'spammer'}}).json()
+        self.assertEqual(body['deleted'], {'posts': 3, 'replies': 1})
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+        self.assertFalse(Reply.objects.filter(post__in=self.spam).exists())
+        self.assertTrue(Post.objects.filter(pk=self.post1.pk).exists())
+
+    def test_time_range_and_validation(self):
+        self.client.login(username='staff', password='pass')
+        self.assertEqual(self._post({}).status_code, 400)
+        self.assertEqual(self._post({'filter': {'since': 'yesterday'}}).status_code, 400)
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        body = self._post({'filter': {'since': future}}).json()
+        self.assertEqual(body['deleted'], {'posts': 0, 'replies': 0})
+
+
+class UnreadSummaryTests(BaseSetup):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.comm_by_super.members.add(self.user)
+        self.client.login(username='user', password='pass')
+
+    def _summary(self):
+        body = self.client.get(reverse('my_communities_summary_json')).json()
+        return {c['id']: c for c in body['communities']}
+
+    def test_counts_posts_after_watermark(self):
+        Post.objects.create(community=self.comm_by_staff, author=self.other, title='a', content='x')
+        summary = self._summary()
+        # Own posts never count as unread
+        self.assertEqual(summary[self.comm_by_staff.id]['unread_count'], 1)
+        self.assertEqual(summary[self.comm_by_super.id]['unread_count'], 0)
+        self.assertIsNone(summary[self.comm_by_staff.id]['last_seen_at'])
+
+        resp = self.client.post(reverse('mark_community_seen', args=[self.comm_by_staff.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._summary()[self.comm_by_staff.id]['unread_count'], 0)
+
+        later = Post.objects.create(community=self.comm_by_staff, author=self.other, title='b', content='y')
+        Post.objects.filter(pk=later.pk).update(created_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self._summary()[self.comm_by_staff.id]['unread_count'], 1)
+
+    def test_single_query(self):
+        self.client.get(reverse('my_communities_summary_json'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('my_communities_summary_json'))
+        summary_queries = [q for q in ctx.captured_queries if 'community_post' in q['sql']]
+        self.assertEqual(len(summary_queries), 1)
+
+    def test_watermark_never_moves_back(self):
+        later = timezone.now() + timedelta(hours=1)
+        CommunityReadState.objects.create(user=self.user, community=self.comm_by_staff, last_seen_at=later)
+        self.client.post(reverse('mark_community_seen', args=[self.comm_by_staff.id]))
+        state = CommunityReadState.objects.get(user=self.user, community=self.comm_by_staff)
+        self.assertEqual(state.last_seen_at, later)
+
+    def test_seen_requires_membership(self):
+        other_comm = Community.objects.create(name='Other', creator=self.staff)
+        resp = self.client.post(reverse('mark_community_seen', args=[other_comm.id]))
+        self.assertEqual(resp.status_code, 403)
+
+
+@override_settings(RATE_LIMITS={'community_write': {'user': '2/m', 'ip': '3/m'}})
+class RateLimitTests(BaseSetup):
+    def setUp(self):
+        super().setUp()
+        self.recorded = []
+        self.hook = lambda name, value, tags: self.recorded.append((name, tags))
+        metrics.register(self.hook)
+        self.url = reverse('create_post_json', args=[self.comm_by_staff.id])
+        self.payload = json.dumps({'title': 't', 'content': 'c'})
+
+    def tearDown(self):
+        metrics.unregister(self.hook)
+        super().tearDown()
+
+    def _create(self):
+        return self.client.post(self.url, data=self.payload, content_type='application/json')
+
+    def test_user_budget_returns_429(self):
+        self.client.login(username='user', password='pass')
+        self.assertEqual(self._create().status_code, 201)
+        self.assertEqual(self._create().status_code, 201)
+        resp = self._create()
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreaterEqual(int(resp['Retry-After']), 1)
+        self.assertEqual(Post.objects.filter(title='t').count(), 2)
+        self.assertIn(('ratelimit.blocked', {'group': 'community_write', 'scope': 'user'}), self.recorded)
+
+    def test_ip_budget_spans_users(self):
+        self.comm_by_staff.members.add(self.super)
+        self.client.login(username='user', password='pass')
+        self._create()
+        self._create()
+        self.client.login(username='staff', password='pass')
+        self.assertEqual(self._create().status_code, 201)
+        self.assertEqual(self._create().status_code, 429)
+
+    def test_bucket_refills_over_time(self):
+        identities = {'user': '1'}
+        self.assertTrue(ratelimit.consume('community_write', identities, now=0)[0])
+        self.assertTrue(ratelimit.consume('community_write', identities, now=0)[0])
+        allowed, retry_after = ratelimit.consume('community_write', identities, now=0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 30)
+        self.assertTrue(ratelimit.consume('community_write', identities, now=30)[0])
+
+    def test_parallel_requests_share_one_budget(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: ratelimit.consume('community_write', {'user': 'burst'}, now=0)[0], range(8)
+            ))
+        self.assertEqual(results.count(True), 2)
+
+    def test_busy_bucket_lock_blocks(self):
+        cache.add('ratelimit:community_write:user:7:lock', 1, 5)
+        with mock.patch.object(ratelimit, 'LOCK_WAIT', 0.02):
+            self.assertEqual(ratelimit.consume('community_write', {'user': '7'}), (False, 1))
+        self.assertIn(('ratelimit.contended', {'group': 'community_write'}), self.recorded)
+
+    def test_local_cache_warned_about(self):
+        from playserve.checks import check_rate_limit_cache
+
+        self.assertEqual([w.id for w in check_rate_limit_cache(None)], ['playserve.W001'])
+        with self.settings(RATE_LIMIT_ENABLED=False):
+            self.assertEqual(check_rate_limit_cache(None), [])
+
+    def test_client_ip_behind_proxy(self):
+        from django.test import RequestFactory
+
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 1.2.3.4')
+        with self.settings(RATE_LIMIT_TRUST_FORWARDED=True):
+            self.assertEqual(ratelimit.client_ip(request), '1.2.3.4')
+        with self.settings(RATE_LIMIT_TRUST_FORWARDED=False):
+            self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+
+    def test_unlisted_group_is_unlimited(self):
+        self.assertEqual(ratelimit.consume('review_write', {'user': '1'}, now=0), (True, 0))
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.client.login(username='user', password='pass')
+        for _ in range(3):
+            self.assertEqual(self._create().status_code, 201)
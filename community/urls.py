@@ -4,6 +4,7 @@ import community.views as views
 urlpatterns = [
     path('', views.discover_communities, name='discover_communities'),
     path('join/<int:community_id>/', views.join_community, name='join_community'),
+    path('leave/<int:community_id>/', views.leave_community, name='leave_community'),
     path('my/', views.my_communities, name='my_communities'),
     path('<int:community_id>/', views.community_detail, name='community_detail'),
     path('<int:community_id>/create_post/', views.create_post, name='create_post'),
@@ -17,8 +18,14 @@ urlpatterns = [
 
     # JSON / API
     path('api/list/', views.discover_communities_json, name='discover_communities_json'),
+    path('api/my/summary/', views.my_communities_summary_json, name='my_communities_summary_json'),
+    path('api/search/', views.search_discussions_json, name='search_discussions_json'),
     path('api/community/<int:community_id>/', views.community_detail_json, name='community_detail_json'),
+    path('api/community/<int:community_id>/feed/', views.community_feed_json, name='community_feed_json'),
+    path('api/community/<int:community_id>/stream/', views.community_stream, name='community_stream'),
+    path('api/community/<int:community_id>/seen/', views.mark_community_seen, name='mark_community_seen'),
     path('api/community/<int:community_id>/posts/', views.create_post_json, name='create_post_json'),
+    path('api/posts/<int:post_id>/replies/', views.post_replies_json, name='post_replies_json'),
     path('api/posts/<int:post_id>/reply/', views.create_reply_json, name='create_reply_json'),
     path(
         "api/posts/<int:post_id>/delete/",
@@ -30,4 +37,5 @@ urlpatterns = [
         views.delete_reply_api,
         name="delete_reply_api",
     ),
+    path('api/moderation/delete/', views.bulk_moderate_json, name='bulk_moderate_json'),
 ]
@@ -3,8 +3,17 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import JsonResponse
 from .models import Community, Post, Reply
+from . import services
+from .services import is_member, joined_community_ids, latest_replies_by_post
+from .search import search_discussions
+from playserve import events
+from playserve.pagination import keyset_page, parse_page_size
+from playserve.ratelimit import rate_limit
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from profil.models import Profile
-from django.db.models import Q
+from django.db.models import Q, Case, When, Value, IntegerField, Prefetch
 from django.urls import reverse 
 from profil.models import Profile
 from django.views.decorators.http import require_GET
@@ -15,6 +24,12 @@ from django.shortcuts import get_object_or_404
 from .models import Community, Post, Reply
 from django.views.decorators.csrf import csrf_exempt
 import json
+from django.utils.dateparse import parse_datetime
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 50
+REPLY_PREVIEW_SIZE = 3
+REPLY_PREVIEW_MAX = 10
 
 
 def main_view(request):
@@ -48,20 +63,37 @@ def get_user(request):
 
     return JsonResponse(data)
 
+def _discover_queryset(query):
+    """
+    Communities for the discover pages with creator joined in.
+    Searches rank exact name > name prefix > name substring > description,
+    then by member_count.
+    """
+    communities = Community.objects.select_related('creator')
+    if not query:
+        return communities.order_by('-member_count', 'name')
+
+    return communities.filter(
+        Q(name__icontains=query) | Q(description__icontains=query)
+    ).annotate(
+        search_rank=Case(
+            When(name__iexact=query, then=Value(3)),
+            When(name__istartswith=query, then=Value(2)),
+            When(name__icontains=query, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ).order_by('-search_rank', '-member_count', 'name')
+
 @login_required
 def discover_communities(request):
     query = request.GET.get('q', '')
 
-    if query:
-        communities = Community.objects.filter(name__icontains=query)
-    else:
-        communities = Community.objects.all()
-
-    joined_community_ids = request.user.joined_communities.values_list('id', flat=True)
+    communities = _discover_queryset(query)
 
     context = {
         'communities': communities,
-        'joined_community_ids': joined_community_ids,
+        'joined_community_ids': joined_community_ids(request.user),
         'search_query': query,
     }
 
@@ -77,19 +109,26 @@ from django.http import JsonResponse
 
 @require_GET
 def discover_communities_json(request):
+    """
+    Flat list of communities. Passing ?page= (and optionally ?page_size=)
+    switches to a paginated envelope like booking's api_fields.
+    """
+    from django.core.paginator import Paginator
+
     query = request.GET.get('q', '').strip()
+    communities = _discover_queryset(query)
 
-    if query:
-        communities = Community.objects.filter(name__icontains=query)
-    else:
-        communities = Community.objects.all()
+    joined_ids = joined_community_ids(request.user)
 
-    if request.user.is_authenticated:
-        joined_ids = set(
-            request.user.joined_communities.values_list('id', flat=True)
-        )
-    else:
-        joined_ids = set()
+    paginated = 'page' in request.GET
+    if paginated:
+        try:
+            page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+        except ValueError:
+            page_size = 20
+        paginator = Paginator(communities, page_size)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        communities = page_obj
 
     data = []
     for c in communities:
@@ -100,14 +139,28 @@ def discover_communities_json(request):
             "id": c.id,
             "name": c.name,
             "description": c.description or "",
-            "members_count": c.members.count(),
+            "members_count": c.member_count,
             "is_joined": is_joined,
             "is_creator": is_creator,
             "creator_username": c.creator.username if c.creator else "",
             "can_open": is_joined or is_creator,
         })
 
-    return JsonResponse(data, safe=False, status=200)
+    if not paginated:
+        return JsonResponse(data, safe=False, status=200)
+
+    return JsonResponse({
+        "status": "success",
+        "data": data,
+        "pagination": {
+            "page": page_obj.number,
+            "page_size": page_size,
+            "total_pages": paginator.num_pages,
+            "total_items": paginator.count,
+            "has_next": page_obj.has_next(),
+            "has_previous": page_obj.has_previous(),
+        }
+    }, status=200)
 
 
 
@@ -116,11 +169,11 @@ def my_communities(request):
     is_admin = request.user.is_staff or request.user.is_superuser
 
     if is_admin:
-        communities = Community.objects.filter(creator=request.user).order_by('-created_at')
+        communities = Community.objects.filter(creator=request.user).select_related('creator').order_by('-created_at')
         mode = 'created'         
         subtitle = 'Created by Me'
     else:
-        communities = request.user.joined_communities.all().order_by('-created_at')
+        communities = request.user.joined_communities.select_related('creator').order_by('-created_at')
         mode = 'joined'
         subtitle = 'Joined'
 
@@ -133,6 +186,35 @@ def my_communities(request):
     }
     return render(request, 'my_communities.html', context)
 
+@login_required
+@require_GET
+def my_communities_summary_json(request):
+    """Joined communities with unread post counts, for home screen badges"""
+    data = [
+        {
+            "id": c.id,
+            "name": c.name,
+            "member_count": c.member_count,
+            "unread_count": c.unread_count,
+            "last_seen_at": c.last_seen_at.isoformat() if c.last_seen_at else None,
+            "latest_post_at": c.latest_post_at.isoformat() if c.latest_post_at else None,
+        }
+        for c in services.unread_summary(request.user)
+    ]
+    return JsonResponse({"status": "success", "communities": data}, status=200)
+
+@csrf_exempt
+@login_required
+@require_POST
+def mark_community_seen(request, community_id):
+    if not is_member(request.user, community_id):
+        return JsonResponse({"error": "You are not a member of this community."}, status=403)
+    state = services.mark_seen(request.user, community_id)
+    return JsonResponse({
+        "status": "success",
+        "last_seen_at": state.last_seen_at.isoformat(),
+    }, status=200)
+
 @csrf_exempt
 @login_required
 def join_community(request, community_id):
@@ -141,18 +223,31 @@ def join_community(request, community_id):
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid request method'}, status=405)
     
-    if request.user in community.members.all():
-        return JsonResponse({
-            'status': 'already_joined',
-            'community_name': community.name,
-            'members_count': community.members.count(),
-        })
+    joined = services.join(request.user, community.id)
+    if joined:
+        community.refresh_from_db(fields=['member_count'])
+    return JsonResponse({
+        'status': 'joined' if joined else 'already_joined',
+        'community_name': community.name,
+        'members_count': community.member_count,
+    })
 
-    community.members.add(request.user)
+@csrf_exempt
+@login_required
+@require_POST
+def leave_community(request, community_id):
+    community = get_object_or_404(Community, id=community_id)
+
+    if community.creator_id == request.user.id:
+        return JsonResponse({'error': 'The creator cannot leave their own community.'}, status=400)
+
+    left = services.leave(request.user, community.id)
+    if left:
+        community.refresh_from_db(fields=['member_count'])
     return JsonResponse({
-        'status': 'joined',
+        'status': 'left' if left else 'not_joined',
         'community_name': community.name,
-        'members_count': community.members.count(),
+        'members_count': community.member_count,
     })
 
 @login_required
@@ -415,15 +510,11 @@ def delete_community(request, community_id):
 def community_detail(request, community_id):
     community = get_object_or_404(Community, id=community_id)
 
-    if request.user == community.creator and request.user not in community.members.all():
-        community.members.add(request.user)
-
-
-    if request.user not in community.members.all():
+    if not (community.creator_id == request.user.id or is_member(request.user, community.id)):
         messages.error(request, "You must join this community to see its posts.")
         return redirect('discover_communities')
 
-    posts = community.posts.all().prefetch_related('replies', 'replies__author')
+    posts = community.posts.select_related('author').prefetch_related('replies', 'replies__author')
 
     context = {
         'community': community,
@@ -437,59 +528,234 @@ def community_detail(request, community_id):
             context['profile'] = None
     return render(request, 'community_detail.html', context)
 
+def _can_view_community(user, community):
+    return (
+        user.is_staff or user.is_superuser
+        or community.creator_id == user.id
+        or is_member(user, community.id)
+    )
+
+def _reply_json(reply):
+    return {
+        "id": reply.id,
+        "content": reply.content,
+        "author": reply.author.username,
+        "created_at": reply.created_at.isoformat(),
+    }
+
+def _post_json(post, replies):
+    return {
+        "id": post.id,
+        "title": post.title,
+        "content": post.content,
+        "author": post.author.username,
+        "created_at": post.created_at.isoformat(),
+        "reply_count": post.reply_count,
+        "last_activity_at": post.last_activity_at.isoformat(),
+        "replies": [_reply_json(r) for r in replies],
+    }
+
 @login_required
 @require_GET
 def community_detail_json(request, community_id):
     community = get_object_or_404(Community, id=community_id)
 
-    if request.user == community.creator and request.user not in community.members.all():
-        community.members.add(request.user)
-
     is_admin = request.user.is_superuser or request.user.is_staff
-    is_member = community.members.filter(pk=request.user.pk).exists()
+    is_joined = is_member(request.user, community.id)
     is_creator = (request.user == community.creator)
 
-    if not (is_member or is_creator or is_admin):
+    if not (is_joined or is_creator or is_admin):
         return JsonResponse(
             {"error": "You must join this community to see its posts."},
             status=403
         )
 
-    posts_qs = community.posts.all().prefetch_related(
-        'author', 'replies', 'replies__author'
+    posts_qs = community.posts.select_related('author').prefetch_related(
+        Prefetch('replies', queryset=Reply.objects.select_related('author'))
     ).order_by('-created_at')
 
-    posts_data = []
-    for p in posts_qs:
-        posts_data.append({
-            "id": p.id,
-            "title": p.title,
-            "content": p.content,
-            "author": p.author.username,
-            "created_at": p.created_at.isoformat(),
-            "replies": [
-                {
-                    "id": r.id,
-                    "content": r.content,
-                    "author": r.author.username,
-                    "created_at": r.created_at.isoformat(),
-                }
-                for r in p.replies.all().order_by('created_at')
-            ],
-        })
+    posts_data = [_post_json(p, p.replies.all()) for p in posts_qs]
 
     data = {
         "id": community.id,
         "name": community.name,
         "description": community.description or "",
-        "members_count": community.members.count(),
+        "members_count": community.member_count,
         "is_creator": is_creator,
         "is_admin": is_admin,
-        "is_joined": is_member,
+        "is_joined": is_joined,
         "posts": posts_data,
     }
     return JsonResponse(data, status=200)
 
+@login_required
+@require_GET
+def community_feed_json(request, community_id):
+    """
+    Cursor-paginated posts, each with a preview of its latest replies.
+    Params: cursor, page_size, replies_preview, and order=new (default,
+    newest first) or order=hot (most recent reply activity first).
+    """
+    community = get_object_or_404(Community, id=community_id)
+    if not _can_view_community(request.user, community):
+        return JsonResponse(
+            {"error": "You must join this community to see its posts."},
+            status=403
+        )
+
+    page_size = parse_page_size(request, FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE)
+    preview_size = parse_page_size(
+        request, REPLY_PREVIEW_SIZE, REPLY_PREVIEW_MAX, param='replies_preview'
+    )
+
+    if request.GET.get('order') == 'hot':
+        ordering = ['-last_activity_at', '-id']
+    else:
+        ordering = ['-created_at', '-id']
+
+    try:
+        posts, next_cursor = keyset_page(
+            community.posts.select_related('author'),
+            ordering,
+            cursor=request.GET.get('cursor'),
+            page_size=page_size,
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    previews = latest_replies_by_post([p.id for p in posts], preview_size)
+
+    return JsonResponse({
+        "status": "success",
+        "posts": [_post_json(p, previews[p.id]) for p in posts],
+        "next_cursor": next_cursor,
+        "has_next": next_cursor is not None,
+    }, status=200)
+
+@login_required
+@require_GET
+def post_replies_json(request, post_id):
+    """Cursor-paginated replies of one post, oldest first."""
+    post = get_object_or_404(Post.objects.select_related('community'), id=post_id)
+    if not _can_view_community(request.user, post.community):
+        return JsonResponse(
+            {"error": "You must join this community to see its posts."},
+            status=403
+        )
+
+    page_size = parse_page_size(request, FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE)
+    try:
+        replies, next_cursor = keyset_page(
+            post.replies.select_related('author'),
+            ['created_at', 'id'],
+            cursor=request.GET.get('cursor'),
+            page_size=page_size,
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    return JsonResponse({
+        "status": "success",
+        "replies": [_reply_json(r) for r in replies],
+        "next_cursor": next_cursor,
+        "has_next": next_cursor is not None,
+    }, status=200)
+
+@login_required
+@require_GET
+def search_discussions_json(request):
+    """
+    Ranked full-text search over posts and replies in the communities the
+    user has joined. Params: q, page, page_size, community_id (optional).
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({"error": "Query is required."}, status=400)
+
+    community_ids = joined_community_ids(request.user)
+    community_id = request.GET.get('community_id')
+    if community_id:
+        try:
+            community_ids = community_ids & {int(community_id)}
+        except ValueError:
+            return JsonResponse({"error": "Invalid community_id."}, status=400)
+
+    page_size = parse_page_size(request, FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE)
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    hits, has_next = search_discussions(
+        query, community_ids, offset=(page - 1) * page_size, limit=page_size
+    )
+
+    results = []
+    for kind, obj, score in hits:
+        post = obj if kind == 'post' else obj.post
+        results.append({
+            "type": kind,
+            "id": obj.id,
+            "post_id": post.id,
+            "post_title": post.title,
+            "community_id": post.community_id,
+            "community_name": post.community.name,
+            "content": obj.content,
+            "author": obj.author.username,
+            "created_at": obj.created_at.isoformat(),
+            "score": score,
+        })
+
+    return JsonResponse({
+        "status": "success",
+        "results": results,
+        "page": page,
+        "has_next": has_next,
+    }, status=200)
+
+def _publish_post(post):
+    data = {"community_id": post.community_id, **_post_json(post, [])}
+    transaction.on_commit(
+        lambda: events.publish(f'community:{post.community_id}', 'post_created', data)
+    )
+
+def _publish_reply(reply):
+    data = {"post_id": reply.post_id, **_reply_json(reply)}
+    community_id = reply.post.community_id
+    transaction.on_commit(
+        lambda: events.publish(f'community:{community_id}', 'reply_created', data)
+    )
+
+@login_required
+async def community_stream(request, community_id):
+    """
+    Server-sent events for new posts and replies in a community. Needs an
+    ASGI server (see events.streams_enabled); otherwise it answers 204.
+    """
+    community = await Community.objects.filter(id=community_id).afirst()
+    if community is None:
+        return JsonResponse({"error": "Community not found."}, status=404)
+
+    user = await request.auser()
+    if not await sync_to_async(_can_view_community)(user, community):
+        return JsonResponse(
+            {"error": "You must join this community to see its posts."},
+            status=403
+        )
+    if not events.streams_enabled():
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        events.sse_stream(
+            f'community:{community_id}',
+            last_event_id=request.headers.get('Last-Event-ID'),
+        ),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @csrf_exempt
 @login_required
 @require_POST
@@ -518,7 +784,7 @@ def delete_reply_api(request, reply_id):
         )
 
     reply = get_object_or_404(Reply, pk=reply_id)
-    reply.delete()
+    services.delete_reply(reply)
     return JsonResponse(
         {
             "status": "success",
@@ -526,12 +792,86 @@ def delete_reply_api(request, reply_id):
         }
     )
 
+MODERATION_MAX_IDS = 10000
+
+
+def _parse_ids(values):
+    if not isinstance(values, list):
+        raise ValueError
+    return {int(v) for v in values}
+
+
+def _moderation_filter(spec, community_field):
+    """Q for a moderation filter spec, None when the spec selects nothing"""
+    condition = Q()
+    if spec.get('author'):
+        condition &= Q(author__username=spec['author'])
+    if spec.get('community_id'):
+        condition &= Q(**{community_field: int(spec['community_id'])})
+    for key, lookup in (('since', 'gte'), ('until', 'lt')):
+        if spec.get(key):
+            value = parse_datetime(spec[key])
+            if value is None:
+                raise ValueError
+            condition &= Q(**{f'created_at__{lookup}': value})
+    return condition or None
+
+
 @csrf_exempt
 @login_required
 @require_POST
+def bulk_moderate_json(request):
+    """
+    Delete many posts/replies at once. Body:
+    {"posts": [ids], "replies": [ids],
+     "filter": {"author", "community_id", "since", "until", "targets": ["posts", "replies"]}}
+    """
+    if not is_admin(request.user):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+        post_ids = _parse_ids(payload.get('posts', []))
+        reply_ids = _parse_ids(payload.get('replies', []))
+        spec = payload.get('filter') or {}
+        targets = spec.get('targets', ['posts', 'replies'])
+        post_filter = reply_filter = None
+        if 'posts' in targets:
+            post_filter = _moderation_filter(spec, 'community_id')
+        if 'replies' in targets:
+            reply_filter = _moderation_filter(spec, 'post__community_id')
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"error": "Invalid payload."}, status=400)
+
+    if len(post_ids) + len(reply_ids) > MODERATION_MAX_IDS:
+        return JsonResponse(
+            {"error": f"At most {MODERATION_MAX_IDS} ids per request."}, status=400
+        )
+    if not (post_ids or reply_ids or post_filter or reply_filter):
+        return JsonResponse({"error": "Nothing selected."}, status=400)
+
+    post_results, reply_results = services.bulk_delete(
+        post_ids, reply_ids, post_filter, reply_filter
+    )
+    return JsonResponse({
+        "status": "success",
+        "deleted": {
+            "posts": sum(1 for v in post_results.values() if v == 'deleted'),
+            "replies": sum(1 for v in reply_results.values() if v == 'deleted'),
+        },
+        "results": {
+            "posts": [{"id": pk, "status": v} for pk, v in sorted(post_results.items())],
+            "replies": [{"id": pk, "status": v} for pk, v in sorted(reply_results.items())],
+        },
+    })
+
+@csrf_exempt
+@login_required
+@require_POST
+@rate_limit('community_write')
 def create_post_json(request, community_id):
     community = get_object_or_404(Community, id=community_id)
-    if request.user not in community.members.all():
+    if not is_member(request.user, community.id, fresh=True):
         return JsonResponse(
             {"error": "You must join this community before posting."},
             status=403
@@ -556,6 +896,7 @@ def create_post_json(request, community_id):
         title=title,
         content=content,
     )
+    _publish_post(post)
 
     return JsonResponse({
         "status": "success",
@@ -572,11 +913,12 @@ def create_post_json(request, community_id):
 @csrf_exempt
 @login_required
 @require_POST
+@rate_limit('community_write')
 def create_reply_json(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     community = post.community
 
-    if request.user not in community.members.all():
+    if not is_member(request.user, community.id, fresh=True):
         return JsonResponse(
             {"error": "You must join this community before replying."},
             status=403
@@ -594,11 +936,8 @@ def create_reply_json(request, post_id):
             status=400
         )
 
-    reply = Reply.objects.create(
-        post=post,
-        author=request.user,
-        content=content,
-    )
+    reply = services.create_reply(post, request.user, content)
+    _publish_reply(reply)
 
     return JsonResponse({
         "status": "success",
@@ -616,7 +955,7 @@ def create_reply_json(request, post_id):
 def create_post(request, community_id):
     community = get_object_or_404(Community, id=community_id)
 
-    if request.user not in community.members.all():
+    if not is_member(request.user, community.id, fresh=True):
         messages.warning(request, "You must join this community before posting.")
         return redirect('discover_communities')
 
@@ -627,12 +966,13 @@ def create_post(request, community_id):
         if not title or not content:
             messages.error(request, "Both title and content are required.")
         else:
-            Post.objects.create(
+            post = Post.objects.create(
                 community=community,
                 author=request.user,
                 title=title,
                 content=content
             )
+            _publish_post(post)
             messages.success(request, "Your discussion has been posted!")
 
         return redirect('community_detail', community_id=community_id)
@@ -645,17 +985,13 @@ def create_reply(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     community = post.community
 
-    if request.user not in community.members.all():
+    if not is_member(request.user, community.id, fresh=True):
         return redirect('discover_communities')
 
     if request.method == 'POST':
         content = request.POST.get('content')
         if content and content.strip():
-            Reply.objects.create(
-                post=post,
-                author=request.user,
-                content=content
-            )
+            _publish_reply(services.create_reply(post, request.user, content))
 
     return redirect('community_detail', community_id=community.id)
 
@@ -675,6 +1011,6 @@ def delete_reply(request, reply_id):
     reply = get_object_or_404(Reply, id=reply_id)
     community_id = reply.post.community_id
     if request.method == 'POST':
-        reply.delete()
+        services.delete_reply(reply)
         messages.success(request, "Reply has been removed.")
     return redirect('community_detail', community_id=community_id)
@@ -0,0 +1,95 @@
+"""
+In-process leaderboard over Profile.jumlah_kemenangan.
+
+Each scope (global and every lokasi) keeps a sorted list of
+(-wins, user_id) keys, so top-N is a slice and "my position" is a
+bisect. A win moves one key: O(log n) to find it plus a list shift,
+which is a memmove and cheap at leaderboard sizes.
+
+The board is built from one query on first use and rebuilt after
+LEADERBOARD_MAX_AGE seconds. Wins recorded by this process are applied
+incrementally right away. Wins from other workers, city changes and new
+players show up at the next rebuild.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from profil.models import Profile
+
+GLOBAL = None
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._scopes = {}
+        self._players = {}
+
+    def _max_age(self):
+        return getattr(settings, 'LEADERBOARD_MAX_AGE', 60)
+
+    def _ensure(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self._max_age():
+            self.rebuild()
+
+    def rebuild(self):
+        rows = (
+            Profile.objects.exclude(role=Profile.Role.ADMIN)
+            .exclude(user__is_superuser=True)
+            .values_list('user_id', 'lokasi', 'jumlah_kemenangan')
+        )
+        scopes = {GLOBAL: []}
+        players = {}
+        for user_id, lokasi, wins in rows:
+            players[user_id] = (lokasi, wins)
+            scopes[GLOBAL].append((-wins, user_id))
+            scopes.setdefault(lokasi, []).append((-wins, user_id))
+        for keys in scopes.values():
+            keys.sort()
+        with self._lock:
+            self._scopes, self._players = scopes, players
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def record_win(self, user_id, count=1):
+        """Apply a committed win; unknown players wait for the next rebuild"""
+        with self._lock:
+            if user_id not in self._players:
+                return
+            lokasi, wins = self._players[user_id]
+            for scope in (GLOBAL, lokasi):
+                keys = self._scopes[scope]
+                del keys[bisect_left(keys, (-wins, user_id))]
+                insort(keys, (-(wins + count), user_id))
+            self._players[user_id] = (lokasi, wins + count)
+
+    def top(self, lokasi=GLOBAL, limit=10):
+        """[(position, user_id, wins)] with tied players sharing a position"""
+        self._ensure()
+        with self._lock:
+            keys = self._scopes.get(lokasi, [])
+            return [
+                (bisect_left(keys, (key[0], -1)) + 1, key[1], -key[0])
+                for key in keys[:limit]
+            ]
+
+    def position(self, user_id, lokasi=GLOBAL):
+        """(position, wins, players in scope) or None if the player is not ranked"""
+        self._ensure()
+        with self._lock:
+            player = self._players.get(user_id)
+            if player is None or (lokasi is not GLOBAL and player[0] != lokasi):
+                return None
+            keys = self._scopes[lokasi]
+            wins = player[1]
+            return bisect_left(keys, (-wins, -1)) + 1, wins, len(keys)
+
+
+board = Leaderboard()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from matchmaking.services import expire_stale
+
+
+class Command(BaseCommand):
+    help = 'Expire match requests and unplayed match sessions that stayed PENDING past their TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows expired per UPDATE')
+
+    def handle(self, *args, **kwargs):
+        requests, sessions = expire_stale(batch_size=kwargs['batch_size'])
+        self.stdout.write(f'Expired {requests} match requests and {sessions} match sessions')
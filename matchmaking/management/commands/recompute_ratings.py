@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from matchmaking.rating import k_factors, recompute_all
+
+
+class Command(BaseCommand):
+    help = 'Replay all decided MatchSession results and rebuild Elo ratings and history'
+
+    def add_arguments(self, parser):
+        k, provisional_k, provisional_matches = k_factors()
+        parser.add_argument('--k', type=float, default=k, help='K factor for established players')
+        parser.add_argument('--provisional-k', type=float, default=provisional_k,
+                            help='K factor for players with few rated matches')
+        parser.add_argument('--provisional-matches', type=int, default=provisional_matches,
+                            help='Rated matches before a player stops being provisional')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per read/write batch')
+
+    def handle(self, *args, **kwargs):
+        factors = (kwargs['k'], kwargs['provisional_k'], kwargs['provisional_matches'])
+        players, sessions = recompute_all(factors, batch_size=kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {sessions} sessions, rated {players} players'
+        ))
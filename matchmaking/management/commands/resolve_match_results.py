@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from matchmaking.models import MatchSession
+from matchmaking.services import resolve_dispute, resolve_stale
+
+
+class Command(BaseCommand):
+    help = (
+        'Settle match sessions whose result was reported by one player and never confirmed, '
+        'or settle one disputed session with --dispute ID --result RESULT'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions settled per transaction')
+        parser.add_argument('--dispute', type=int, help='Id of a DISPUTED session to settle')
+        parser.add_argument('--result', choices=['P1_WIN', 'P2_WIN', 'CANCELLED'],
+                            help='Decided result for --dispute')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['dispute'] is None:
+            settled = resolve_stale(batch_size=kwargs['batch_size'])
+            self.stdout.write(f'Settled {settled} match sessions')
+            return
+
+        if not kwargs['result']:
+            raise CommandError('--dispute needs --result')
+        try:
+            session = resolve_dispute(kwargs['dispute'], kwargs['result'])
+        except MatchSession.DoesNotExist:
+            raise CommandError(f'No disputed match session with id {kwargs["dispute"]}')
+        self.stdout.write(f'Settled disputed match session {session.id} as {session.result}')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matchmaking.pairing import pair_waiting
+
+
+class Command(BaseCommand):
+    help = 'Pair players waiting in the matchmaking queue, once or in a loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run a single pairing pass and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between passes')
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions created per transaction')
+
+    def handle(self, *args, **kwargs):
+        while True:
+            sessions = pair_waiting(batch_size=kwargs['batch_size'])
+            if sessions or kwargs['once']:
+                self.stdout.write(f'Created {len(sessions)} match sessions')
+            if kwargs['once']:
+                return
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cancel_duplicate_active_sessions(apps, schema_editor):
+    """Keep each player's newest PENDING session, cancel the rest"""
+    MatchSession = apps.get_model('matchmaking', 'MatchSession')
+    seen = set()
+    duplicates = []
+    pending = MatchSession.objects.filter(result='PENDING').order_by('-date_played', '-id')
+    for pk, player1_id, player2_id in pending.values_list('id', 'player1_id', 'player2_id'):
+        if player1_id in seen or player2_id in seen:
+            duplicates.append(pk)
+        else:
+            seen.update((player1_id, player2_id))
+    MatchSession.objects.filter(pk__in=duplicates).update(result='CANCELLED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchmaking', '0003_match_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_active_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='matchsession',
+            constraint=models.UniqueConstraint(condition=models.Q(('result', 'PENDING')), fields=('player1',), name='unique_active_session_player1'),
+        ),
+        migrations.AddConstraint(
+            model_name='matchsession',
+            constraint=models.UniqueConstraint(condition=models.Q(('result', 'PENDING')), fields=('player2',), name='unique_active_session_player2'),
+        ),
+    ]
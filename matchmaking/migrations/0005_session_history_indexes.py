@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchmaking', '0004_one_active_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchsession',
+            index=models.Index(fields=['player1', '-date_played'], name='matchmaking_player1_889ba3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchsession',
+            index=models.Index(fields=['player2', '-date_played'], name='matchmaking_player2_65ef33_idx'),
+        ),
+    ]
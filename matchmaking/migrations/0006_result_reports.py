@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchmaking', '0005_session_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchsession',
+            name='player1_report',
+            field=models.CharField(blank=True, choices=[('P1_WIN', 'Player 1 Win'), ('P2_WIN', 'Player 2 Win'), ('CANCELLED', 'Match Cancelled')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='matchsession',
+            name='player2_report',
+            field=models.CharField(blank=True, choices=[('P1_WIN', 'Player 1 Win'), ('P2_WIN', 'Player 2 Win'), ('CANCELLED', 'Match Cancelled')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='matchsession',
+            name='reported_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='matchsession',
+            name='result',
+            field=models.CharField(choices=[('PENDING', 'Pending Result'), ('P1_WIN', 'Player 1 Win'), ('P2_WIN', 'Player 2 Win'), ('CANCELLED', 'Match Cancelled'), ('DISPUTED', 'Players Disagree')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='matchsession',
+            index=models.Index(fields=['result', 'reported_at'], name='matchmaking_result_775990_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchmaking', '0006_result_reports'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='matchrequest',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('ACCEPTED', 'Accepted'), ('REJECTED', 'Rejected'), ('CANCELLED', 'Cancelled by Sender'), ('AUTO_CANCELLED', 'Auto Cancelled by System'), ('EXPIRED', 'Expired')], default='PENDING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='matchsession',
+            name='result',
+            field=models.CharField(choices=[('PENDING', 'Pending Result'), ('P1_WIN', 'Player 1 Win'), ('P2_WIN', 'Player 2 Win'), ('CANCELLED', 'Match Cancelled'), ('DISPUTED', 'Players Disagree'), ('EXPIRED', 'Expired Without Result')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='matchrequest',
+            index=models.Index(fields=['status', 'timestamp'], name='matchmaking_status_da58cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchsession',
+            index=models.Index(fields=['result', 'date_played'], name='matchmaking_result_2ddb08_idx'),
+        ),
+    ]
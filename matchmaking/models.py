@@ -8,6 +8,7 @@ MATCH_STATUS_CHOICES = [
     ('REJECTED', 'Rejected'),          
     ('CANCELLED', 'Cancelled by Sender'), 
     ('AUTO_CANCELLED', 'Auto Cancelled by System'), 
+    ('EXPIRED', 'Expired'),
 ]
 
 RESULT_CHOICES = [
@@ -15,6 +16,16 @@ RESULT_CHOICES = [
     ('P1_WIN', 'Player 1 Win'),      
     ('P2_WIN', 'Player 2 Win'),      
     ('CANCELLED', 'Match Cancelled'), 
+    ('DISPUTED', 'Players Disagree'),
+    ('EXPIRED', 'Expired Without Result'),
+]
+
+# What a single player claims happened; the session result is only set
+# once both reports agree or the confirmation window runs out
+REPORT_CHOICES = [
+    ('P1_WIN', 'Player 1 Win'),
+    ('P2_WIN', 'Player 2 Win'),
+    ('CANCELLED', 'Match Cancelled'),
 ]
 
 
@@ -24,6 +35,11 @@ class MatchRequest(models.Model):
     
     status = models.CharField(max_length=20, choices=MATCH_STATUS_CHOICES, default='PENDING')
     timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'timestamp']),
+        ]
     
     def __str__(self):
         return f"Request from {self.sender.username} to {self.receiver.username} ({self.status})"
@@ -40,5 +56,61 @@ class MatchSession(models.Model):
     
     is_confirmed = models.BooleanField(default=False) 
 
+    player1_report = models.CharField(max_length=20, choices=REPORT_CHOICES, blank=True, default='')
+    player2_report = models.CharField(max_length=20, choices=REPORT_CHOICES, blank=True, default='')
+    reported_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['player1', '-date_played']),
+            models.Index(fields=['player2', '-date_played']),
+            models.Index(fields=['result', 'reported_at']),
+            models.Index(fields=['result', 'date_played']),
+        ]
+        # One active session per player per column; matchmaking.services
+        # locks both players' profiles to cover player1 vs player2 overlaps
+        constraints = [
+            models.UniqueConstraint(
+                fields=['player1'], condition=models.Q(result='PENDING'),
+                name='unique_active_session_player1',
+            ),
+            models.UniqueConstraint(
+                fields=['player2'], condition=models.Q(result='PENDING'),
+                name='unique_active_session_player2',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Session: {self.player1.username} vs {self.player2.username} ({self.result})"
+
+class RatingHistory(models.Model):
+    """One row per player per rated session, written by matchmaking.rating"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rating_history')
+    session = models.ForeignKey(MatchSession, on_delete=models.CASCADE, related_name='rating_changes')
+    rating_before = models.FloatField()
+    rating_after = models.FloatField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.rating_before:.0f} -> {self.rating_after:.0f}"
+
+
+class MatchQueueEntry(models.Model):
+    """A player waiting in the automatic matchmaking queue"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='queue_entry')
+    lokasi = models.CharField(max_length=50)
+    rating = models.FloatField()
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lokasi', 'enqueued_at']),
+        ]
+
     def __str__(self):
-        return f"Session: {self.player1.username} vs {self.player2.username} ({self.result})"
\ No newline at end of file
+        return f"{self.user.username} queued in {self.lokasi} ({self.rating:.0f})"
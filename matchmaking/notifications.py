@@ -0,0 +1,75 @@
+"""
+Per-user matchmaking events on the playserve.events bus.
+
+Each user has one channel, user:<id>, streamed by the api/events/ view.
+Events are published on commit, so a rolled-back request or session
+never reaches a client.
+"""
+from django.db import transaction
+
+from playserve import events
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def notify(user_id, event, data):
+    transaction.on_commit(lambda: events.publish(user_channel(user_id), event, data))
+
+
+def request_received(match_request, sender_profile):
+    notify(match_request.receiver_id, 'match_request_received', {
+        'request_id': match_request.id,
+        'sender_id': match_request.sender_id,
+        'sender_username': match_request.sender.username,
+        'sender_rank': sender_profile.rank if sender_profile else 'N/A',
+        'sender_lokasi': sender_profile.lokasi if sender_profile else 'N/A',
+        'sender_avatar': sender_profile.avatar if sender_profile else 'N/A',
+        'sender_instagram': sender_profile.instagram if sender_profile else 'N/A',
+        'timestamp': match_request.timestamp.strftime('%Y-%m-%d %H:%M'),
+    })
+
+
+def request_accepted(match_request, session):
+    notify(match_request.sender_id, 'match_request_accepted', {
+        'request_id': match_request.id,
+        'session_id': session.id,
+        'opponent_id': match_request.receiver_id,
+    })
+
+
+def request_rejected(match_request):
+    notify(match_request.sender_id, 'match_request_rejected', {
+        'request_id': match_request.id,
+        'receiver_id': match_request.receiver_id,
+    })
+
+
+def requests_auto_cancelled(rows):
+    """`rows` are (request_id, sender_id, receiver_id); both sides are told"""
+    for request_id, sender_id, receiver_id in rows:
+        data = {'request_id': request_id, 'sender_id': sender_id, 'receiver_id': receiver_id}
+        notify(sender_id, 'match_request_auto_cancelled', data)
+        notify(receiver_id, 'match_request_auto_cancelled', data)
+
+
+def match_found(session):
+    for user_id, opponent_id in ((session.player1_id, session.player2_id),
+                                 (session.player2_id, session.player1_id)):
+        notify(user_id, 'match_found', {'session_id': session.id, 'opponent_id': opponent_id})
+
+
+def result_reported(session, reporter_id):
+    opponent_id = session.player2_id if reporter_id == session.player1_id else session.player1_id
+    notify(opponent_id, 'match_result_reported', {'session_id': session.id, 'reporter_id': reporter_id})
+
+
+def result_confirmed(session):
+    for user_id in (session.player1_id, session.player2_id):
+        notify(user_id, 'match_result_confirmed', {'session_id': session.id, 'result': session.result})
+
+
+def result_disputed(session):
+    for user_id in (session.player1_id, session.player2_id):
+        notify(user_id, 'match_result_disputed', {'session_id': session.id})
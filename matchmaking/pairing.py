@@ -0,0 +1,146 @@
+"""
+Automatic matchmaking queue.
+
+Players opt in with enqueue(); a worker (`manage.py run_match_queue`)
+calls pair_waiting() every few seconds. Within each city, waiting players
+are sorted by rating and every pair of rating neighbours goes into a heap
+keyed on how far their gap is inside the allowed tolerance. The allowed
+gap widens with the wait of the longer-waiting player, so close matches
+go first and nobody waits forever. Popping the heap pairs
+players greedily; when a pair leaves, its outer neighbours become
+adjacent and are pushed as a new candidate. A batch costs O(n log n) in
+memory plus a handful of set-based queries per batch of sessions.
+"""
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from profil.models import Profile
+
+from . import notifications
+from .models import MatchQueueEntry, MatchSession
+from .services import busy_players, cancel_pending_requests, lock_players
+
+
+class QueueError(Exception):
+    pass
+
+
+def tolerance(waited_seconds):
+    """Largest rating gap accepted for a player who waited this long"""
+    base = getattr(settings, 'MATCH_QUEUE_BASE_GAP', 100)
+    growth = getattr(settings, 'MATCH_QUEUE_GAP_PER_SECOND', 5)
+    ceiling = getattr(settings, 'MATCH_QUEUE_MAX_GAP', 800)
+    return min(ceiling, base + growth * waited_seconds)
+
+
+def enqueue(user):
+    """Queue `user`, returns (entry, created)"""
+    try:
+        profile = Profile.objects.get(user=user)
+    except Profile.DoesNotExist:
+        raise QueueError('User profile not found.')
+    if busy_players([user.id]):
+        raise QueueError('You already have an active match.')
+
+    try:
+        with transaction.atomic():
+            entry = MatchQueueEntry.objects.create(
+                user=user, lokasi=profile.lokasi, rating=profile.rating
+            )
+    except IntegrityError:
+        return MatchQueueEntry.objects.get(user=user), False
+    return entry, True
+
+
+def dequeue(user):
+    deleted, _ = MatchQueueEntry.objects.filter(user=user).delete()
+    return bool(deleted)
+
+
+def plan_pairs(entries, now):
+    """
+    Greedy pairing of one city's entries, given as
+    (entry_id, user_id, rating, enqueued_at) tuples. Returns entry pairs.
+    """
+    entries = sorted(entries, key=lambda e: (e[2], e[3]))
+    count = len(entries)
+    prev = list(range(-1, count - 1))
+    nxt = list(range(1, count + 1))
+    waited = [(now - e[3]).total_seconds() for e in entries]
+    paired = [False] * count
+
+    def push(heap, i, j):
+        gap = entries[j][2] - entries[i][2]
+        allowed = tolerance(max(waited[i], waited[j]))
+        if gap <= allowed:
+            heapq.heappush(heap, (gap - allowed, i, j))
+
+    heap = []
+    for i in range(count - 1):
+        push(heap, i, i + 1)
+
+    pairs = []
+    while heap:
+        _, i, j = heapq.heappop(heap)
+        if paired[i] or paired[j] or nxt[i] != j:
+            continue
+        paired[i] = paired[j] = True
+        pairs.append((entries[i], entries[j]))
+
+        left, right = prev[i], nxt[j]
+        if left >= 0:
+            nxt[left] = right
+        if right < count:
+            prev[right] = left
+        if left >= 0 and right < count:
+            push(heap, left, right)
+    return pairs
+
+
+def _create_sessions(pairs):
+    """Turn planned pairs into MatchSessions in one transaction"""
+    entry_ids = [entry[0] for pair in pairs for entry in pair]
+    with transaction.atomic():
+        # Entries may have left the queue since they were read
+        locked = set(
+            MatchQueueEntry.objects.select_for_update()
+            .filter(pk__in=entry_ids).values_list('pk', flat=True)
+        )
+        user_ids = [entry[1] for pair in pairs for entry in pair]
+        lock_players(user_ids)
+        busy = busy_players(user_ids)
+
+        sessions = []
+        for a, b in pairs:
+            if a[0] in locked and b[0] in locked and a[1] not in busy and b[1] not in busy:
+                # Longer waiter is player 1
+                first, second = (a, b) if a[3] <= b[3] else (b, a)
+                sessions.append(MatchSession(player1_id=first[1], player2_id=second[1]))
+
+        matched = [s.player1_id for s in sessions] + [s.player2_id for s in sessions]
+        MatchQueueEntry.objects.filter(user_id__in=matched + list(busy)).delete()
+        MatchSession.objects.bulk_create(sessions)
+        cancel_pending_requests(matched)
+        for session in sessions:
+            notifications.match_found(session)
+    return sessions
+
+
+def pair_waiting(now=None, batch_size=500):
+    """Pair everyone currently pairable, returns the created sessions"""
+    now = now or timezone.now()
+    by_city = defaultdict(list)
+    for row in MatchQueueEntry.objects.order_by('lokasi', 'enqueued_at').values_list(
+        'lokasi', 'pk', 'user_id', 'rating', 'enqueued_at'
+    ):
+        by_city[row[0]].append(row[1:])
+
+    pairs = [pair for entries in by_city.values() for pair in plan_pairs(entries, now)]
+    sessions = []
+    for start in range(0, len(pairs), batch_size):
+        sessions += _create_sessions(pairs[start:start + batch_size])
+    return sessions
@@ -0,0 +1,132 @@
+"""
+Elo skill ratings for matchmaking.
+
+Every decided MatchSession moves both players' Profile.rating by
+K * (score - expected). New players use a larger provisional K so they
+reach their level quickly. The K values come from settings, so they can
+be re-tuned and replayed over all history with `manage.py recompute_ratings`.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from profil.models import Profile
+
+from .models import MatchSession, RatingHistory
+from .services import lock_players
+
+DEFAULT_RATING = 1200
+DECIDED_RESULTS = ('P1_WIN', 'P2_WIN')
+
+
+def k_factors():
+    """(k, provisional_k, provisional_games) from settings"""
+    return (
+        getattr(settings, 'ELO_K_FACTOR', 24),
+        getattr(settings, 'ELO_PROVISIONAL_K_FACTOR', 40),
+        getattr(settings, 'ELO_PROVISIONAL_MATCHES', 20),
+    )
+
+
+def expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def rate(rating1, games1, rating2, games2, score1, factors=None):
+    """New (rating1, rating2) after a game where player 1 scored score1 (1, 0.5 or 0)"""
+    k, provisional_k, provisional_games = factors or k_factors()
+    k1 = provisional_k if games1 < provisional_games else k
+    k2 = provisional_k if games2 < provisional_games else k
+    expected1 = expected_score(rating1, rating2)
+    return (
+        rating1 + k1 * (score1 - expected1),
+        rating2 + k2 * ((1 - score1) - (1 - expected1)),
+    )
+
+
+def apply_result(session):
+    """
+    Update both players' ratings for a decided session and log history.
+    Must run inside the transaction that sets session.result. Returns None
+    without rating when the session is undecided or a profile is missing;
+    the result itself still stands.
+    """
+    if session.result not in DECIDED_RESULTS:
+        return None
+
+    # Lock both rows in a fixed order so concurrent sessions cannot deadlock
+    profiles = {p.user_id: p for p in lock_players([session.player1_id, session.player2_id])}
+    if session.player1_id not in profiles or session.player2_id not in profiles:
+        return None
+    p1, p2 = profiles[session.player1_id], profiles[session.player2_id]
+    before1, before2 = p1.rating, p2.rating
+    score1 = 1 if session.result == 'P1_WIN' else 0
+
+    p1.rating, p2.rating = rate(before1, p1.rated_matches, before2, p2.rated_matches, score1)
+    p1.rated_matches += 1
+    p2.rated_matches += 1
+    Profile.objects.bulk_update([p1, p2], ['rating', 'rated_matches'])
+
+    RatingHistory.objects.bulk_create([
+        RatingHistory(user_id=p1.user_id, session=session, rating_before=before1,
+                      rating_after=p1.rating, created_at=session.date_played),
+        RatingHistory(user_id=p2.user_id, session=session, rating_before=before2,
+                      rating_after=p2.rating, created_at=session.date_played),
+    ])
+    return p1.rating, p2.rating
+
+
+def replay(results, factors=None):
+    """
+    Replay (session_id, player1_id, player2_id, result, date_played) rows in
+    play order. Returns ({user_id: (rating, games)}, [RatingHistory, ...]).
+    """
+    factors = factors or k_factors()
+    state = {}
+    history = []
+    for session_id, player1_id, player2_id, result, date_played in results:
+        rating1, games1 = state.get(player1_id, (DEFAULT_RATING, 0))
+        rating2, games2 = state.get(player2_id, (DEFAULT_RATING, 0))
+        new1, new2 = rate(rating1, games1, rating2, games2, 1 if result == 'P1_WIN' else 0, factors)
+        state[player1_id] = (new1, games1 + 1)
+        state[player2_id] = (new2, games2 + 1)
+        history.append(RatingHistory(user_id=player1_id, session_id=session_id, rating_before=rating1,
+                                     rating_after=new1, created_at=date_played))
+        history.append(RatingHistory(user_id=player2_id, session_id=session_id, rating_before=rating2,
+                                     rating_after=new2, created_at=date_played))
+    return state, history
+
+
+def recompute_all(factors=None, batch_size=1000):
+    """Rebuild every rating and the whole history from MatchSession results"""
+    results = (
+        MatchSession.objects.filter(result__in=DECIDED_RESULTS)
+        .order_by('date_played', 'id')
+        .values_list('id', 'player1_id', 'player2_id', 'result', 'date_played')
+        .iterator(chunk_size=batch_size)
+    )
+    state, history = replay(results, factors)
+
+    with transaction.atomic():
+        Profile.objects.update(rating=DEFAULT_RATING, rated_matches=0)
+        profiles = list(Profile.objects.filter(user_id__in=state).only('id', 'user_id'))
+        for profile in profiles:
+            profile.rating, profile.rated_matches = state[profile.user_id]
+        Profile.objects.bulk_update(profiles, ['rating', 'rated_matches'], batch_size=batch_size)
+
+        RatingHistory.objects.all().delete()
+        RatingHistory.objects.bulk_create(history, batch_size=batch_size)
+    return len(profiles), len(history) // 2
+
+
+def closest_opponents(profile, candidates, limit=10):
+    """
+    The `limit` candidates rated closest to `profile`, nearest first.
+
+    Two range scans on the (lokasi, rating) index, one upwards and one
+    downwards from the player's rating, instead of sorting the whole city
+    by distance.
+    """
+    candidates = candidates.filter(lokasi=profile.lokasi)
+    above = list(candidates.filter(rating__gte=profile.rating).order_by('rating', 'id')[:limit])
+    below = list(candidates.filter(rating__lt=profile.rating).order_by('-rating', '-id')[:limit])
+    return sorted(above + below, key=lambda p: (abs(p.rating - profile.rating), p.id))[:limit]
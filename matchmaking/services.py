@@ -0,0 +1,284 @@
+"""
+Match request and session services: locked write paths plus history reads.
+
+Anything that starts a session locks both players' Profile rows first,
+always in user_id order, then re-checks "one active session per
+player". The partial unique constraints on MatchSession back this up at
+the database level for each player column.
+
+Results are two-sided: each player reports, and wins are only applied
+when both reports agree or when the confirmation window runs out with a
+single report (see resolve_stale).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Prefetch, Q, Value, When
+from django.utils import timezone
+
+from playserve import metrics
+from profil.models import Profile
+
+from . import leaderboard, notifications
+from .models import MatchQueueEntry, MatchRequest, MatchSession, RatingHistory
+
+
+class MatchConflict(Exception):
+    pass
+
+
+def lock_players(user_ids):
+    """SELECT ... FOR UPDATE the players' profiles in a fixed order"""
+    return list(
+        Profile.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id')
+    )
+
+
+def busy_players(user_ids):
+    """Subset of user_ids that already have a PENDING session"""
+    busy = set()
+    for player1_id, player2_id in MatchSession.objects.filter(
+        Q(player1_id__in=user_ids) | Q(player2_id__in=user_ids), result='PENDING'
+    ).values_list('player1_id', 'player2_id'):
+        busy.update((player1_id, player2_id))
+    return busy & set(user_ids)
+
+
+def cancel_pending_requests(user_ids, exclude_id=None):
+    """
+    Auto-cancel every PENDING request sent or received by user_ids with
+    one UPDATE, and notify both sides. Returns the cancelled rows.
+    """
+    to_cancel = MatchRequest.objects.filter(
+        Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids), status='PENDING'
+    )
+    if exclude_id is not None:
+        to_cancel = to_cancel.exclude(id=exclude_id)
+    cancelled = list(to_cancel.select_for_update().values_list('id', 'sender_id', 'receiver_id'))
+    if cancelled:
+        to_cancel.update(status='AUTO_CANCELLED')
+        notifications.requests_auto_cancelled(cancelled)
+    return cancelled
+
+
+def accept_request(request_id, receiver):
+    """
+    Accept a PENDING request addressed to `receiver` and start the session.
+    Raises MatchRequest.DoesNotExist or MatchConflict.
+    """
+    with transaction.atomic():
+        match_request = MatchRequest.objects.select_for_update().get(
+            id=request_id, receiver=receiver, status='PENDING'
+        )
+        players = [match_request.sender_id, receiver.id]
+        lock_players(players)
+        if busy_players(players):
+            raise MatchConflict('One of the players is already in an active match.')
+
+        match_request.status = 'ACCEPTED'
+        match_request.save(update_fields=['status'])
+
+        # Player 1 adalah sender, Player 2 adalah receiver
+        session = MatchSession.objects.create(
+            player1_id=match_request.sender_id,
+            player2=receiver,
+            request=match_request,
+            result='PENDING',
+        )
+        notifications.request_accepted(match_request, session)
+
+        cancel_pending_requests(players, exclude_id=match_request.id)
+        MatchQueueEntry.objects.filter(user_id__in=players).delete()
+    return session
+
+
+def reject_request(request_id, receiver):
+    """Reject with a conditional UPDATE so it cannot race an accept"""
+    match_request = MatchRequest.objects.get(id=request_id, receiver=receiver, status='PENDING')
+    updated = MatchRequest.objects.filter(id=match_request.id, status='PENDING').update(status='REJECTED')
+    if not updated:
+        raise MatchRequest.DoesNotExist
+    match_request.status = 'REJECTED'
+    notifications.request_rejected(match_request)
+    return match_request
+
+
+def report_result(session_id, user, action):
+    """
+    Record `user`'s WIN, LOSE or CANCEL claim about a PENDING session.
+    Returns the session, whose
+    result is still PENDING (waiting for the opponent), settled, or DISPUTED.
+    Raises MatchSession.DoesNotExist.
+    """
+    with transaction.atomic():
+        session = MatchSession.objects.select_for_update().get(
+            Q(player1=user) | Q(player2=user), id=session_id, result='PENDING'
+        )
+        is_player1 = session.player1_id == user.id
+        if action == 'CANCEL':
+            result = 'CANCELLED'
+        else:
+            result = 'P1_WIN' if (action == 'WIN') == is_player1 else 'P2_WIN'
+        own, other = ('player1_report', 'player2_report') if is_player1 else ('player2_report', 'player1_report')
+        setattr(session, own, result)
+        session.reported_at = session.reported_at or timezone.now()
+        opponent_report = getattr(session, other)
+
+        if opponent_report == result:
+            settle([session])
+        elif opponent_report:
+            session.result = 'DISPUTED'
+            session.save(update_fields=[own, 'reported_at', 'result'])
+            notifications.result_disputed(session)
+        else:
+            # The first report can still be changed until the opponent answers
+            session.save(update_fields=[own, 'reported_at'])
+            notifications.result_reported(session, user.id)
+    return session
+
+
+def resolve_dispute(session_id, result):
+    """
+    Settle a DISPUTED session with the result an admin decided on
+    (P1_WIN, P2_WIN or CANCELLED); wins and ratings follow as for an
+    agreed report. Raises MatchSession.DoesNotExist.
+    """
+    with transaction.atomic():
+        session = MatchSession.objects.select_for_update().get(id=session_id, result='DISPUTED')
+        session.player1_report = session.player2_report = result
+        settle([session])
+    return session
+
+
+def settle(sessions):
+    """
+    Apply agreed or timed-out reports: set each session's result from its
+    reports, then add every winner's wins with one UPDATE. Ratings follow
+    in play order. Must run inside a transaction holding the session rows.
+    """
+    from .rating import apply_result
+
+    lock_players({user_id for s in sessions for user_id in (s.player1_id, s.player2_id)})
+    wins = Counter()
+    for session in sessions:
+        session.result = session.player1_report or session.player2_report
+        session.is_confirmed = True
+        if session.result == 'P1_WIN':
+            wins[session.player1_id] += 1
+        elif session.result == 'P2_WIN':
+            wins[session.player2_id] += 1
+    MatchSession.objects.bulk_update(
+        sessions, ['result', 'is_confirmed', 'player1_report', 'player2_report', 'reported_at']
+    )
+
+    if wins:
+        Profile.objects.filter(user_id__in=wins).update(jumlah_kemenangan=F('jumlah_kemenangan') + Case(
+            *[When(user_id=user_id, then=Value(count)) for user_id, count in wins.items()]
+        ))
+        for user_id, count in wins.items():
+            transaction.on_commit(lambda user_id=user_id, count=count: leaderboard.board.record_win(user_id, count))
+
+    for session in sorted(sessions, key=lambda s: (s.date_played, s.id)):
+        apply_result(session)
+        notifications.result_confirmed(session)
+    return wins
+
+
+def confirm_timeout():
+    return timedelta(seconds=getattr(settings, 'MATCH_RESULT_CONFIRM_TIMEOUT', 24 * 60 * 60))
+
+
+def resolve_stale(now=None, batch_size=500):
+    """
+    Settle PENDING sessions whose single report is older than the
+    confirmation window, batch_size sessions per transaction. Locked rows
+    are skipped and picked up by the next run. Returns the number settled.
+    """
+    cutoff = (now or timezone.now()) - confirm_timeout()
+    settled = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                MatchSession.objects.select_for_update(skip_locked=True)
+                .filter(result='PENDING', reported_at__lte=cutoff)
+                .order_by('reported_at', 'id')[:batch_size]
+            )
+            if batch:
+                settle(batch)
+        settled += len(batch)
+        if len(batch) < batch_size:
+            return settled
+
+
+def _expire_in_batches(queryset, field, batch_size):
+    """Set `field` to EXPIRED on every row of queryset, batch_size ids per UPDATE"""
+    expired = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:batch_size])
+        if ids:
+            # Re-apply the whole filter so a row accepted or reported meanwhile is kept
+            expired += queryset.filter(id__in=ids).order_by().update(**{field: 'EXPIRED'})
+        if len(ids) < batch_size:
+            return expired
+
+
+def expire_stale(now=None, batch_size=1000):
+    """
+    Expire PENDING requests older than MATCH_REQUEST_TTL and unreported
+    PENDING sessions older than MATCH_SESSION_TTL. Both scans run on the
+    (status, timestamp) / (result, date_played) indexes. Sessions with a
+    report are left to resolve_stale. Returns (requests, sessions) expired.
+    """
+    now = now or timezone.now()
+    request_cutoff = now - timedelta(seconds=getattr(settings, 'MATCH_REQUEST_TTL', 24 * 60 * 60))
+    session_cutoff = now - timedelta(seconds=getattr(settings, 'MATCH_SESSION_TTL', 3 * 24 * 60 * 60))
+
+    requests = _expire_in_batches(
+        MatchRequest.objects.filter(status='PENDING', timestamp__lte=request_cutoff).order_by('timestamp'),
+        'status', batch_size,
+    )
+    sessions = _expire_in_batches(
+        MatchSession.objects.filter(result='PENDING', date_played__lte=session_cutoff, reported_at__isnull=True)
+        .order_by('date_played'),
+        'result', batch_size,
+    )
+    metrics.record('matchmaking.expired', requests, kind='request')
+    metrics.record('matchmaking.expired', sessions, kind='session')
+    return requests, sessions
+
+
+def history(user_id, opponent_id=None):
+    """
+    Finished sessions of a player, newest first. The OR across player1 and
+    player2 is served by the (player1, date_played) and (player2, date_played)
+    indexes; each row carries the player's rating change, if any.
+    """
+    sessions = MatchSession.objects.filter(Q(player1_id=user_id) | Q(player2_id=user_id))
+    if opponent_id is not None:
+        sessions = sessions.filter(Q(player1_id=opponent_id) | Q(player2_id=opponent_id))
+    return (
+        sessions.exclude(result__in=('PENDING', 'EXPIRED'))
+        .select_related('player1', 'player2')
+        .prefetch_related(Prefetch(
+            'rating_changes',
+            queryset=RatingHistory.objects.filter(user_id=user_id),
+            to_attr='own_rating_changes',
+        ))
+    )
+
+
+def head_to_head(user_id, opponent_id):
+    """Record of user_id against opponent_id in one aggregate query"""
+    won = Q(player1_id=user_id, result='P1_WIN') | Q(player2_id=user_id, result='P2_WIN')
+    lost = Q(player1_id=user_id, result='P2_WIN') | Q(player2_id=user_id, result='P1_WIN')
+    return MatchSession.objects.filter(
+        Q(player1_id=user_id, player2_id=opponent_id) | Q(player1_id=opponent_id, player2_id=user_id)
+    ).exclude(result__in=('PENDING', 'EXPIRED')).aggregate(
+        played=Count('id'),
+        wins=Count('id', filter=won),
+        losses=Count('id', filter=lost),
+        cancelled=Count('id', filter=Q(result='CANCELLED')),
+        last_played=Max('date_played'),
+    )
@@ -1,9 +1,24 @@
 import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from profil.models import Profile
-from matchmaking.models import MatchRequest, MatchSession 
+from django.utils import timezone
+from matchmaking.models import MatchQueueEntry, MatchRequest, MatchSession, RatingHistory
+from matchmaking import services
+from matchmaking.leaderboard import board
+from matchmaking.notifications import user_channel
+from matchmaking.pairing import pair_waiting, plan_pairs
+from playserve import events, metrics
+from matchmaking.rating import rate
 from matchmaking.views import create_match_request, handle_match_request, finish_match_session
 
 class MatchmakingViewsTest(TestCase):
@@ -78,6 +93,16 @@ class MatchmakingViewsTest(TestCase):
         
         self.assertEqual(response.status_code, 200)
         
+        # Nothing is applied until the opponent confirms
+        self.profile_a.refresh_from_db()
+        self.assertEqual(self.profile_a.jumlah_kemenangan, initial_wins)
+
+        opponent = Client()
+        opponent.login(username='B_Opponent', password='testpassword')
+        opponent.post(self.finish_sess_url,
+                      json.dumps({'session_id': session.id, 'action': 'LOSE'}),
+                      content_type='application/json')
+
         self.profile_a.refresh_from_db()
 
         self.assertEqual(self.profile_a.jumlah_kemenangan, initial_wins + 1)
@@ -86,6 +111,572 @@ class MatchmakingViewsTest(TestCase):
         response = self.client.post(self.finish_sess_url,
                                     json.dumps({'session_id': session_2.id, 'action': 'WIN'}),
                                     content_type='application/json')
+        opponent.login(username='D_Extra', password='testpassword')
+        opponent.post(self.finish_sess_url,
+                      json.dumps({'session_id': session_2.id, 'action': 'LOSE'}),
+                      content_type='application/json')
         
         self.profile_a.refresh_from_db()
-        self.assertEqual(self.profile_a.jumlah_kemenangan, initial_wins + 2)
\ No newline at end of file
+        self.assertEqual(self.profile_a.jumlah_kemenangan, initial_wins + 2)
+
+class AvailableUsersTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('matchmaking:api_available_users')
+
+        # Profiles come from the post_save signal on User
+        self.me = User.objects.create_user(username='Me', password='testpassword')
+        Profile.objects.filter(user=self.me).update(lokasi='Jakarta', jumlah_kemenangan=12)
+        for name, lokasi, wins in [
+            ('Silver_1', 'Jakarta', 10), ('Silver_2', 'Jakarta', 24), ('Silver_3', 'Jakarta', 20),
+            ('Gold_1', 'Jakarta', 25), ('Bronze_1', 'Jakarta', 9), ('Silver_Bogor', 'Bogor', 15),
+        ]:
+            u = User.objects.create_user(username=name, password='testpassword')
+            Profile.objects.filter(user=u).update(lokasi=lokasi, jumlah_kemenangan=wins)
+
+        self.client.login(username='Me', password='testpassword')
+
+    def test_filters_same_city_and_rank_in_sql(self):
+        pending = User.objects.get(username='Silver_3')
+        MatchRequest.objects.create(sender=pending, receiver=self.me, status='PENDING')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        names = [u['username'] for u in response.json()['users']]
+        self.assertEqual(names, ['Silver_1', 'Silver_2'])
+        self.assertFalse(response.json()['has_next'])
+
+    def test_paginates_with_cursor(self):
+        first = self.client.get(self.url, {'page_size': 2}).json()
+        self.assertEqual([u['username'] for u in first['users']], ['Silver_1', 'Silver_2'])
+        self.assertTrue(first['has_next'])
+
+        second = self.client.get(self.url, {'page_size': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([u['username'] for u in second['users']], ['Silver_3'])
+        self.assertIsNone(second['next_cursor'])
+
+        self.assertEqual(self.client.get(self.url, {'cursor': 'bogus'}).status_code, 400)
+
+    def test_rank_filter_matches_rank_property(self):
+        me = Profile.objects.filter(user=self.me)
+        for wins in (0, 9, 10, 24, 25, 49, 50, 99, 100, 500):
+            me.update(jumlah_kemenangan=wins)
+            rank = Profile(jumlah_kemenangan=wins).rank
+            self.assertTrue(me.filter(Profile.rank_filter(rank)).exists(), (wins, rank))
+
+
+class RatingTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user_a = User.objects.create_user(username='A_Rated', password='testpassword')
+        self.user_b = User.objects.create_user(username='B_Rated', password='testpassword')
+        self.client.login(username='A_Rated', password='testpassword')
+
+    def _finish(self, session, action, client=None):
+        return (client or self.client).post(reverse('matchmaking:action_finish_session'),
+                                            json.dumps({'session_id': session.id, 'action': action}),
+                                            content_type='application/json')
+
+    def test_rate_is_zero_sum_for_equal_k(self):
+        new1, new2 = rate(1500, 50, 1300, 50, 0)
+        self.assertAlmostEqual((new1 - 1500) + (new2 - 1300), 0)
+        self.assertLess(new1, 1500)
+        self.assertGreater(new2 - 1300, 12)
+
+    def test_finish_session_updates_both_ratings_and_history(self):
+        session = MatchSession.objects.create(player1=self.user_a, player2=self.user_b)
+        self._finish(session, 'WIN')
+        self.assertEqual(Profile.objects.get(user=self.user_a).rating, 1200)
+        opponent = Client()
+        opponent.login(username='B_Rated', password='testpassword')
+        response = self._finish(session, 'LOSE', opponent)
+        self.assertEqual(response.json()['result'], 'P1_WIN')
+
+        a = Profile.objects.get(user=self.user_a)
+        b = Profile.objects.get(user=self.user_b)
+        self.assertAlmostEqual(a.rating, 1220)
+        self.assertAlmostEqual(b.rating, 1180)
+        self.assertEqual((a.rated_matches, b.rated_matches), (1, 1))
+        self.assertEqual(RatingHistory.objects.filter(session=session).count(), 2)
+
+    def test_missing_profile_settles_without_rating(self):
+        session = MatchSession.objects.create(player1=self.user_a, player2=self.user_b)
+        Profile.objects.filter(user=self.user_b).delete()
+        self._finish(session, 'WIN')
+        opponent = Client()
+        opponent.login(username='B_Rated', password='testpassword')
+        response = self._finish(session, 'LOSE', opponent)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result'], 'P1_WIN')
+        self.assertEqual(Profile.objects.get(user=self.user_a).rating, 1200)
+        self.assertFalse(RatingHistory.objects.exists())
+
+    def test_cancel_does_not_rate(self):
+        session = MatchSession.objects.create(player1=self.user_a, player2=self.user_b)
+        self._finish(session, 'CANCEL')
+        self.assertEqual(Profile.objects.get(user=self.user_a).rating, 1200)
+        self.assertFalse(RatingHistory.objects.exists())
+
+    def test_recompute_replays_history(self):
+        for result in ('P1_WIN', 'P2_WIN', 'P1_WIN'):
+            MatchSession.objects.create(player1=self.user_a, player2=self.user_b, result=result)
+        MatchSession.objects.create(player1=self.user_a, player2=self.user_b, result='CANCELLED')
+
+        call_command('recompute_ratings', stdout=StringIO())
+        a = Profile.objects.get(user=self.user_a)
+        self.assertEqual(a.rated_matches, 3)
+        self.assertGreater(a.rating, 1200)
+        self.assertEqual(RatingHistory.objects.count(), 6)
+
+        call_command('recompute_ratings', '--k', '10', '--provisional-k', '10', stdout=StringIO())
+        self.assertLess(Profile.objects.get(user=self.user_a).rating, a.rating)
+
+    def test_closest_opponents(self):
+        Profile.objects.filter(user=self.user_a).update(rating=1500)
+        Profile.objects.filter(user=self.user_b).update(rating=1300)
+        for name, rating, lokasi in [('Near', 1490, 'Jakarta'), ('Mid', 1560, 'Jakarta'), ('Far_City', 1500, 'Bogor')]:
+            u = User.objects.create_user(username=name, password='testpassword')
+            Profile.objects.filter(user=u).update(rating=rating, lokasi=lokasi)
+
+        response = self.client.get(reverse('matchmaking:api_closest_opponents'), {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([u['username'] for u in response.json()['users']], ['Near', 'Mid'])
+
+
+class MatchQueueTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.players = {}
+        for name, rating, lokasi in [
+            ('Q_1500', 1500, 'Jakarta'), ('Q_1520', 1520, 'Jakarta'),
+            ('Q_1900', 1900, 'Jakarta'), ('Q_Bogor', 1510, 'Bogor'),
+        ]:
+            u = User.objects.create_user(username=name, password='testpassword')
+            Profile.objects.filter(user=u).update(rating=rating, lokasi=lokasi)
+            self.players[name] = u
+
+    def _join(self, name):
+        self.client.login(username=name, password='testpassword')
+        return self.client.post(reverse('matchmaking:action_join_queue'))
+
+    def test_join_is_idempotent_and_leave(self):
+        self.assertEqual(self._join('Q_1500').status_code, 201)
+        self.assertEqual(self._join('Q_1500').json()['status'], 'already_queued')
+        self.assertTrue(self.client.get(reverse('matchmaking:api_queue_status')).json()['queued'])
+
+        response = self.client.post(reverse('matchmaking:action_leave_queue'))
+        self.assertEqual(response.json()['status'], 'left')
+        self.assertFalse(MatchQueueEntry.objects.exists())
+
+    def test_pairs_closest_players_in_same_city(self):
+        for name in self.players:
+            self._join(name)
+        MatchRequest.objects.create(sender=self.players['Q_1500'], receiver=self.players['Q_1900'])
+
+        sessions = pair_waiting()
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(
+            {sessions[0].player1_id, sessions[0].player2_id},
+            {self.players['Q_1500'].id, self.players['Q_1520'].id},
+        )
+        self.assertEqual(MatchQueueEntry.objects.count(), 2)
+        self.assertEqual(MatchRequest.objects.get().status, 'AUTO_CANCELLED')
+
+        self.client.login(username='Q_1520', password='testpassword')
+        status = self.client.get(reverse('matchmaking:api_queue_status')).json()
+        self.assertEqual(status['session_id'], sessions[0].id)
+        self.assertEqual(self._join('Q_1520').status_code, 409)
+
+    def test_tolerance_widens_with_wait(self):
+        self._join('Q_1500')
+        self._join('Q_1900')
+        self.assertEqual(pair_waiting(), [])
+        later = timezone.now() + timedelta(minutes=2)
+        self.assertEqual(len(pair_waiting(now=later)), 1)
+
+    def test_plan_pairs_greedy_neighbours(self):
+        now = timezone.now()
+        entries = [(i, i, rating, now) for i, rating in enumerate([1000, 1010, 1200, 1205, 1290])]
+        pairs = plan_pairs(entries, now)
+        self.assertEqual(sorted((a[0], b[0]) for a, b in pairs), [(0, 1), (2, 3)])
+
+
+class MatchEventsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        events.get_backend.cache_clear()
+        self.sender = User.objects.create_user(username='E_Sender', password='testpassword')
+        self.receiver = User.objects.create_user(username='E_Receiver', password='testpassword')
+        self.other = User.objects.create_user(username='E_Other', password='testpassword')
+
+    def tearDown(self):
+        events.get_backend.cache_clear()
+
+    def _events(self, user):
+        return [(e[1], e[2]) for e in events.get_backend().read(user_channel(user.id), 0)]
+
+    def _post(self, name, url, payload):
+        self.client.login(username=name, password='testpassword')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(url), json.dumps(payload), content_type='application/json')
+
+    def test_request_lifecycle_events(self):
+        self._post('E_Sender', 'matchmaking:action_create_request', {'receiver_id': self.receiver.id})
+        self._post('E_Other', 'matchmaking:action_create_request', {'receiver_id': self.sender.id})
+        received = self._events(self.receiver)
+        self.assertEqual(received[0][0], 'match_request_received')
+        self.assertEqual(received[0][1]['sender_username'], 'E_Sender')
+
+        request_id = received[0][1]['request_id']
+        self._post('E_Receiver', 'matchmaking:action_handle_request', {'request_id': request_id, 'action': 'ACCEPT'})
+        sender_events = [name for name, _ in self._events(self.sender)]
+        self.assertEqual(sender_events, ['match_request_received', 'match_request_accepted',
+                                         'match_request_auto_cancelled'])
+        self.assertEqual([name for name, _ in self._events(self.other)], ['match_request_auto_cancelled'])
+
+    def test_reject_event(self):
+        self._post('E_Sender', 'matchmaking:action_create_request', {'receiver_id': self.receiver.id})
+        request_id = MatchRequest.objects.get().id
+        self._post('E_Receiver', 'matchmaking:action_handle_request', {'request_id': request_id, 'action': 'REJECT'})
+        self.assertEqual(self._events(self.sender), [
+            ('match_request_rejected', {'request_id': request_id, 'receiver_id': self.receiver.id}),
+        ])
+
+    def test_stream_emits_user_events(self):
+        events.publish(user_channel(self.sender.id), 'match_found', {'session_id': 1})
+        events.publish(user_channel(self.other.id), 'match_found', {'session_id': 2})
+        self.client.login(username='E_Sender', password='testpassword')
+        with self.settings(SSE_ENABLED=True, SSE_STREAM_TIMEOUT=0.05, SSE_POLL_INTERVAL=0.01):
+            response = self.client.get(reverse('matchmaking:api_events'), HTTP_LAST_EVENT_ID='0')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+            async def read_body():
+                return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+            body = async_to_sync(read_body)()
+        self.assertIn('"session_id": 1', body)
+        self.assertNotIn('"session_id": 2', body)
+
+    def test_streams_are_off_without_asgi(self):
+        self.client.login(username='E_Sender', password='testpassword')
+        with self.settings(SSE_ENABLED=False):
+            self.assertEqual(self.client.get(reverse('matchmaking:api_events')).status_code, 204)
+            dashboard = self.client.get(reverse('matchmaking:dashboard'))
+        self.assertContains(dashboard, "if (false && window.EventSource)")
+
+
+class AcceptLockingTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.a = User.objects.create_user(username='L_A', password='testpassword')
+        self.b = User.objects.create_user(username='L_B', password='testpassword')
+        self.c = User.objects.create_user(username='L_C', password='testpassword')
+        self.client.login(username='L_B', password='testpassword')
+
+    def _accept(self, match_request):
+        return self.client.post(reverse('matchmaking:action_handle_request'),
+                                json.dumps({'request_id': match_request.id, 'action': 'ACCEPT'}),
+                                content_type='application/json')
+
+    def test_accept_conflicts_when_sender_already_playing(self):
+        MatchSession.objects.create(player1=self.c, player2=self.a)
+        match_request = MatchRequest.objects.create(sender=self.a, receiver=self.b)
+        response = self._accept(match_request)
+        self.assertEqual(response.status_code, 409)
+        match_request.refresh_from_db()
+        self.assertEqual(match_request.status, 'PENDING')
+
+    def test_accept_cancels_everything_pending_for_both_players(self):
+        accepted = MatchRequest.objects.create(sender=self.a, receiver=self.b)
+        incoming_to_b = MatchRequest.objects.create(sender=self.c, receiver=self.b)
+        sent_by_a = MatchRequest.objects.create(sender=self.a, receiver=self.c)
+        self.assertEqual(self._accept(accepted).status_code, 200)
+        self.assertEqual(self._accept(accepted).status_code, 404)
+        statuses = dict(MatchRequest.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {
+            accepted.id: 'ACCEPTED',
+            incoming_to_b.id: 'AUTO_CANCELLED',
+            sent_by_a.id: 'AUTO_CANCELLED',
+        })
+
+    def test_database_rejects_second_active_session(self):
+        MatchSession.objects.create(player1=self.a, player2=self.b)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MatchSession.objects.create(player1=self.a, player2=self.c)
+        MatchSession.objects.create(player1=self.a, player2=self.c, result='CANCELLED')
+
+
+class MatchHistoryTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.me = User.objects.create_user(username='H_Me', password='testpassword')
+        self.rival = User.objects.create_user(username='H_Rival', password='testpassword')
+        self.other = User.objects.create_user(username='H_Other', password='testpassword')
+        self.sessions = [
+            MatchSession.objects.create(player1=self.me, player2=self.rival, result='P1_WIN'),
+            MatchSession.objects.create(player1=self.rival, player2=self.me, result='P1_WIN'),
+            MatchSession.objects.create(player1=self.rival, player2=self.me, result='P2_WIN'),
+            MatchSession.objects.create(player1=self.me, player2=self.rival, result='CANCELLED'),
+            MatchSession.objects.create(player1=self.other, player2=self.me, result='P1_WIN'),
+            MatchSession.objects.create(player1=self.me, player2=self.other, result='PENDING'),
+        ]
+        self.client.login(username='H_Me', password='testpassword')
+
+    def test_history_is_cursor_paginated_newest_first(self):
+        url = reverse('matchmaking:api_history')
+        first = self.client.get(url, {'page_size': 3}).json()
+        self.assertEqual([m['session_id'] for m in first['matches']],
+                         [self.sessions[4].id, self.sessions[3].id, self.sessions[2].id])
+        self.assertEqual([m['outcome'] for m in first['matches']], ['LOSS', 'CANCELLED', 'WIN'])
+
+        second = self.client.get(url, {'page_size': 3, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([m['outcome'] for m in second['matches']], ['LOSS', 'WIN'])
+        self.assertFalse(second['has_next'])
+
+        filtered = self.client.get(url, {'opponent_id': self.other.id}).json()
+        self.assertEqual([m['opponent']['username'] for m in filtered['matches']], ['H_Other'])
+
+    def test_head_to_head_single_query(self):
+        url = reverse('matchmaking:api_head_to_head', args=[self.rival.id])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            services.head_to_head(self.me.id, self.rival.id)
+        record = self.client.get(url).json()
+        self.assertEqual(
+            (record['played'], record['wins'], record['losses'], record['cancelled']),
+            (4, 2, 1, 1),
+        )
+        reverse_record = self.client.get(url.replace(str(self.rival.id), str(self.me.id)),
+                                         {'user_id': self.rival.id}).json()
+        self.assertEqual((reverse_record['wins'], reverse_record['losses']), (1, 2))
+
+
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        board.invalidate()
+        self.users = {}
+        for name, lokasi, wins in [
+            ('LB_Ace', 'Jakarta', 30), ('LB_Tie', 'Jakarta', 12), ('LB_Me', 'Jakarta', 12),
+            ('LB_Bogor', 'Bogor', 50), ('LB_Low', 'Bogor', 1),
+        ]:
+            u = User.objects.create_user(username=name, password='testpassword')
+            Profile.objects.filter(user=u).update(lokasi=lokasi, jumlah_kemenangan=wins)
+            self.users[name] = u
+        self.client.login(username='LB_Me', password='testpassword')
+
+    def tearDown(self):
+        board.invalidate()
+
+    def test_global_and_city_positions(self):
+        url = reverse('matchmaking:api_leaderboard')
+        body = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual([e['username'] for e in body['top']], ['LB_Bogor', 'LB_Ace', 'LB_Tie'])
+        self.assertEqual(body['me'], {'position': 3, 'kemenangan': 12, 'total': 5})
+
+        city = self.client.get(url, {'lokasi': 'Jakarta'}).json()
+        self.assertEqual([e['position'] for e in city['top']], [1, 2, 2])
+        self.assertEqual(city['me']['position'], 2)
+        self.assertIsNone(self.client.get(url, {'lokasi': 'Bogor'}).json()['me'])
+        self.assertEqual(self.client.get(url, {'lokasi': 'Mars'}).status_code, 400)
+
+    def test_finished_win_updates_board_incrementally(self):
+        url = reverse('matchmaking:api_leaderboard')
+        self.client.get(url)
+        session = MatchSession.objects.create(player1=self.users['LB_Me'], player2=self.users['LB_Tie'])
+        session.player2_report = 'P1_WIN'
+        session.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('matchmaking:action_finish_session'),
+                             json.dumps({'session_id': session.id, 'action': 'WIN'}),
+                             content_type='application/json')
+        with self.assertNumQueries(3):
+            # session, user and top-N profiles; the board itself is not rebuilt
+            body = self.client.get(url, {'lokasi': 'Jakarta'}).json()
+        self.assertEqual(body['me'], {'position': 2, 'kemenangan': 13, 'total': 3})
+
+
+class ResultConfirmationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.opponent = Client()
+        board.invalidate()
+        self.user_a = User.objects.create_user(username='Conf_A', password='testpassword')
+        self.user_b = User.objects.create_user(username='Conf_B', password='testpassword')
+        self.client.login(username='Conf_A', password='testpassword')
+        self.opponent.login(username='Conf_B', password='testpassword')
+        self.session = MatchSession.objects.create(player1=self.user_a, player2=self.user_b)
+
+    def tearDown(self):
+        board.invalidate()
+
+    def _report(self, client, action):
+        return client.post(reverse('matchmaking:action_finish_session'),
+                           json.dumps({'session_id': self.session.id, 'action': action}),
+                           content_type='application/json').json()
+
+    def _wins(self, user):
+        return Profile.objects.get(user=user).jumlah_kemenangan
+
+    def test_first_report_waits_and_can_be_changed(self):
+        self.assertEqual(self._report(self.client, 'WIN')['result'], 'PENDING')
+        self.assertEqual(self._report(self.client, 'LOSE')['result'], 'PENDING')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.player1_report, 'P2_WIN')
+        self.assertIsNotNone(self.session.reported_at)
+        self.assertEqual(self._wins(self.user_b), 0)
+
+        body = self.opponent.get(reverse('matchmaking:api_active_session')).json()
+        self.assertEqual((body['your_report'], body['opponent_reported']), ('', True))
+
+    def test_agreement_applies_win_once(self):
+        self._report(self.client, 'LOSE')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._report(self.opponent, 'WIN')['result'], 'P2_WIN')
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_confirmed)
+        self.assertEqual((self._wins(self.user_a), self._wins(self.user_b)), (0, 1))
+        self.assertEqual(RatingHistory.objects.filter(session=self.session).count(), 2)
+        # The session is finished, so a repeated report cannot count twice
+        self.assertEqual(self.client.post(reverse('matchmaking:action_finish_session'),
+                                          json.dumps({'session_id': self.session.id, 'action': 'LOSE'}),
+                                          content_type='application/json').status_code, 404)
+
+    def test_disagreement_is_disputed_without_wins(self):
+        self._report(self.client, 'WIN')
+        self.assertEqual(self._report(self.opponent, 'WIN')['result'], 'DISPUTED')
+        self.assertEqual((self._wins(self.user_a), self._wins(self.user_b)), (0, 0))
+        self.assertFalse(RatingHistory.objects.exists())
+        self.assertFalse(services.busy_players([self.user_a.id, self.user_b.id]))
+
+    def test_admin_settles_dispute(self):
+        self._report(self.client, 'WIN')
+        self._report(self.opponent, 'WIN')
+        out = StringIO()
+        call_command('resolve_match_results', '--dispute', str(self.session.id), '--result', 'P2_WIN', stdout=out)
+        self.assertIn('as P2_WIN', out.getvalue())
+
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.result, self.session.is_confirmed), ('P2_WIN', True))
+        self.assertEqual((self._wins(self.user_a), self._wins(self.user_b)), (0, 1))
+        self.assertEqual(RatingHistory.objects.filter(session=self.session).count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('resolve_match_results', '--dispute', str(self.session.id), '--result', 'P1_WIN')
+
+    def test_malformed_body_is_rejected(self):
+        url = reverse('matchmaking:action_finish_session')
+        for body in ('{}', '{"session_id": "x"}', '[]', 'null'):
+            response = self.client.post(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_resolve_settles_stale_reports_in_bulk(self):
+        user_c = User.objects.create_user(username='Conf_C', password='testpassword')
+        user_d = User.objects.create_user(username='Conf_D', password='testpassword')
+        other = MatchSession.objects.create(player1=user_c, player2=user_d)
+        finished = MatchSession.objects.create(player1=user_c, player2=self.user_a, result='CANCELLED')
+        stale = timezone.now() - timedelta(days=2)
+        MatchSession.objects.filter(id=self.session.id).update(player1_report='P1_WIN', reported_at=stale)
+        MatchSession.objects.filter(id=other.id).update(player2_report='P1_WIN', reported_at=stale)
+        # Sessions nobody reported, or already finished, are left alone
+        unreported = MatchSession.objects.create(player1=User.objects.create_user(username='Conf_E'),
+                                                 player2=User.objects.create_user(username='Conf_F'))
+
+        out = StringIO()
+        call_command('resolve_match_results', '--batch-size', '1', stdout=out)
+        self.assertIn('Settled 2', out.getvalue())
+
+        self.assertEqual(
+            dict(MatchSession.objects.filter(id__in=[self.session.id, other.id, unreported.id, finished.id])
+                 .values_list('id', 'result')),
+            {self.session.id: 'P1_WIN', other.id: 'P1_WIN', unreported.id: 'PENDING', finished.id: 'CANCELLED'},
+        )
+        self.assertEqual((self._wins(self.user_a), self._wins(user_c)), (1, 1))
+        self.assertEqual(services.resolve_stale(), 0)
+
+
+class ExpiryTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'Exp_{i}') for i in range(6)]
+        self.old = timezone.now() - timedelta(days=5)
+        self.recorded = []
+        self.hook = lambda name, value, tags: self.recorded.append((name, value, tags))
+        metrics.register(self.hook)
+
+    def tearDown(self):
+        metrics.unregister(self.hook)
+
+    def test_expires_only_stale_pending_rows(self):
+        u = self.users
+        stale_request = MatchRequest.objects.create(sender=u[0], receiver=u[1])
+        fresh_request = MatchRequest.objects.create(sender=u[0], receiver=u[2])
+        answered = MatchRequest.objects.create(sender=u[1], receiver=u[2], status='REJECTED')
+        stale_session = MatchSession.objects.create(player1=u[0], player2=u[1])
+        reported = MatchSession.objects.create(player1=u[2], player2=u[3], player1_report='P1_WIN')
+        fresh_session = MatchSession.objects.create(player1=u[4], player2=u[5])
+        MatchRequest.objects.filter(id__in=[stale_request.id, answered.id]).update(timestamp=self.old)
+        MatchSession.objects.filter(id=stale_session.id).update(date_played=self.old)
+        MatchSession.objects.filter(id=reported.id).update(date_played=self.old, reported_at=self.old)
+
+        out = StringIO()
+        call_command('expire_stale_matches', '--batch-size', '1', stdout=out)
+        self.assertIn('Expired 1 match requests and 1 match sessions', out.getvalue())
+
+        statuses = dict(MatchRequest.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[r.id] for r in (stale_request, fresh_request, answered)],
+                         ['EXPIRED', 'PENDING', 'REJECTED'])
+        results = dict(MatchSession.objects.values_list('id', 'result'))
+        self.assertEqual([results[s.id] for s in (stale_session, reported, fresh_session)],
+                         ['EXPIRED', 'PENDING', 'PENDING'])
+        self.assertIn(('matchmaking.expired', 1, {'kind': 'session'}), self.recorded)
+
+        # Expired sessions free the players and never show up as played
+        self.assertFalse(services.busy_players([u[0].id, u[1].id]))
+        self.assertEqual(services.head_to_head(u[0].id, u[1].id)['played'], 0)
+
+    def test_row_reported_between_select_and_update_is_kept(self):
+        session = MatchSession.objects.create(player1=self.users[0], player2=self.users[1])
+        read_ids = QuerySet.values_list
+
+        def read_then_report(queryset, *args, **kwargs):
+            ids = list(read_ids(queryset, *args, **kwargs))
+            MatchSession.objects.filter(id=session.id).update(player1_report='P1_WIN', reported_at=self.old)
+            return ids
+
+        with mock.patch.object(QuerySet, 'values_list', read_then_report):
+            expired = services._expire_in_batches(
+                MatchSession.objects.filter(result='PENDING', reported_at__isnull=True).order_by('date_played'),
+                'result', 10,
+            )
+        self.assertEqual(expired, 0)
+        self.assertEqual(MatchSession.objects.get(id=session.id).result, 'PENDING')
+
+
+class DashboardQueryTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.me = User.objects.create_user(username='Dash_Me', password='testpassword')
+        self.opponent = User.objects.create_user(username='Dash_Opp', password='testpassword')
+        Profile.objects.filter(user=self.opponent).update(instagram='dash_opp')
+        self.client.login(username='Dash_Me', password='testpassword')
+        self.url = reverse('matchmaking:dashboard')
+
+    def test_active_match_loads_both_profiles_in_one_query(self):
+        MatchSession.objects.create(player1=self.opponent, player2=self.me)
+        with self.assertNumQueries(3):
+            # auth session, user, then the session with both profiles
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['view_type'], 'ACTIVE_MATCH')
+        self.assertEqual(response.context['opponent'], self.opponent)
+        self.assertEqual(response.context['opponent_profile'].instagram, 'dash_opp')
+        self.assertEqual(response.context['profile'].user_id, self.me.id)
+
+    def test_idle_dashboard_costs_two_queries(self):
+        with self.assertNumQueries(4):
+            # auth session, user, the active-session check and the own profile
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['view_type'], 'IDLE_FRAME')
+        self.assertEqual(response.context['profile'].user_id, self.me.id)
@@ -9,13 +9,21 @@ urlpatterns = [
 
     # 2. Endpoints AJAX (ambil/proses data JSON)
     path('api/available-users/', views.get_available_users_ajax, name='api_available_users'),
+    path('api/closest-opponents/', views.get_closest_opponents_ajax, name='api_closest_opponents'),
     path('api/incoming-requests/', views.get_incoming_requests_ajax, name='api_incoming_requests'),
     
     # 3. Endpoints Actions (buat/ubah data)
     path('action/create-request/', views.create_match_request, name='action_create_request'),
     path('action/handle-request/', views.handle_match_request, name='action_handle_request'),
     path('action/finish-session/', views.finish_match_session, name='action_finish_session'),
+    path('action/queue/join/', views.join_match_queue, name='action_join_queue'),
+    path('action/queue/leave/', views.leave_match_queue, name='action_leave_queue'),
 
     path('api/active-session/', views.get_active_session, name='api_active_session'),
+    path('api/queue-status/', views.get_queue_status, name='api_queue_status'),
+    path('api/events/', views.match_event_stream, name='api_events'),
+    path('api/history/', views.get_match_history, name='api_history'),
+    path('api/leaderboard/', views.get_leaderboard, name='api_leaderboard'),
+    path('api/head-to-head/<int:opponent_id>/', views.get_head_to_head, name='api_head_to_head'),
     path("api/opponent/<int:user_id>/", views.get_opponent_profile),
 ]
\ No newline at end of file
@@ -1,44 +1,89 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.db.models import Q 
 from django.db.models import F
 from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404
-from django.db import transaction
 from .models import MatchRequest, MatchSession 
+from .rating import closest_opponents
+from . import leaderboard, notifications, pairing, services
+from .models import MatchQueueEntry
 from profil.models import Profile 
 from django.contrib.auth.models import User
 import json
 from django.views.decorators.csrf import csrf_exempt
+from django.http import StreamingHttpResponse
+from playserve import events
+from playserve.pagination import keyset_page, parse_page_size
+from playserve.ratelimit import rate_limit
+
+CANDIDATE_PAGE_SIZE = 20
+CANDIDATE_MAX_PAGE_SIZE = 50
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+LEADERBOARD_SIZE = 10
+LEADERBOARD_MAX_SIZE = 100
+
+def _candidate_profiles(user):
+    """Profiles `user` may send a request to, before any city/skill filter"""
+    # Pending requests in either direction are excluded inside the same query
+    pending = MatchRequest.objects.filter(status='PENDING')
+    return (
+        Profile.objects.select_related('user')
+        .exclude(user__is_superuser=True)
+        .exclude(role=Profile.Role.ADMIN)
+        .exclude(user_id=user.id)
+        .exclude(user_id__in=pending.filter(sender=user).values('receiver_id'))
+        .exclude(user_id__in=pending.filter(receiver=user).values('sender_id'))
+    )
+
+def _candidate_json(p):
+    return {
+        'user_id': p.user.id,
+        'username': p.user.username,
+        'rank': p.rank,
+        'rating': round(p.rating),
+        'lokasi': p.lokasi,
+        'avatar': p.avatar,
+        'kemenangan': p.jumlah_kemenangan,
+        'instagram': p.instagram,
+    }
 
 # Dashboard utama
 @login_required 
 def matchmaking_dashboard(request):
     user = request.user
-    
+
+    # Cek pertandingan aktif; both players' profiles come with it, and the
+    # partial unique indexes on (player1|player2) WHERE result='PENDING'
+    # serve the OR lookup
+    active_session = MatchSession.objects.filter(
+        Q(player1=user) | Q(player2=user),
+        result='PENDING'
+    ).select_related('player1__profile', 'player2__profile').first()
+
     try:
-        current_user_profile = Profile.objects.get(user=user)
+        if active_session:
+            you_are_player1 = active_session.player1_id == user.id
+            me = active_session.player1 if you_are_player1 else active_session.player2
+            current_user_profile = me.profile
+        else:
+            current_user_profile = Profile.objects.get(user=user)
     except Profile.DoesNotExist:
         return render(request, 'dashboard.html', {'view_type': 'NO_PROFILE', 'profile': None})
         
     base_context = {
         'profile': current_user_profile,
+        'sse_enabled': events.streams_enabled(),
     }
 
-
-    # Cek pertandingan aktif
-    active_session = MatchSession.objects.filter(
-        Q(player1=user) | Q(player2=user),
-        result='PENDING'
-    ).first()
-
     if active_session:
         # Jika ada sesi aktif, tampilkan halaman pertandingan
-        opponent = active_session.player2 if active_session.player1 == user else active_session.player1
+        opponent = active_session.player2 if you_are_player1 else active_session.player1
         
         try:
-            opponent_profile = Profile.objects.get(user=opponent) 
+            opponent_profile = opponent.profile
         except Profile.DoesNotExist:
             opponent_profile = None
             
@@ -46,6 +91,7 @@ def matchmaking_dashboard(request):
             **base_context, 
             'view_type': 'ACTIVE_MATCH',
             'session': active_session,
+            'my_report': active_session.player1_report if you_are_player1 else active_session.player2_report,
             'opponent': opponent,
             'opponent_profile': opponent_profile
         }
@@ -73,34 +119,64 @@ def get_available_users_ajax(request):
     except Profile.DoesNotExist:
         return JsonResponse({'error': 'User profile not found'}, status=404)
 
-    ids_sent_to = MatchRequest.objects.filter(sender=user, status='PENDING').values_list('receiver_id', flat=True)
-    ids_received_from = MatchRequest.objects.filter(receiver=user, status='PENDING').values_list('sender_id', flat=True)
-    excluded_ids = list(set(list(ids_sent_to) + list(ids_received_from) + [user.id]))
-
     potential_profiles = (
-        Profile.objects.select_related('user')
-        .filter(lokasi=target_lokasi)
-        .exclude(user__is_superuser=True)
-        .exclude(role=Profile.Role.ADMIN)
-        .exclude(user_id__in=excluded_ids)
-        .order_by('user__username')
+        _candidate_profiles(user)
+        .filter(Profile.rank_filter(target_rank), lokasi=target_lokasi)
+        .annotate(username=F('user__username'))
     )
 
-    available_users = [
-        {
-            'user_id': p.user.id,
-            'username': p.user.username,
-            'rank': p.rank,
-            'lokasi': p.lokasi,
-            'avatar': p.avatar,
-            'kemenangan': p.jumlah_kemenangan,
-            'instagram': p.instagram,
-        }
-        for p in potential_profiles
-        if p.rank == target_rank
-    ]
+    page_size = parse_page_size(request, CANDIDATE_PAGE_SIZE, CANDIDATE_MAX_PAGE_SIZE)
+    try:
+        profiles, next_cursor = keyset_page(
+            potential_profiles, ['username', 'user_id'], request.GET.get('cursor'), page_size
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
 
-    return JsonResponse({'users': available_users})
+    available_users = [_candidate_json(p) for p in profiles]
+
+    return JsonResponse({
+        'users': available_users,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None,
+    })
+
+@login_required
+def get_closest_opponents_ajax(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        user_profile = Profile.objects.get(user=request.user)
+    except Profile.DoesNotExist:
+        return JsonResponse({'error': 'User profile not found'}, status=404)
+
+    limit = parse_page_size(request, CANDIDATE_PAGE_SIZE, CANDIDATE_MAX_PAGE_SIZE, param='limit')
+    opponents = closest_opponents(user_profile, _candidate_profiles(request.user), limit)
+    return JsonResponse({
+        'rating': round(user_profile.rating),
+        'users': [_candidate_json(p) for p in opponents],
+    })
+
+@login_required
+async def match_event_stream(request):
+    """
+    Server-sent events for the current user's match requests and sessions,
+    so idle dashboards wait without polling. Serve from playserve.asgi.
+    """
+    if not events.streams_enabled():
+        return HttpResponse(status=204)
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        events.sse_stream(
+            notifications.user_channel(user.id),
+            last_event_id=request.headers.get('Last-Event-ID'),
+        ),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # Menampilkan users yang memberi request
 @login_required
@@ -149,6 +225,7 @@ def get_incoming_requests_ajax(request):
 @csrf_exempt
 @login_required
 @require_POST
+@rate_limit('match_request')
 def create_match_request(request):
     user = request.user
     
@@ -179,11 +256,12 @@ def create_match_request(request):
         return JsonResponse({'success': False, 'error': 'You already have a pending request to this user.'}, status=409)
 
     # Buat request baru
-    MatchRequest.objects.create(
+    match_request = MatchRequest.objects.create(
         sender=user,
         receiver=receiver,
         status='PENDING' 
     )
+    notifications.request_received(match_request, getattr(user, 'profile', None))
     
     # Beri respons sukses
     return JsonResponse({
@@ -208,67 +286,72 @@ def handle_match_request(request):
     if not request_id or action not in ['ACCEPT', 'REJECT']:
         return JsonResponse({'success': False, 'error': 'Invalid parameters.'}, status=400)
 
-    try:
-        # Ambil request yang akan diproses
-        match_request = MatchRequest.objects.get(id=request_id, receiver=user, status='PENDING')
-    except MatchRequest.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Pending request not found or already processed.'}, status=404)
+    not_found = JsonResponse({'success': False, 'error': 'Pending request not found or already processed.'}, status=404)
 
     # Reject
     if action == 'REJECT':
-        match_request.status = 'REJECTED'
-        match_request.save()
+        try:
+            services.reject_request(request_id, user)
+        except MatchRequest.DoesNotExist:
+            return not_found
         return JsonResponse({
             'success': True, 
             'message': f''
         })
 
-    # Accept
-    elif action == 'ACCEPT':
-        sender = match_request.sender
-        
-        # Gunakan transaction untuk memastikan semua query sukses atau gagal bersamaan
-        try:
-            with transaction.atomic():
-                # Update MatchRequest yang diterima
-                match_request.status = 'ACCEPTED'
-                match_request.save()
-                
-                # Buat MatchSession baru
-                # Player 1 adalah sender, Player 2 adalah receiver
-                MatchSession.objects.create(
-                    player1=sender,
-                    player2=user,
-                    request=match_request,
-                    result='PENDING' 
-                )
-                
-                # Batalkan semua MatchRequest lain yang melibatkan sender
-                MatchRequest.objects.filter(
-                    sender=sender, 
-                    status='PENDING'
-                ).exclude(id=match_request.id).update(status='AUTO_CANCELLED')
-
-                # Batalkan semua MatchRequest lain yang melibatkan receiver
-                MatchRequest.objects.filter(
-                    sender=user, 
-                    status='PENDING'
-                ).update(status='AUTO_CANCELLED')
-                
-                # Batalkan semua request PENDING lain yang diterima sender dari user lain
-                MatchRequest.objects.filter(
-                    receiver=sender, 
-                    status='PENDING'
-                ).update(status='AUTO_CANCELLED')
-                
-            return JsonResponse({
-                'success': True, 
-                'message': f'',
-                'redirect': '/matchmaking/dashboard/'
-            })
-
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': f'Failed to start match: {str(e)}'}, status=500)
+    # Accept: kunci request dan profil kedua pemain agar klik bersamaan tetap aman
+    try:
+        services.accept_request(request_id, user)
+    except MatchRequest.DoesNotExist:
+        return not_found
+    except services.MatchConflict as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': f'Failed to start match: {str(e)}'}, status=500)
+
+    return JsonResponse({
+        'success': True, 
+        'message': f'',
+        'redirect': '/matchmaking/dashboard/'
+    })
+
+# Antrean matchmaking otomatis
+@csrf_exempt
+@login_required
+@require_POST
+@rate_limit('match_request')
+def join_match_queue(request):
+    try:
+        entry, created = pairing.enqueue(request.user)
+    except pairing.QueueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    return JsonResponse({
+        'success': True,
+        'status': 'queued' if created else 'already_queued',
+        'enqueued_at': entry.enqueued_at.isoformat(),
+    }, status=201 if created else 200)
+
+@csrf_exempt
+@login_required
+@require_POST
+def leave_match_queue(request):
+    left = pairing.dequeue(request.user)
+    return JsonResponse({'success': True, 'status': 'left' if left else 'not_queued'})
+
+@login_required
+def get_queue_status(request):
+    entry = MatchQueueEntry.objects.filter(user=request.user).first()
+    if entry:
+        return JsonResponse({
+            'queued': True,
+            'enqueued_at': entry.enqueued_at.isoformat(),
+            'lokasi': entry.lokasi,
+        })
+
+    session = MatchSession.objects.filter(
+        Q(player1=request.user) | Q(player2=request.user), result='PENDING'
+    ).values_list('id', flat=True).first()
+    return JsonResponse({'queued': False, 'session_id': session})
 
 # Handle Win/Lose/Cancel  
 @csrf_exempt      
@@ -281,69 +364,30 @@ def finish_match_session(request):
         data = json.loads(request.body)
         session_id = int(data.get('session_id'))
         action = data.get('action') 
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
         return JsonResponse({'success': False, 'error': 'Invalid JSON data.'}, status=400)
     
     if not session_id or action not in ['WIN', 'LOSE', 'CANCEL']:
         return JsonResponse({'success': False, 'error': 'Invalid parameters.'}, status=400)
 
     try:
-        session = MatchSession.objects.get(
-            Q(player1=user) | Q(player2=user), 
-            id=session_id, 
-            result='PENDING'
-        )
+        session = services.report_result(session_id, user, action)
     except MatchSession.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Active session not found or already finished.'}, status=404)
 
-    is_player1 = (session.player1 == user)
+    if session.result == 'PENDING':
+        message = 'Result saved. Waiting for your opponent to confirm.'
+    elif session.result == 'DISPUTED':
+        message = 'Your opponent reported a different result. The match is marked as disputed until an admin settles it.'
+    else:
+        message = ''
 
-    try:
-        with transaction.atomic():
-            
-            if action == 'WIN':
-                session.result = 'P1_WIN' if is_player1 else 'P2_WIN'
-                
-                winner = session.player1 if is_player1 else session.player2
-                
-                Profile.objects.filter(user=winner).update(jumlah_kemenangan=F('jumlah_kemenangan') + 1)
-                
-                winner_profile = Profile.objects.get(user=winner)
-                
-                if winner == user:
-                    request.user.profile.refresh_from_db()
-                
-                message = f''
-                
-            elif action == 'LOSE':
-                session.result = 'P2_WIN' if is_player1 else 'P1_WIN'
-
-                winner = session.player2 if is_player1 else session.player1
-                
-                Profile.objects.filter(user=winner).update(jumlah_kemenangan=F('jumlah_kemenangan') + 1)
-
-                if winner == user:
-                    request.user.profile.refresh_from_db()
-
-                message = ''
-
-            elif action == 'CANCEL':
-                session.result = 'CANCELLED'
-                message = ''
-            
-            # Simpan update sesi
-            session.save(update_fields=['result'])
-
-            return JsonResponse({
-                'success': True, 
-                'message': message,
-                'redirect': '/matchmaking/dashboard/'
-            })
-
-    except Profile.DoesNotExist:
-        return JsonResponse({'success': False, 'error': 'Profile missing for one of the players.'}, status=500)
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': f'Failed to finalize match: {str(e)}'}, status=500)
+    return JsonResponse({
+        'success': True,
+        'result': session.result,
+        'message': message,
+        'redirect': '/matchmaking/dashboard/'
+    })
     
 @login_required
 def get_active_session(request):
@@ -368,7 +412,101 @@ def get_active_session(request):
             "id": session.player2.id,
             "username": session.player2.username,
         },
-        "you_are_player1": session.player1 == user
+        "you_are_player1": session.player1 == user,
+        "your_report": session.player1_report if session.player1 == user else session.player2_report,
+        "opponent_reported": bool(session.player2_report if session.player1 == user else session.player1_report),
+    })
+
+def _session_outcome(session, user_id):
+    if session.result in ('P1_WIN', 'P2_WIN'):
+        won = (session.result == 'P1_WIN') == (session.player1_id == user_id)
+        return 'WIN' if won else 'LOSS'
+    return session.result
+
+@login_required
+def get_match_history(request):
+    try:
+        user_id = int(request.GET.get('user_id', request.user.id))
+        opponent_id = request.GET.get('opponent_id')
+        opponent_id = int(opponent_id) if opponent_id else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid user id'}, status=400)
+
+    page_size = parse_page_size(request, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+    try:
+        sessions, next_cursor = keyset_page(
+            services.history(user_id, opponent_id), ['-date_played', '-id'],
+            request.GET.get('cursor'), page_size,
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    matches = []
+    for session in sessions:
+        opponent = session.player2 if session.player1_id == user_id else session.player1
+        change = session.own_rating_changes[0] if session.own_rating_changes else None
+        matches.append({
+            'session_id': session.id,
+            'date_played': session.date_played.isoformat(),
+            'opponent': {'id': opponent.id, 'username': opponent.username},
+            'outcome': _session_outcome(session, user_id),
+            'rating_before': round(change.rating_before) if change else None,
+            'rating_after': round(change.rating_after) if change else None,
+        })
+
+    return JsonResponse({
+        'matches': matches,
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None,
+    })
+
+@login_required
+def get_head_to_head(request, opponent_id):
+    try:
+        user_id = int(request.GET.get('user_id', request.user.id))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid user id'}, status=400)
+
+    record = services.head_to_head(user_id, opponent_id)
+    last_played = record.pop('last_played')
+    return JsonResponse({
+        'user_id': user_id,
+        'opponent_id': opponent_id,
+        **record,
+        'last_played': last_played.isoformat() if last_played else None,
+    })
+
+@login_required
+def get_leaderboard(request):
+    lokasi = request.GET.get('lokasi') or None
+    if lokasi is not None and lokasi not in dict(Profile.KOTA_CHOICES):
+        return JsonResponse({'error': 'Unknown lokasi'}, status=400)
+    limit = parse_page_size(request, LEADERBOARD_SIZE, LEADERBOARD_MAX_SIZE, param='limit')
+
+    top = leaderboard.board.top(lokasi, limit)
+    profiles = Profile.objects.select_related('user').in_bulk(
+        [user_id for _, user_id, _ in top], field_name='user_id'
+    )
+    entries = []
+    for position, user_id, wins in top:
+        profile = profiles.get(user_id)
+        if profile is None:
+            continue
+        entries.append({
+            'position': position,
+            'user_id': user_id,
+            'username': profile.user.username,
+            'avatar': profile.avatar,
+            'lokasi': profile.lokasi,
+            'kemenangan': wins,
+            'rank': profile.rank,
+        })
+
+    me = leaderboard.board.position(request.user.id, lokasi)
+    return JsonResponse({
+        'lokasi': lokasi,
+        'top': entries,
+        'me': {'position': me[0], 'kemenangan': me[1], 'total': me[2]} if me else None,
     })
 
 def get_opponent_profile(request, user_id):
@@ -383,6 +521,7 @@ def get_opponent_profile(request, user_id):
             "avatar": profile.avatar,
             "lokasi": profile.lokasi,
             "rank": profile.rank,
+            "rating": round(profile.rating),
             "kemenangan": profile.jumlah_kemenangan,
         })
     except User.DoesNotExist:
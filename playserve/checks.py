@@ -0,0 +1,40 @@
+"""
+Deployment checks for the helpers that rely on a cache shared by every
+worker. Registered from main.apps.MainConfig.ready().
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def default_cache_is_local():
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return backend in LOCAL_CACHES
+
+
+@register(Tags.caches)
+def check_event_bus_cache(app_configs, **kwargs):
+    if getattr(settings, 'EVENT_BUS_BACKEND', '') != 'playserve.events.CacheBackend':
+        return []
+    if not default_cache_is_local():
+        return []
+    return [Error(
+        'EVENT_BUS_BACKEND is CacheBackend but the default cache is per-process.',
+        hint='Point CACHES["default"] at Redis or Memcached, or use LocalBackend.',
+        id='playserve.E001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_rate_limit_cache(app_configs, **kwargs):
+    if not getattr(settings, 'RATE_LIMIT_ENABLED', True) or not default_cache_is_local():
+        return []
+    return [Warning(
+        'Rate-limit buckets live in a per-process cache, so each worker has its own budget.',
+        hint='Set REDIS_URL so every worker shares one cache.',
+        id='playserve.W001',
+    )]
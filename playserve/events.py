@@ -0,0 +1,158 @@
+"""
+Small pub/sub bus behind the server-sent event streams.
+
+Views publish with publish(channel, event, data). Stream views iterate
+sse_stream(channel), which polls the bus backend and formats events
+for text/event-stream. Polling the backend touches no database, so an
+idle stream costs no queries.
+
+The backend is chosen with settings.EVENT_BUS_BACKEND (dotted path):
+- LocalBackend (default) keeps events in process memory and only
+  reaches streams served by the same process.
+- CacheBackend stores events in the default Django cache and reaches
+  every worker sharing that cache (Redis, Memcached, ...). On the
+  per-process LocMem cache it is no better than LocalBackend, so the
+  playserve.E001 system check rejects that combination.
+
+Streaming needs an ASGI server. Under WSGI Django buffers the whole
+async iterator before sending anything, so stream views answer 204 (which
+tells EventSource to stop reconnecting) unless settings.SSE_ENABLED is on.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'playserve.events.LocalBackend'
+
+
+class LocalBackend:
+    """In-process bus with a bounded replay buffer per channel."""
+
+    def __init__(self, buffer_size=100):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(itertools.count)
+        self._buffers = defaultdict(lambda: deque(maxlen=buffer_size))
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            event_id = next(self._counters[channel]) + 1
+            self._buffers[channel].append((event_id, event, data))
+        return event_id
+
+    def last_id(self, channel):
+        with self._lock:
+            buffer = self._buffers.get(channel)
+            return buffer[-1][0] if buffer else 0
+
+    def read(self, channel, after_id):
+        with self._lock:
+            return [item for item in self._buffers.get(channel, ()) if item[0] > after_id]
+
+    # Memory only, so the async variants never block the event loop
+    async def alast_id(self, channel):
+        return self.last_id(channel)
+
+    async def aread(self, channel, after_id):
+        return self.read(channel, after_id)
+
+
+class CacheBackend:
+    """Bus stored in the Django cache so it can span processes."""
+
+    def __init__(self, buffer_size=100, timeout=300):
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+
+    def _seq_key(self, channel):
+        return f'events:{channel}:seq'
+
+    def _event_key(self, channel, event_id):
+        return f'events:{channel}:{event_id}'
+
+    def publish(self, channel, event, data):
+        seq_key = self._seq_key(channel)
+        cache.add(seq_key, 0, timeout=None)
+        event_id = cache.incr(seq_key)
+        cache.set(self._event_key(channel, event_id), (event, data), self.timeout)
+        return event_id
+
+    def last_id(self, channel):
+        return cache.get(self._seq_key(channel), 0)
+
+    def _keys(self, after_id, last, channel):
+        first = max(after_id + 1, last - self.buffer_size + 1)
+        return {self._event_key(channel, i): i for i in range(first, last + 1)}
+
+    def _events(self, keys, found):
+        return [(keys[key], *found[key]) for key in sorted(found, key=keys.get)]
+
+    def read(self, channel, after_id):
+        last = self.last_id(channel)
+        if last <= after_id:
+            return []
+        keys = self._keys(after_id, last, channel)
+        return self._events(keys, cache.get_many(list(keys)))
+
+    # Used by sse_stream so polling Redis/Memcached stays off the event loop
+    async def alast_id(self, channel):
+        return await cache.aget(self._seq_key(channel), 0)
+
+    async def aread(self, channel, after_id):
+        last = await self.alast_id(channel)
+        if last <= after_id:
+            return []
+        keys = self._keys(after_id, last, channel)
+        return self._events(keys, await cache.aget_many(list(keys)))
+
+
+def streams_enabled():
+    return getattr(settings, 'SSE_ENABLED', False)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, 'EVENT_BUS_BACKEND', DEFAULT_BACKEND))()
+
+
+def publish(channel, event, data):
+    return get_backend().publish(channel, event, data)
+
+
+def format_sse(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def sse_stream(channel, last_event_id=None):
+    """
+    Yield SSE frames for `channel` until SSE_STREAM_TIMEOUT elapses.
+    Clients reconnect with Last-Event-ID and resume from the buffer.
+    """
+    backend = get_backend()
+    timeout = getattr(settings, 'SSE_STREAM_TIMEOUT', 55)
+    poll_interval = getattr(settings, 'SSE_POLL_INTERVAL', 0.5)
+    keepalive = getattr(settings, 'SSE_KEEPALIVE_INTERVAL', 15)
+
+    try:
+        cursor = int(last_event_id)
+    except (TypeError, ValueError):
+        cursor = await backend.alast_id(channel)
+
+    started = last_sent = time.monotonic()
+    yield 'retry: 3000\n\n'
+    while time.monotonic() - started < timeout:
+        for event_id, event, data in await backend.aread(channel, cursor):
+            cursor = event_id
+            last_sent = time.monotonic()
+            yield format_sse(event_id, event, data)
+        if time.monotonic() - last_sent >= keepalive:
+            last_sent = time.monotonic()
+            yield ': keepalive\n\n'
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,40 @@
+"""
+Minimal metrics hook.
+
+Code reports counters and gauges with record(name, value, **tags).
+Nothing is collected by default. Point settings.METRICS_HOOKS at
+callables taking (name, value, tags) to forward them to StatsD,
+Prometheus, logs, ... Tests can use register()/unregister() directly.
+"""
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_hooks = []
+
+
+@lru_cache(maxsize=None)
+def _configured_hooks():
+    return tuple(import_string(path) for path in getattr(settings, 'METRICS_HOOKS', ()))
+
+
+def register(hook):
+    _hooks.append(hook)
+
+
+def unregister(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def record(name, value=1, **tags):
+    for hook in (*_configured_hooks(), *_hooks):
+        try:
+            hook(name, value, tags)
+        except Exception:
+            # A broken exporter must never fail the request it measures
+            logger.exception('Metrics hook %r failed for %s', hook, name)
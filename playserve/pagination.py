@@ -0,0 +1,76 @@
+"""
+Keyset (cursor) pagination shared by the JSON APIs.
+
+A cursor is an opaque urlsafe token holding the ordering values of the
+last row on the previous page. Each page is one indexed range scan, so
+deep pages cost the same as the first one.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(v) if v is not None else None for v in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Ordering values from a cursor token, raises ValueError if malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor.') from e
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor.')
+    return values
+
+
+def parse_page_size(request, default=20, maximum=100, param='page_size'):
+    try:
+        page_size = int(request.GET.get(param, default))
+    except (TypeError, ValueError):
+        return default
+    return min(max(page_size, 1), maximum)
+
+
+def _after(ordering, values):
+    """Q selecting rows strictly after `values` in the given ordering"""
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=20):
+    """
+    Return (items, next_cursor) for one page of `queryset`.
+
+    `ordering` must end with a unique column (usually id) so the cursor
+    position is unambiguous. next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(ordering):
+            raise ValueError('Invalid cursor.')
+        try:
+            queryset = queryset.filter(_after(ordering, values))
+        except (ValidationError, TypeError) as e:
+            raise ValueError('Invalid cursor.') from e
+
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last = items[-1]
+    next_cursor = encode_cursor([getattr(last, f.lstrip('-')) for f in ordering])
+    return items, next_cursor
@@ -0,0 +1,184 @@
+"""
+Token-bucket rate limiting for write endpoints.
+
+    @rate_limit('community_write')
+    def create_post_json(request, ...): ...
+
+Each group in settings.RATE_LIMITS gets a per-user and a per-IP budget,
+written as "<tokens>/<s|m|h>":
+
+    RATE_LIMITS = {'community_write': {'user': '20/m', 'ip': '60/m'}}
+
+A bucket holds at most <tokens> and refills continuously over the period,
+so short bursts pass while sustained floods get 429 with Retry-After.
+Bucket state lives in the default Django cache, updated under a short
+add()-based lock. Every worker shares the budget only if that cache is
+shared: set REDIS_URL in production (see settings.CACHES); on the
+default per-process LocMem cache the effective budget is multiplied by
+the number of workers, which the playserve.W001 check warns about. If
+the cache is unreachable, buckets fall back to process memory instead of
+failing open or erroring.
+
+Every decision is reported through playserve.metrics as
+ratelimit.allowed / ratelimit.blocked with group and scope tags.
+"""
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from . import metrics
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Bucket locks: how long a request waits for one, and when a lock left by
+# a crashed worker expires on its own
+LOCK_WAIT = 0.5
+LOCK_TIMEOUT = 2
+
+_local_buckets = {}
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'20/m' -> (20, 60)"""
+    tokens, _, period = rate.partition('/')
+    return int(tokens), PERIODS[period or 's']
+
+
+def get_limits(group):
+    """Budgets of `group` from settings.RATE_LIMITS, a group missing there is unlimited"""
+    return getattr(settings, 'RATE_LIMITS', {}).get(group, {})
+
+
+def client_ip(request):
+    """
+    REMOTE_ADDR, or behind a proxy (RATE_LIMIT_TRUST_FORWARDED) the last
+    X-Forwarded-For entry: the one the proxy appended. Earlier entries come
+    from the client and could be rotated to dodge the ip budget.
+    """
+    if getattr(settings, 'RATE_LIMIT_TRUST_FORWARDED', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _refill(state, capacity, period, now):
+    if state is None:
+        return float(capacity)
+    tokens, updated = state
+    return min(capacity, tokens + (now - updated) * capacity / period)
+
+
+def _lock(keys):
+    """
+    Take a short cache lock per bucket with atomic add(), in sorted order.
+    Returns the held lock keys, or None if they stay busy past LOCK_WAIT.
+    """
+    deadline = time.monotonic() + LOCK_WAIT
+    held = []
+    for key in sorted(keys):
+        lock_key = f'{key}:lock'
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                cache.delete_many(held)
+                return None
+            time.sleep(0.005)
+        held.append(lock_key)
+    return held
+
+
+def _take(group, buckets, states, now):
+    """Bucket math on loaded states: (allowed, retry_after, states to store)"""
+    tokens = {
+        key: _refill(states.get(key), capacity, period, now)
+        for key, (scope, capacity, period) in buckets.items()
+    }
+
+    blocked = [key for key, left in tokens.items() if left < 1]
+    if blocked:
+        retry_after = max(
+            (1 - tokens[key]) * buckets[key][2] / buckets[key][1] for key in blocked
+        )
+        for key in blocked:
+            metrics.record('ratelimit.blocked', group=group, scope=buckets[key][0])
+        return False, retry_after, {}
+
+    for key, left in tokens.items():
+        metrics.record('ratelimit.allowed', group=group, scope=buckets[key][0], remaining=int(left - 1))
+    return True, 0, {key: (left - 1, now) for key, left in tokens.items()}
+
+
+def consume(group, identities, now=None):
+    """
+    Take one token from every bucket of `group` for `identities`
+    ({'user': '42', 'ip': '1.2.3.4'}). Returns (allowed, retry_after).
+    Nothing is taken unless every bucket has a token.
+
+    The read-modify-write runs under per-bucket cache locks, so parallel
+    requests from one client are counted one after another instead of
+    all reading the same state.
+    """
+    now = time.time() if now is None else now
+    buckets = {}
+    for scope, rate in get_limits(group).items():
+        if identities.get(scope):
+            capacity, period = parse_rate(rate)
+            buckets[f'ratelimit:{group}:{scope}:{identities[scope]}'] = (scope, capacity, period)
+    if not buckets:
+        return True, 0
+    ttl = max(period for _, _, period in buckets.values())
+
+    try:
+        held = _lock(buckets)
+        if held is None:
+            # Only a client already hammering this bucket gets here
+            metrics.record('ratelimit.contended', group=group)
+            return False, 1
+        try:
+            allowed, retry_after, updates = _take(group, buckets, cache.get_many(list(buckets)), now)
+            if updates:
+                cache.set_many(updates, ttl)
+        finally:
+            cache.delete_many(held)
+        return allowed, retry_after
+    except Exception:
+        metrics.record('ratelimit.cache_fallback')
+
+    with _local_lock:
+        states = {key: _local_buckets[key] for key in buckets if key in _local_buckets}
+        allowed, retry_after, updates = _take(group, buckets, states, now)
+        _local_buckets.update(updates)
+    return allowed, retry_after
+
+
+def rate_limit(group):
+    """View decorator applying the `group` budgets to the request's user and IP"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            # Only writes spend tokens
+            if request.method in SAFE_METHODS or not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+                return view(request, *args, **kwargs)
+
+            user = getattr(request, 'user', None)
+            identities = {
+                'user': str(user.pk) if user is not None and user.is_authenticated else None,
+                'ip': client_ip(request),
+            }
+            allowed, retry_after = consume(group, identities)
+            if not allowed:
+                response = JsonResponse(
+                    {"status": "error", "message": "Too many requests. Please slow down."},
+                    status=429,
+                )
+                response['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                return response
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -194,3 +194,60 @@ CSRF_COOKIE_SECURE = True
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SAMESITE = 'None'
 SESSION_COOKIE_SAMESITE = 'None'
+
+# Server-sent event streams (see playserve/events.py).
+# Use playserve.events.CacheBackend with a shared cache to fan out across workers.
+EVENT_BUS_BACKEND = os.getenv('EVENT_BUS_BACKEND', 'playserve.events.LocalBackend')
+SSE_STREAM_TIMEOUT = 55
+# Only turn on when served by an ASGI server (e.g. uvicorn playserve.asgi:application);
+# under WSGI a stream never flushes and pins a worker until it times out.
+SSE_ENABLED = os.getenv('SSE_ENABLED', 'False').lower() == 'true'
+
+# Rate-limit buckets, the membership cache and the CacheBackend event bus
+# must be shared by every worker: set REDIS_URL in production. Without it
+# each process gets its own LocMem cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+# Token-bucket budgets for write endpoints (see playserve/ratelimit.py).
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+RATE_LIMITS = {
+    'community_write': {'user': '20/m', 'ip': '60/m'},
+    'match_request': {'user': '10/m', 'ip': '30/m'},
+    'review_write': {'user': '10/m', 'ip': '30/m'},
+}
+# The deployed site runs behind a reverse proxy, so REMOTE_ADDR is the proxy
+# for every visitor; key the 'ip' budget on X-Forwarded-For instead. Turn
+# off when Django is reached directly, as clients can then forge the header.
+RATE_LIMIT_TRUST_FORWARDED = os.getenv('RATE_LIMIT_TRUST_FORWARDED', 'True').lower() == 'true'
+# Dotted paths of callables(name, value, tags) receiving playserve.metrics events.
+METRICS_HOOKS = []
+
+# Elo rating engine (see matchmaking/rating.py). Re-tune, then run
+# `python manage.py recompute_ratings` to replay all match history.
+ELO_K_FACTOR = 24
+ELO_PROVISIONAL_K_FACTOR = 40
+ELO_PROVISIONAL_MATCHES = 20
+
+# Automatic matchmaking queue (see matchmaking/pairing.py). The allowed
+# rating gap starts at BASE and widens per second waited up to MAX.
+MATCH_QUEUE_BASE_GAP = 100
+MATCH_QUEUE_GAP_PER_SECOND = 5
+MATCH_QUEUE_MAX_GAP = 800
+
+# Seconds before each worker rebuilds its in-process leaderboard from the DB.
+LEADERBOARD_MAX_AGE = 60
+
+# Seconds a one-sided match result waits for the opponent before
+# `manage.py resolve_match_results` settles it as reported.
+MATCH_RESULT_CONFIRM_TIMEOUT = 24 * 60 * 60
+
+# Seconds before `manage.py expire_stale_matches` expires an unanswered
+# match request, and a match session nobody reported a result for.
+MATCH_REQUEST_TTL = 24 * 60 * 60
+MATCH_SESSION_TTL = 3 * 24 * 60 * 60
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profil', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['lokasi', 'jumlah_kemenangan'], name='profil_prof_lokasi_ee490a_idx'),
+        ),
+    ]
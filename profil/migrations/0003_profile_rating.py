@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profil', '0002_profile_lokasi_wins_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='rated_matches',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='rating',
+            field=models.FloatField(default=1200),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['lokasi', 'rating'], name='profil_prof_lokasi_987552_idx'),
+        ),
+    ]
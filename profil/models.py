@@ -29,20 +29,42 @@ class Profile(models.Model):
     ]
     avatar = models.CharField(max_length=100, choices=AVATAR_CHOICES, default='image/avatar1.svg')
     jumlah_kemenangan = models.PositiveIntegerField(default=0)
+    # Elo skill rating, maintained by matchmaking.rating
+    rating = models.FloatField(default=1200)
+    rated_matches = models.PositiveIntegerField(default=0)
+
+    # (rank, min wins, max wins exclusive), so rank filters become win ranges in SQL
+    RANK_TIERS = [
+        ('Bronze', 0, 10),
+        ('Silver', 10, 25),
+        ('Gold', 25, 50),
+        ('Platinum', 50, 100),
+        ('Diamond', 100, None),
+    ]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lokasi', 'jumlah_kemenangan']),
+            models.Index(fields=['lokasi', 'rating']),
+        ]
 
     @property
     def rank(self):
         wins = self.jumlah_kemenangan
-        if wins < 10:
-            return "Bronze"
-        elif wins < 25:
-            return "Silver"
-        elif wins < 50:
-            return "Gold"
-        elif wins < 100:
-            return "Platinum"
-        else:
-            return "Diamond"
+        for name, low, high in self.RANK_TIERS:
+            if high is None or wins < high:
+                return name
+
+    @classmethod
+    def rank_filter(cls, rank):
+        """Q matching profiles whose wins fall in the given rank tier"""
+        for name, low, high in cls.RANK_TIERS:
+            if name == rank:
+                q = models.Q(jumlah_kemenangan__gte=low)
+                if high is not None:
+                    q &= models.Q(jumlah_kemenangan__lt=high)
+                return q
+        raise ValueError(f'Unknown rank: {rank}')
 
     def __str__(self):
         return f'{self.user.username} Profile ({self.get_role_display()})'
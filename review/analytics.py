@@ -0,0 +1,91 @@
+"""
+Review statistics from the stored rating histograms.
+
+FieldRatingSummary already keeps count_1..count_5 per field, updated on
+every review write. Summing those columns gives the histogram for any
+set of fields without touching the reviews table, and mean, median, mode
+and percentiles come out of it in O(#buckets).
+"""
+import math
+
+from django.db.models import Sum
+
+from review.models import RATING_BUCKETS, FieldRatingSummary
+
+BUCKET_COLUMNS = [f'count_{stars}' for stars in RATING_BUCKETS]
+PERCENTILES = (25, 75, 90)
+
+
+def _totals():
+    totals = {column: Sum(column) for column in BUCKET_COLUMNS}
+    totals['rating_sum'] = Sum('rating_sum')
+    return totals
+
+
+def _from_row(row):
+    """(histogram, rating_sum) from a row of summed columns"""
+    histogram = {stars: row[f'count_{stars}'] or 0 for stars in RATING_BUCKETS}
+    return histogram, row['rating_sum'] or 0
+
+
+def histogram(city=None, field_id=None):
+    """(histogram, rating_sum) over all fields, one city, or one field"""
+    summaries = FieldRatingSummary.objects.all()
+    if city is not None:
+        summaries = summaries.filter(field__city=city)
+    if field_id is not None:
+        summaries = summaries.filter(field_id=field_id)
+    return _from_row(summaries.aggregate(**_totals()))
+
+
+def histograms_by_city():
+    """{city: (histogram, rating_sum)} with one grouped query"""
+    rows = (
+        FieldRatingSummary.objects.values('field__city')
+        .annotate(**_totals())
+        .order_by('field__city')
+    )
+    return {row['field__city']: _from_row(row) for row in rows}
+
+
+def value_at(histogram, rank):
+    """The rating at 0-based `rank` in the sorted list of all ratings"""
+    seen = 0
+    for stars in RATING_BUCKETS:
+        seen += histogram[stars]
+        if rank < seen:
+            return stars
+    raise IndexError(rank)
+
+
+def percentile(histogram, p):
+    """Nearest-rank percentile, p in (0, 100]"""
+    total = sum(histogram.values())
+    return value_at(histogram, max(math.ceil(p / 100 * total), 1) - 1)
+
+
+def summarize(histogram, rating_sum):
+    """
+    Same keys the admin sidebar always had (total_reviews, mean, median,
+    mode) plus the histogram and a few percentiles. The mean uses the
+    exact rating_sum; mode is None when several ratings tie.
+    """
+    total = sum(histogram.values())
+    if not total:
+        return {
+            'total_reviews': 0, 'mean': None, 'median': None, 'mode': None,
+            'percentiles': {}, 'histogram': histogram,
+        }
+
+    # statistics.median semantics: average the two middle values on even counts
+    median = (value_at(histogram, (total - 1) // 2) + value_at(histogram, total // 2)) / 2
+    top = max(histogram.values())
+    modes = [stars for stars in RATING_BUCKETS if histogram[stars] == top]
+    return {
+        'total_reviews': total,
+        'mean': rating_sum / total,
+        'median': median,
+        'mode': modes[0] if len(modes) == 1 else None,
+        'percentiles': {p: percentile(histogram, p) for p in PERCENTILES},
+        'histogram': histogram,
+    }
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from review.models import FieldRatingSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute every field rating summary from the reviews table'
+
+    def handle(self, *args, **kwargs):
+        rebuilt = FieldRatingSummary.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating summaries for {rebuilt} fields'))
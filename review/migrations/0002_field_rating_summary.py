@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_summaries(apps, schema_editor):
+    PlayingField = apps.get_model('booking', 'PlayingField')
+    Review = apps.get_model('review', 'Review')
+    FieldRatingSummary = apps.get_model('review', 'FieldRatingSummary')
+
+    summaries = {pk: FieldRatingSummary(field_id=pk) for pk in PlayingField.objects.values_list('pk', flat=True)}
+    rows = Review.objects.values('field_id', 'rating').annotate(n=models.Count('id')).order_by()
+    for row in rows:
+        summary = summaries[row['field_id']]
+        summary.review_count += row['n']
+        summary.rating_sum += row['rating'] * row['n']
+        bucket = f"count_{min(max(row['rating'], 1), 5)}"
+        setattr(summary, bucket, getattr(summary, bucket) + row['n'])
+    for summary in summaries.values():
+        summary.avg_rating = summary.rating_sum / summary.review_count if summary.review_count else 0.0
+    FieldRatingSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_playingfield_amenity_flags'),
+        ('review', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldRatingSummary',
+            fields=[
+                ('field', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='booking.playingfield')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('avg_rating', models.FloatField(default=0)),
+                ('count_1', models.PositiveIntegerField(default=0)),
+                ('count_2', models.PositiveIntegerField(default=0)),
+                ('count_3', models.PositiveIntegerField(default=0)),
+                ('count_4', models.PositiveIntegerField(default=0)),
+                ('count_5', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['avg_rating', 'review_count'], name='review_fiel_avg_rat_decac8_idx')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,15 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from booking.models import PlayingField
 
+RATING_BUCKETS = range(1, 6)
+
+
 class Review(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True) 
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     field = models.ForeignKey(PlayingField, on_delete=models.CASCADE)
     rating = models.IntegerField()
     komentar = models.TextField(blank=True)
@@ -11,5 +17,120 @@ class Review(models.Model):
     class Meta:
         unique_together = ('user', 'field')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember what the row held so post_save can apply only the difference
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_field_id = instance.__dict__.get('field_id')
+        return instance
+
     def __str__(self):
         return f"{self.user.username} - {self.field.name}"
+
+
+def rating_bucket(rating):
+    """Histogram column for a rating; out-of-range values go to the nearest star"""
+    return f'count_{min(max(rating, RATING_BUCKETS[0]), RATING_BUCKETS[-1])}'
+
+
+class FieldRatingSummary(models.Model):
+    """
+    Stored review aggregates for one PlayingField, kept up to date by the
+    Review signals below so listings can sort on an index instead of
+    averaging the reviews table. Queryset .update() on Review bypasses the
+    signals; run `manage.py rebuild_rating_summaries` after such writes.
+    """
+    field = models.OneToOneField(
+        PlayingField, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary'
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    avg_rating = models.FloatField(default=0)
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['avg_rating', 'review_count']),
+        ]
+
+    @property
+    def histogram(self):
+        return {stars: getattr(self, f'count_{stars}') for stars in RATING_BUCKETS}
+
+    @classmethod
+    def apply(cls, field_id, rating, sign):
+        """Add (sign=1) or remove (sign=-1) one rating with a single UPDATE"""
+        count = models.F('review_count') + sign
+        total = models.F('rating_sum') + sign * rating
+        updated = cls.objects.filter(field_id=field_id).update(
+            review_count=count,
+            rating_sum=total,
+            avg_rating=models.Case(
+                models.When(review_count=-sign, then=models.Value(0.0)),
+                default=Cast(total, models.FloatField()) / count,
+                output_field=models.FloatField(),
+            ),
+            **{rating_bucket(rating): models.F(rating_bucket(rating)) + sign},
+        )
+        if not updated:
+            # Fields created without signals (bulk_create, raw SQL) get a row lazily
+            cls.rebuild([field_id])
+
+    @classmethod
+    def rebuild(cls, field_ids=None):
+        """Recompute summaries from the reviews table, for all fields or just field_ids"""
+        fields = PlayingField.objects.all()
+        if field_ids is not None:
+            fields = fields.filter(pk__in=field_ids)
+        summaries = {pk: cls(field_id=pk) for pk in fields.values_list('pk', flat=True)}
+
+        reviews = Review.objects.filter(field_id__in=summaries).values('field_id', 'rating')
+        for row in reviews.annotate(n=models.Count('id')).order_by():
+            summary = summaries[row['field_id']]
+            summary.review_count += row['n']
+            summary.rating_sum += row['rating'] * row['n']
+            bucket = rating_bucket(row['rating'])
+            setattr(summary, bucket, getattr(summary, bucket) + row['n'])
+        for summary in summaries.values():
+            summary.avg_rating = summary.rating_sum / summary.review_count if summary.review_count else 0.0
+
+        cls.objects.filter(field_id__in=summaries).delete()
+        cls.objects.bulk_create(summaries.values(), batch_size=1000)
+        return len(summaries)
+
+
+@receiver(post_save, sender=PlayingField)
+def create_rating_summary(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FieldRatingSummary.objects.get_or_create(field=instance)
+
+
+@receiver(post_save, sender=Review)
+def add_review_to_summary(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded_rating = getattr(instance, '_loaded_rating', None)
+    loaded_field_id = getattr(instance, '_loaded_field_id', None)
+    if created:
+        FieldRatingSummary.apply(instance.field_id, instance.rating, 1)
+    elif loaded_rating is None or loaded_field_id is None:
+        # Saved without being loaded first, so the old values are unknown
+        FieldRatingSummary.rebuild([instance.field_id])
+    elif (loaded_rating, loaded_field_id) != (instance.rating, instance.field_id):
+        FieldRatingSummary.apply(loaded_field_id, loaded_rating, -1)
+        FieldRatingSummary.apply(instance.field_id, instance.rating, 1)
+    instance._loaded_rating, instance._loaded_field_id = instance.rating, instance.field_id
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_summary(sender, instance, origin=None, **kwargs):
+    # When the field itself is deleted its summary goes with it; rebuilding
+    # the missing row here would point it at a field that is about to vanish
+    if getattr(origin, 'model', type(origin)) is PlayingField:
+        return
+    FieldRatingSummary.apply(instance.field_id, instance.rating, -1)
@@ -0,0 +1,158 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils.html import strip_tags
+
+from booking.models import PlayingField
+from review.models import FieldRatingSummary, Review
+
+MIN_RATING, MAX_RATING = 1, 5
+
+
+def latest_reviews_by_field(field_ids, limit):
+    """
+    Latest `limit` reviews of each field in one windowed query, returned
+    as {field_id: [reviews newest first]}.
+    """
+    previews = {field_id: [] for field_id in field_ids}
+    if not field_ids or limit < 1:
+        return previews
+
+    reviews = (
+        Review.objects.filter(field_id__in=field_ids)
+        .select_related('user')
+        .annotate(
+            recency=Window(
+                expression=RowNumber(),
+                partition_by=[F('field_id')],
+                order_by=[F('id').desc()],
+            )
+        )
+        .filter(recency__lte=limit)
+        .order_by('field_id', '-id')
+    )
+    for review in reviews:
+        previews[review.field_id].append(review)
+    return previews
+
+
+def parse_rating(value):
+    """Integer rating in 1..5 from an int or digit string, raises ValueError otherwise"""
+    error = ValueError('Rating must be an integer from 1 to 5.')
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise error
+    try:
+        rating = int(value)
+    except ValueError:
+        raise error
+    if not MIN_RATING <= rating <= MAX_RATING:
+        raise error
+    return rating
+
+
+def _parse_change(item):
+    """(field_id, change) from one sync item, raises ValueError if malformed"""
+    if not isinstance(item, dict):
+        raise ValueError('Invalid item.')
+    try:
+        field_id = int(item.get('field_id'))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid field id.')
+    if item.get('deleted'):
+        return field_id, {'deleted': True}
+    rating = parse_rating(item.get('rating'))
+    return field_id, {'rating': rating, 'komentar': strip_tags(item.get('comment') or '')}
+
+
+def _create_missing(reviews, changes, results):
+    """
+    bulk_create `reviews`. If another request created one of them since it
+    was found missing, insert them one by one instead and report the ones
+    that collide on (user, field) as skipped. Returns the reviews created.
+    """
+    try:
+        with transaction.atomic():
+            return Review.objects.bulk_create(reviews)
+    except IntegrityError:
+        pass
+
+    created = []
+    for review in reviews:
+        try:
+            with transaction.atomic():
+                Review.objects.bulk_create([review])
+        except IntegrityError:
+            review.pk = None
+            results[changes[review.field_id][0]] = {
+                'field_id': review.field_id, 'status': 'skipped',
+                'error': 'A review for this field was created at the same time.',
+            }
+        else:
+            created.append(review)
+    return created
+
+
+def sync_reviews(user, items):
+    """
+    Apply a batch of offline review changes for `user` in one transaction.
+
+    Each item is {field_id, rating, comment} or {field_id, deleted: true};
+    later items for the same field win. Existing reviews are read with one
+    query on the (user, field) unique index and written with bulk
+    operations, after which the touched fields' rating summaries are
+    rebuilt. Returns one {field_id, status[, review | error]} per item;
+    a create that races another request for the same field is 'skipped'.
+    """
+    results = [None] * len(items)
+    changes = {}
+    for index, item in enumerate(items):
+        try:
+            field_id, change = _parse_change(item)
+        except ValueError as e:
+            results[index] = {'field_id': item.get('field_id') if isinstance(item, dict) else None,
+                              'status': 'invalid', 'error': str(e)}
+            continue
+        if field_id in changes:
+            superseded = changes[field_id][0]
+            results[superseded] = {'field_id': field_id, 'status': 'superseded'}
+        changes[field_id] = (index, change)
+
+    with transaction.atomic():
+        known_fields = set(PlayingField.objects.filter(pk__in=changes).values_list('pk', flat=True))
+        existing = {
+            review.field_id: review
+            for review in Review.objects.select_for_update().filter(user=user, field_id__in=changes)
+        }
+
+        to_create, to_update, to_delete = [], [], []
+        for field_id, (index, change) in changes.items():
+            review = existing.get(field_id)
+            if change.get('deleted'):
+                if review is None:
+                    results[index] = {'field_id': field_id, 'status': 'not_found'}
+                else:
+                    to_delete.append(review.id)
+                    results[index] = {'field_id': field_id, 'status': 'deleted'}
+            elif field_id not in known_fields:
+                results[index] = {'field_id': field_id, 'status': 'not_found'}
+            elif review is None:
+                review = Review(user=user, field_id=field_id, **change)
+                to_create.append(review)
+                results[index] = {'field_id': field_id, 'status': 'created', 'review': review}
+            elif (review.rating, review.komentar) == (change['rating'], change['komentar']):
+                results[index] = {'field_id': field_id, 'status': 'unchanged', 'review': review}
+            else:
+                review.rating, review.komentar = change['rating'], change['komentar']
+                to_update.append(review)
+                results[index] = {'field_id': field_id, 'status': 'updated', 'review': review}
+
+        # Deletes go through the post_delete signal; bulk writes skip
+        # signals, so those fields are recounted from the table instead
+        if to_delete:
+            Review.objects.filter(id__in=to_delete).delete()
+        to_create = _create_missing(to_create, changes, results)
+        Review.objects.bulk_update(to_update, ['rating', 'komentar'])
+        touched = {review.field_id for review in to_create + to_update}
+        if touched:
+            FieldRatingSummary.rebuild(touched)
+    return results
@@ -1,9 +1,15 @@
+import json
+from unittest import mock
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
-from review.models import Review
+from io import StringIO
+from django.core.management import call_command
+from review import analytics
+from review.models import FieldRatingSummary, Review
 from booking.models import PlayingField
-from statistics import mean, median, mode, StatisticsError
+from statistics import mean, median, mode, multimode, StatisticsError
 
 class ReviewViewTests(TestCase):
     def setUp(self):
@@ -244,3 +250,247 @@ class ReviewFeatureExtensionTests(TestCase):
         self.assertAlmostEqual(data["mean"], 3.0)
         self.assertAlmostEqual(data["median"], 3.0)
         self.assertIsNone(data["mode"])
+
+
+class FieldRatingSummaryTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f"rater{i}", password="pass") for i in range(3)]
+        self.field1 = PlayingField.objects.create(name="Sum A", address="A", city="X", price_per_hour=10000)
+        self.field2 = PlayingField.objects.create(name="Sum B", address="B", city="X", price_per_hour=10000)
+
+    def summary(self, field):
+        return FieldRatingSummary.objects.get(field=field)
+
+    def test_summary_follows_create_update_and_delete(self):
+        self.assertEqual(self.summary(self.field1).review_count, 0)
+        Review.objects.create(user=self.users[0], field=self.field1, rating=5)
+        review = Review.objects.create(user=self.users[1], field=self.field1, rating=2)
+
+        s = self.summary(self.field1)
+        self.assertEqual((s.review_count, s.rating_sum, s.avg_rating), (2, 7, 3.5))
+        self.assertEqual(s.histogram, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1})
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 4
+        review.save()
+        review.save()  # unchanged, must not count twice
+        s = self.summary(self.field1)
+        self.assertEqual((s.review_count, s.avg_rating, s.count_2, s.count_4), (2, 4.5, 0, 1))
+
+        review.field = self.field2
+        review.save()
+        self.assertEqual(self.summary(self.field1).review_count, 1)
+        self.assertEqual(self.summary(self.field2).avg_rating, 4.0)
+
+        Review.objects.filter(field=self.field1).delete()
+        s = self.summary(self.field1)
+        self.assertEqual((s.review_count, s.rating_sum, s.avg_rating, s.count_5), (0, 0, 0.0, 0))
+
+    def test_deleting_a_reviewed_field(self):
+        Review.objects.create(user=self.users[0], field=self.field1, rating=5)
+        Review.objects.create(user=self.users[1], field=self.field2, rating=3)
+        self.field1.delete()
+        PlayingField.objects.filter(pk=self.field2.pk).delete()
+        self.assertFalse(FieldRatingSummary.objects.exists())
+        self.assertFalse(Review.objects.exists())
+
+    def test_update_or_create_path_is_tracked(self):
+        for rating in (1, 3):
+            Review.objects.update_or_create(user=self.users[0], field=self.field1, defaults={"rating": rating})
+        s = self.summary(self.field1)
+        self.assertEqual((s.review_count, s.avg_rating, s.count_1, s.count_3), (1, 3.0, 0, 1))
+
+    def test_rebuild_repairs_drift(self):
+        Review.objects.create(user=self.users[0], field=self.field1, rating=5)
+        Review.objects.filter(field=self.field1).update(rating=1)  # bypasses signals
+        FieldRatingSummary.objects.filter(field=self.field2).delete()
+
+        out = StringIO()
+        call_command("rebuild_rating_summaries", stdout=out)
+        self.assertIn("2 fields", out.getvalue())
+        self.assertEqual(self.summary(self.field1).histogram[1], 1)
+        self.assertEqual(self.summary(self.field2).review_count, 0)
+
+    def test_list_reads_stored_aggregates(self):
+        Review.objects.create(user=self.users[0], field=self.field2, rating=4)
+        response = self.client.get(reverse("review:review_list") + "?sort=avg_desc")
+        fields = list(response.context["fields"])
+        self.assertEqual(fields[0], self.field2)
+        self.assertEqual((fields[0].avg_rating, fields[0].review_count), (4.0, 1))
+        self.assertEqual((fields[1].avg_rating, fields[1].review_count), (0.0, 0))
+
+
+class ReviewAnalyticsTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("stats_admin", "s@test.com", "pass")
+        self.jakarta = PlayingField.objects.create(name="J", address="J", city="Jakarta", price_per_hour=1)
+        self.bogor = PlayingField.objects.create(name="B", address="B", city="Bogor", price_per_hour=1)
+        self.ratings = {self.jakarta: [5, 4, 4, 2, 1, 4], self.bogor: [3, 5]}
+        for field, ratings in self.ratings.items():
+            for i, rating in enumerate(ratings):
+                user = User.objects.create_user(f"{field.city}{i}")
+                Review.objects.create(user=user, field=field, rating=rating)
+
+    def test_matches_statistics_module(self):
+        everything = self.ratings[self.jakarta] + self.ratings[self.bogor]
+        stats = analytics.summarize(*analytics.histogram())
+        self.assertEqual(stats["total_reviews"], len(everything))
+        self.assertAlmostEqual(stats["mean"], mean(everything))
+        self.assertAlmostEqual(stats["median"], median(everything))
+        self.assertEqual(stats["mode"], multimode(everything)[0])
+        self.assertEqual(stats["percentiles"], {25: 2, 75: 4, 90: 5})
+
+        bogor = analytics.summarize(*analytics.histogram(city="Bogor"))
+        self.assertEqual((bogor["median"], bogor["mode"]), (4.0, None))
+        self.assertEqual(analytics.summarize(*analytics.histogram(field_id=self.jakarta.id))["total_reviews"], 6)
+        self.assertIsNone(analytics.summarize(*analytics.histogram(city="Depok"))["mean"])
+
+    def test_by_city_endpoint_is_admin_only(self):
+        url = reverse("review:analytics_json")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.login(username="stats_admin", password="pass")
+        with self.assertNumQueries(4):
+            # auth session, user, then one aggregate each for stats and by_city
+            body = self.client.get(url, {"city": "Jakarta"}).json()
+        self.assertEqual(body["stats"]["histogram"], {"1": 1, "2": 1, "3": 0, "4": 3, "5": 1})
+        self.assertEqual(sorted(body["by_city"]), ["Bogor", "Jakarta"])
+        self.assertEqual(body["by_city"]["Bogor"]["total_reviews"], 2)
+        self.assertEqual(self.client.get(url, {"field": "x"}).status_code, 400)
+
+
+class ReviewListPaginationTests(TestCase):
+    def setUp(self):
+        self.fields = [
+            PlayingField.objects.create(name=f"Page {i}", address="A", city="X", price_per_hour=1)
+            for i in range(12)
+        ]
+        self.users = [User.objects.create_user(f"pager{i}") for i in range(25)]
+        for user in self.users[:4]:
+            Review.objects.create(user=user, field=self.fields[0], rating=3, komentar=user.username)
+
+    def test_list_is_paginated_with_windowed_previews(self):
+        url = reverse("review:review_list")
+        with self.assertNumQueries(3):
+            # count, one page of fields, one windowed preview query
+            response = self.client.get(url)
+        fields = response.context["fields"]
+        self.assertEqual(len(fields), 10)
+        self.assertEqual([r.komentar for r in fields[0].preview_reviews], ["pager3", "pager2"])
+        self.assertEqual(fields[1].preview_reviews, [])
+        self.assertTrue(response.context["page_obj"].has_next())
+
+        body = self.client.get(url, {"page": 2}, HTTP_X_REQUESTED_WITH="XMLHttpRequest").json()
+        self.assertIn("Page 11", body["html"])
+        self.assertNotIn("Page 0", body["html"])
+
+    def test_comments_json_is_cursor_paginated(self):
+        field = self.fields[1]
+        for i, user in enumerate(self.users):
+            Review.objects.create(user=user, field=field, rating=i % 5 + 1, komentar=f"c{i}")
+
+        html = self.client.get(reverse("review:view_comments", args=[field.id]),
+                               HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(len(html.context["reviews"]), 20)
+        self.assertContains(html, "load-more-comments")
+
+        url = reverse("review:view_comments_json", args=[field.id])
+        first = self.client.get(url, {"page_size": 10}).json()
+        self.assertEqual([c["komentar"] for c in first["comments"]][:2], ["c24", "c23"])
+        rest = self.client.get(url, {"cursor": first["next_cursor"]}).json()
+        self.assertEqual(len(rest["comments"]), 15)
+        self.assertFalse(rest["has_next"])
+        self.assertEqual(self.client.get(url, {"cursor": "bogus"}).status_code, 400)
+
+
+class ReviewIdApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("api_user", password="pass")
+        self.other = User.objects.create_user("api_other", password="pass")
+        # Two courts share a name; ids keep them apart
+        self.field1 = PlayingField.objects.create(name="Twin", address="A", city="X", price_per_hour=1)
+        self.field2 = PlayingField.objects.create(name="Twin", address="B", city="X", price_per_hour=1)
+        self.client.login(username="api_user", password="pass")
+
+    def post(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type="application/json")
+
+    def test_upsert_get_and_delete_by_id(self):
+        url = reverse("review:api_field_review", args=[self.field2.id])
+        response = self.post(url, {"rating": 4, "comment": "<b>ok</b>"})
+        self.assertEqual(response.status_code, 201)
+        review_id = response.json()["review"]["id"]
+        self.assertEqual(self.post(url, {"rating": 2}).json()["action"], "updated")
+        self.assertEqual(self.client.get(url).json()["review"], {
+            "id": review_id, "field_id": self.field2.id, "username": "api_user", "rating": 2, "comment": "",
+        })
+        self.assertFalse(Review.objects.filter(field=self.field1).exists())
+        self.assertEqual(self.post(url, {"rating": 9}).status_code, 400)
+        self.assertEqual(self.post(reverse("review:api_field_review", args=[999]), {"rating": 3}).status_code, 404)
+
+        delete_url = reverse("review:api_delete_review", args=[review_id])
+        self.client.login(username="api_other", password="pass")
+        self.assertEqual(self.client.post(delete_url).status_code, 403)
+        self.client.login(username="api_user", password="pass")
+        self.assertEqual(self.client.post(delete_url).status_code, 200)
+        self.assertEqual(FieldRatingSummary.objects.get(field=self.field2).review_count, 0)
+
+    def test_sync_applies_batch_and_keeps_summaries(self):
+        Review.objects.create(user=self.user, field=self.field1, rating=1)
+        payload = {"reviews": [
+            {"field_id": self.field1.id, "rating": 5, "comment": "first"},
+            {"field_id": self.field2.id, "rating": 3},
+            {"field_id": self.field1.id, "rating": 4, "comment": "later"},
+            {"field_id": 999, "rating": 4},
+            {"field_id": self.field2.id + 1000, "deleted": True},
+            {"field_id": self.field2.id, "rating": "3"},
+            {"rating": 4},
+            {"field_id": self.field1.id, "rating": 0},
+        ]}
+        with self.assertNumQueries(15):
+            # A fixed count: one read each for fields and existing reviews,
+            # one bulk write per kind (inserts in a savepoint) and the summary rebuild
+            body = self.post(reverse("review:api_sync_reviews"), payload).json()
+        statuses = [r["status"] for r in body["results"]]
+        self.assertEqual(statuses, ["superseded", "superseded", "updated", "not_found", "not_found",
+                                    "created", "invalid", "invalid"])
+        self.assertEqual(Review.objects.get(user=self.user, field=self.field1).komentar, "later")
+
+        summaries = {s.field_id: s for s in FieldRatingSummary.objects.all()}
+        self.assertEqual((summaries[self.field1.id].avg_rating, summaries[self.field1.id].count_4), (4.0, 1))
+        self.assertEqual(summaries[self.field2.id].review_count, 1)
+
+        body = self.post(reverse("review:api_sync_reviews"), {"reviews": [
+            {"field_id": self.field1.id, "deleted": True},
+            {"field_id": self.field2.id, "rating": 3},
+        ]}).json()
+        self.assertEqual([r["status"] for r in body["results"]], ["deleted", "unchanged"])
+        self.assertEqual(FieldRatingSummary.objects.get(field=self.field1).review_count, 0)
+
+    def test_sync_skips_reviews_created_concurrently(self):
+        bulk_create = Review.objects.bulk_create
+
+        def race_then_insert(reviews, *args, **kwargs):
+            if not Review.objects.filter(field=self.field2).exists():
+                Review.objects.create(user=self.user, field=self.field2, rating=2)
+            return bulk_create(reviews, *args, **kwargs)
+
+        payload = {"reviews": [
+            {"field_id": self.field1.id, "rating": 5},
+            {"field_id": self.field2.id, "rating": 4},
+        ]}
+        with mock.patch.object(Review.objects, "bulk_create", race_then_insert):
+            response = self.post(reverse("review:api_sync_reviews"), payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.json()["results"]], ["created", "skipped"])
+        self.assertEqual(Review.objects.get(user=self.user, field=self.field2).rating, 2)
+        self.assertEqual(FieldRatingSummary.objects.get(field=self.field1).review_count, 1)
+        self.assertEqual(FieldRatingSummary.objects.get(field=self.field2).avg_rating, 2.0)
+
+    def test_sync_rejects_bad_payloads(self):
+        url = reverse("review:api_sync_reviews")
+        self.assertEqual(self.post(url, {"reviews": "nope"}).status_code, 400)
+        self.assertEqual(self.post(url, {"reviews": [{}] * 201}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post(url, {"reviews": []}).status_code, 401)
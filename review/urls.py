@@ -1,5 +1,8 @@
 from django.urls import path
-from review.views import add_review, review_list, view_comments, delete_review, show_json, proxy_image, add_review_flutter, delete_review_flutter
+from review.views import (
+    add_review, review_list, view_comments, view_comments_json, delete_review, show_json, proxy_image, add_review_flutter, delete_review_flutter, analytics_json,
+    api_field_review, api_delete_review, api_sync_reviews,
+)
 
 app_name = 'review'
 
@@ -8,8 +11,13 @@ urlpatterns = [
     path("add-review-flutter/", add_review_flutter, name='add_review_flutter'),
     path("", review_list, name='review_list'),
     path("field/<int:field_id>/comments/", view_comments, name='view_comments'),
+    path("field/<int:field_id>/comments/json/", view_comments_json, name='view_comments_json'),
     path("delete-review/<int:review_id>/", delete_review, name='delete-review'),
     path("delete-review-flutter/", delete_review_flutter, name="delete_review_flutter"),
+    path('analytics/', analytics_json, name='analytics_json'),
     path('json/', show_json, name="show_json"),
     path('proxy-image/', proxy_image, name='proxy_image'),
+    path('api/fields/<int:field_id>/review/', api_field_review, name='api_field_review'),
+    path('api/reviews/<int:review_id>/delete/', api_delete_review, name='api_delete_review'),
+    path('api/reviews/sync/', api_sync_reviews, name='api_sync_reviews'),
 ]
@@ -5,15 +5,24 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.html import strip_tags
 from django.http import JsonResponse, HttpResponse
 from django.template.loader import render_to_string
-from django.db.models import Q, Avg, Count, Value, FloatField, Prefetch
+from django.core.paginator import Paginator
+from django.db.models import Q, F, Value, FloatField
 from django.db.models.functions import Coalesce
 from django.core import serializers
 from django.http import HttpResponse
 from django.template.loader import render_to_string
 import requests, json
-from statistics import mean, median, mode,multimode, StatisticsError
+from review import analytics as review_analytics
 from review.models import Review
+from review.services import latest_reviews_by_field, parse_rating, sync_reviews
 from booking.models import PlayingField
+from playserve.pagination import keyset_page, parse_page_size
+from playserve.ratelimit import rate_limit
+
+REVIEW_PAGE_SIZE = 10
+REVIEW_PREVIEW_SIZE = 2
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
 
 def add_review(request):
     if request.method == 'POST':
@@ -85,12 +94,7 @@ def review_list(request):
     search = request.GET.get("search", "").strip()
     sort = request.GET.get("sort", "none")
 
-    fields = PlayingField.objects.all().prefetch_related(
-        Prefetch(
-            "review_set",
-            queryset=Review.objects.select_related("user").order_by("-id")
-        )
-    ) # latest first
+    fields = PlayingField.objects.all()
 
     # SEARCH (name, city, or address)
     if search:
@@ -100,44 +104,40 @@ def review_list(request):
             Q(address__icontains=search)
         )
 
-    # ALWAYS annotate (CRITICAL)
+    # Stored aggregates from FieldRatingSummary; one join, no GROUP BY
     fields = fields.annotate(
-        avg_rating=Coalesce(
-            Avg("review__rating"),
-            Value(0.0),
-            output_field=FloatField()
-        ),
-        review_count=Count("review")
+        avg_rating=Coalesce("rating_summary__avg_rating", Value(0.0), output_field=FloatField()),
+        review_count=Coalesce("rating_summary__review_count", Value(0)),
     )
 
-     # SORTING
+    # SORTING on the (avg_rating, review_count) index
     if sort == "avg_desc":
-        fields = fields.order_by("-avg_rating", "-review_count")
+        fields = fields.order_by(
+            F("rating_summary__avg_rating").desc(nulls_last=True), "-rating_summary__review_count", "id"
+        )
     elif sort == "avg_asc":
-        fields = fields.order_by("avg_rating", "-review_count")
+        fields = fields.order_by(
+            F("rating_summary__avg_rating").asc(nulls_first=True), "-rating_summary__review_count", "id"
+        )
+    else:
+        fields = fields.order_by("id")
+
+    # PAGINATION; each card only carries its latest few reviews
+    page_obj = Paginator(fields, REVIEW_PAGE_SIZE).get_page(request.GET.get("page"))
+    fields = list(page_obj.object_list)
+    previews = latest_reviews_by_field([f.id for f in fields], REVIEW_PREVIEW_SIZE)
+    for field in fields:
+        field.preview_reviews = previews[field.id]
 
-    # ADMIN ANALYTICS
+    # ADMIN ANALYTICS from the stored histograms, not the reviews table
     analytics = None
     if request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser):
-        ratings = list(Review.objects.values_list("rating", flat=True))
-        if ratings:
-            modes = multimode(ratings)
-            analytics = {
-                "total_reviews": len(ratings),
-                "mean": mean(ratings),
-                "median": median(ratings),
-                "mode": modes[0] if len(modes) == 1 else None,
-            }
-        else:
-            analytics = {
-                "total_reviews": 0,
-                "mean": None,
-                "median": None,
-                "mode": None,
-            }
+        analytics = review_analytics.summarize(*review_analytics.histogram())
 
     context = {
         "fields": fields,
+        "page_obj": page_obj,
+        "search": search,
         "sort": sort,
         "analytics": analytics,
     }
@@ -150,9 +150,21 @@ def review_list(request):
     return render(request, "review_list.html", context)
 
 
+def _comment_json(review):
+    return {
+        'id': review.id,
+        'username': review.user.username if review.user else '',
+        'rating': review.rating,
+        'komentar': review.komentar,
+    }
+
+
 def view_comments(request, field_id):
     field = get_object_or_404(PlayingField, pk=field_id)
-    reviews = Review.objects.filter(field=field).order_by('-id')
+    # First page only; the modal pulls the rest from view_comments_json
+    reviews, next_cursor = keyset_page(
+        Review.objects.filter(field=field).select_related('user'), ['-id'], page_size=COMMENTS_PAGE_SIZE
+    )
 
     is_admin_user = (
         request.user.is_authenticated and
@@ -162,6 +174,7 @@ def view_comments(request, field_id):
     context = {
         'field': field,
         'reviews': reviews,
+        'next_cursor': next_cursor,
         'is_admin': is_admin_user
     }
 
@@ -172,6 +185,28 @@ def view_comments(request, field_id):
     return redirect('review:review_list')
 
 
+def view_comments_json(request, field_id):
+    """Cursor-paginated reviews of one field, newest first"""
+    field = get_object_or_404(PlayingField, pk=field_id)
+    page_size = parse_page_size(request, COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE)
+    try:
+        reviews, next_cursor = keyset_page(
+            Review.objects.filter(field=field).select_related('user'),
+            ['-id'],
+            cursor=request.GET.get('cursor'),
+            page_size=page_size,
+        )
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor.'}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'comments': [_comment_json(r) for r in reviews],
+        'next_cursor': next_cursor,
+        'has_next': next_cursor is not None,
+    })
+
+
 
 ## Admin
 def is_admin(user):
@@ -201,11 +236,35 @@ def delete_review(request, review_id):
 
 
 
+@login_required
+@user_passes_test(is_admin)
+def analytics_json(request):
+    """Rating statistics overall, or for ?city= / ?field=, plus a per-city breakdown"""
+    city = request.GET.get("city") or None
+    try:
+        field_id = int(request.GET["field"]) if request.GET.get("field") else None
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid field id"}, status=400)
+
+    return JsonResponse({
+        "city": city,
+        "field": field_id,
+        "stats": review_analytics.summarize(*review_analytics.histogram(city=city, field_id=field_id)),
+        "by_city": {
+            name: review_analytics.summarize(*totals)
+            for name, totals in review_analytics.histograms_by_city().items()
+        },
+    })
+
+
+
 ## JSON helpers (for dev)
 def show_json(request):
     review_list = Review.objects.select_related("user", "field").order_by("-id")  # latest first
     data = [
         {
+            'id': review.id,
+            'fieldId': review.field_id,
             'username': review.user.username,
             'rating': review.rating,
             'comment': review.komentar,
@@ -237,6 +296,7 @@ def proxy_image(request):
         return HttpResponse(f'Error fetching image: {str(e)}', status=500)
 
 @csrf_exempt
+@rate_limit('review_write')
 def add_review_flutter(request):
     if request.method != 'POST':
         return JsonResponse({"status": "error", "message": "Invalid method"}, status=405)
@@ -303,3 +363,105 @@ def delete_review_flutter(request):
     except Exception as e:
         print("DELETE REVIEW ERROR:", e)
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
+
+
+## ID-addressed review API (Flutter)
+REVIEW_SYNC_MAX_ITEMS = 200
+
+
+def _review_json(review):
+    return {
+        "id": review.id,
+        "field_id": review.field_id,
+        "username": review.user.username if review.user else "",
+        "rating": review.rating,
+        "comment": review.komentar,
+    }
+
+
+@csrf_exempt
+@rate_limit('review_write')
+def api_field_review(request, field_id):
+    """GET or POST (create/update) the current user's review of one field"""
+    if request.method not in ("GET", "POST"):
+        return JsonResponse({"status": "error", "message": "Invalid method"}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({"status": "error", "message": "Unauthenticated"}, status=401)
+
+    if request.method == "GET":
+        review = Review.objects.filter(user=request.user, field_id=field_id).first()
+        if review is None:
+            return JsonResponse({"status": "error", "message": "Review not found"}, status=404)
+        return JsonResponse({"status": "success", "review": _review_json(review)})
+
+    if not PlayingField.objects.filter(pk=field_id).exists():
+        return JsonResponse({"status": "error", "message": "Field not found"}, status=404)
+    try:
+        data = json.loads(request.body)
+        rating = parse_rating(data.get("rating"))
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    # (user, field) is unique, so this is a single indexed lookup
+    review, created = Review.objects.update_or_create(
+        user=request.user,
+        field_id=field_id,
+        defaults={"rating": rating, "komentar": strip_tags(data.get("comment") or "")},
+    )
+    return JsonResponse({
+        "status": "success",
+        "action": "created" if created else "updated",
+        "review": _review_json(review),
+    }, status=201 if created else 200)
+
+
+@csrf_exempt
+@rate_limit('review_write')
+def api_delete_review(request, review_id):
+    """Delete a review by id; authors may delete their own, admins any"""
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid method"}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({"status": "error", "message": "Unauthenticated"}, status=401)
+
+    review = Review.objects.filter(pk=review_id).first()
+    if review is None:
+        return JsonResponse({"status": "error", "message": "Review not found"}, status=404)
+    if review.user_id != request.user.id and not is_admin(request.user):
+        return JsonResponse({"status": "error", "message": "Unauthorized"}, status=403)
+
+    review.delete()
+    return JsonResponse({"status": "success", "id": review_id})
+
+
+@csrf_exempt
+@rate_limit('review_write')
+def api_sync_reviews(request):
+    """
+    Offline-first batch sync of the current user's reviews.
+    Body: {"reviews": [{"field_id", "rating", "comment"} | {"field_id", "deleted": true}]}
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid method"}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({"status": "error", "message": "Unauthenticated"}, status=401)
+
+    try:
+        items = json.loads(request.body).get("reviews")
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+    if not isinstance(items, list):
+        return JsonResponse({"status": "error", "message": "reviews must be a list"}, status=400)
+    if len(items) > REVIEW_SYNC_MAX_ITEMS:
+        return JsonResponse({
+            "status": "error",
+            "message": f"At most {REVIEW_SYNC_MAX_ITEMS} reviews per request",
+        }, status=400)
+
+    results = sync_reviews(request.user, items)
+    for result in results:
+        if "review" in result:
+            result["review"] = _review_json(result["review"])
+    return JsonResponse({"status": "success", "results": results})